@@ -0,0 +1,166 @@
+import numpy as np
+from utils import log_info
+
+# Rows scored per matrix product when assigning vectors to centroids
+ASSIGN_BATCH_ROWS = 65536
+
+# Training uses at most this many sample vectors per list
+MAX_TRAINING_POINTS_PER_LIST = 256
+
+# The index is only trained once it holds this many vectors per list; below that,
+# exact search is both fast and exact
+MIN_POINTS_PER_LIST = 8
+
+
+def _nearest_centroids(vectors, centroids):
+    """
+    Returns the index of the most similar centroid for each (normalised) vector.
+    """
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BATCH_ROWS):
+        batch = vectors[start:start + ASSIGN_BATCH_ROWS]
+        assignments[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(vectors, k, iterations=10, seed=0):
+    """
+    Clusters normalised vectors into k groups by cosine similarity.
+
+    Args:
+        vectors (np.ndarray): (n, d) float32 matrix of L2-normalised vectors, n >= k.
+        k (int): Number of clusters.
+        iterations (int, optional): Number of Lloyd iterations.
+        seed (int, optional): Seed for centroid initialisation.
+
+    Returns:
+        np.ndarray: (k, d) float32 matrix of L2-normalised centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = np.array(vectors[rng.choice(len(vectors), k, replace=False)], dtype=np.float32)
+    for _ in range(iterations):
+        assignments = _nearest_centroids(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=k)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(vectors[order], starts[~empty], axis=0)
+        # Re-seed empty clusters with random points rather than letting them collapse
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.where(norms == 0, 1, norms)).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) index over the rows of a LocalVectorIndex.
+
+    Vectors are partitioned into nlist clusters with spherical k-means. A query scores
+    only the rows in the nprobe clusters whose centroids are closest to it, trading a
+    little recall for a large cut in work: raising nprobe raises recall and latency.
+    New rows are assigned to their nearest existing centroid as they are upserted.
+    """
+
+    def __init__(self, nlist=1024, nprobe=16):
+        """
+        Args:
+            nlist (int, optional): Number of clusters.
+            nprobe (int, optional): Default number of clusters scanned per query.
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self.trained_size = 0
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._lists = None
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    @property
+    def min_train_size(self):
+        return self.nlist * MIN_POINTS_PER_LIST
+
+    def train(self, vectors, seed=0):
+        """
+        Learns centroids from (a sample of) vectors and assigns every vector to a cluster.
+
+        Args:
+            vectors (np.ndarray): (n, d) matrix of all live, normalised vectors.
+        """
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), self.nlist * MAX_TRAINING_POINTS_PER_LIST)
+        sample_rows = np.sort(rng.choice(len(vectors), sample_size, replace=False))
+        self.centroids = spherical_kmeans(np.asarray(vectors[sample_rows]), self.nlist, seed=seed)
+        self._assignments = _nearest_centroids(vectors, self.centroids)
+        self.trained_size = len(vectors)
+        self._lists = None
+        log_info(f"Trained IVF index with {self.nlist} lists on {sample_size} of {len(vectors)} vectors.")
+
+    def set_rows(self, rows, vectors):
+        """
+        Assigns new or updated rows to their nearest centroid.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        needed = int(rows.max()) + 1 if len(rows) else 0
+        if needed > len(self._assignments):
+            grown = np.zeros(max(needed, 2 * len(self._assignments)), dtype=np.int32)
+            grown[:len(self._assignments)] = self._assignments
+            self._assignments = grown
+        self._assignments[rows] = _nearest_centroids(vectors, self.centroids)
+        self._lists = None
+
+    def move_row(self, source, destination):
+        """
+        Mirrors LocalVectorIndex moving a vector from row source to row destination.
+        """
+        self._assignments[destination] = self._assignments[source]
+        self._lists = None
+
+    def _inverted_lists(self, count):
+        """
+        Returns rows grouped by cluster as (rows, offsets), rebuilt only after writes.
+        """
+        if self._lists is None or self._lists[2] != count:
+            assignments = self._assignments[:count]
+            rows = np.argsort(assignments, kind="stable")
+            offsets = np.searchsorted(assignments[rows], np.arange(self.nlist + 1))
+            self._lists = (rows, offsets, count)
+        return self._lists[0], self._lists[1]
+
+    def candidates(self, query_vector, count, nprobe=None):
+        """
+        Returns the rows in the nprobe clusters closest to query_vector.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query_vector
+        if nprobe < self.nlist:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.nlist)
+        rows, offsets = self._inverted_lists(count)
+        return np.concatenate([rows[offsets[cluster]:offsets[cluster + 1]] for cluster in probe])
+
+    def save(self, path, count):
+        """
+        Writes the centroids and row assignments to an .npz file.
+        """
+        with open(path, "wb") as f:
+            np.savez(f, centroids=self.centroids, assignments=self._assignments[:count],
+                     trained_size=np.int64(self.trained_size))
+
+    def load(self, path, count):
+        """
+        Restores a saved index if it matches the number of rows; returns whether it did.
+        """
+        with np.load(path) as stored:
+            if len(stored["assignments"]) != count or stored["centroids"].shape[0] != self.nlist:
+                return False
+            self.centroids = stored["centroids"]
+            self._assignments = np.array(stored["assignments"], dtype=np.int32)
+            self.trained_size = int(stored["trained_size"])
+        self._lists = None
+        return True
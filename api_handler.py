@@ -1,24 +1,70 @@
-import os
-from config import OPENAI_API_KEY, PINECONE_INDEX
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import Pinecone
-from langchain.chains import RetrievalQA, LLMChain
-from langchain.prompts import PromptTemplate
-from langchain.memory import ConversationBufferMemory
-from db_connector import retrieve_chunks, get_embeddings
-from utils import log_error, log_info
+import time
+from config import (
+    OPENAI_API_KEY,
+    PINECONE_INDEX,
+    RETRIEVAL_TOP_K,
+    CONTEXT_TOKEN_BUDGET,
+    RERANK_CANDIDATES,
+    MEMORY_TOKEN_LIMIT
+)
+from utils import log_error, log_info, lazy_imports
+from metrics import observe_stage, increment
 from ui import show_loading_message
 
+# langchain takes seconds to import, so chains are only loaded once an agent is needed
+__getattr__, _ensure_imports = lazy_imports(globals(), {
+    "ChatOpenAI": ("langchain_openai", "ChatOpenAI"),
+    "chat_client_kwargs": ("clients", "chat_client_kwargs"),
+    "Pinecone": ("retrieval", "TimedPinecone"),
+    "RetrievalQA": ("langchain.chains", "RetrievalQA"),
+    "LLMChain": ("langchain.chains", "LLMChain"),
+    "PromptTemplate": ("langchain.prompts", "PromptTemplate"),
+    "ConversationWindow": ("memory", "ConversationWindow"),
+    "WindowMemory": ("memory", "WindowMemory"),
+    "IndexRetriever": ("retrieval", "IndexRetriever"),
+    "ContextPacker": ("retrieval", "ContextPacker"),
+    "ContextualCompressionRetriever": ("langchain.retrievers", "ContextualCompressionRetriever"),
+    "LocalVectorIndex": ("vector_store", "LocalVectorIndex"),
+    "TokenStreamHandler": ("streaming", "TokenStreamHandler"),
+})
 
-def create_rag_agent(index, embeddings, model="gpt-4", return_sources=False):
+ERROR_RESPONSE = "I'm sorry, something went wrong. Please try again later."
+
+# The "stuff" prompt of RetrievalQA, with the conversation history added
+RETRIEVAL_PROMPT = """Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+{context}
+
+Conversation history:
+{history}
+
+Question: {question}
+Helpful Answer:"""
+
+
+def create_rag_agent(index, embeddings, model="gpt-4", return_sources=False, streaming=False, lexical_index=None,
+                     context_token_budget=CONTEXT_TOKEN_BUDGET, memory_token_limit=MEMORY_TOKEN_LIMIT, llm=None):
     """
-    Creates a Retrieval-Augmented Generation (RAG) agent with buffer memory for context.
+    Creates a Retrieval-Augmented Generation (RAG) agent with bounded memory for context.
+
+    Both the retrieval chain and the fallback chain keep the conversation in a
+    memory.ConversationWindow: recent turns verbatim up to memory_token_limit tokens and a
+    rolling summary of older ones, so the history sent with each query stays bounded.
 
     Args:
-        index (pinecone.Index or None): The Pinecone index instance or None for fallback.
+        index (pinecone.Index, LocalVectorIndex or None): The vector index, or None for fallback.
         embeddings (OpenAIEmbeddings): The embeddings instance.
         model (str): The OpenAI model to use (default: "gpt-4").
         return_sources (bool): Whether to return source documents (default: False).
+        streaming (bool): Whether the LLM streams tokens as they are generated (default: False).
+        lexical_index (bm25.BM25Index, optional): BM25 index for hybrid retrieval.
+        context_token_budget (int, optional): When positive, RERANK_CANDIDATES chunks are retrieved
+            and de-duplicated, reranked and packed into this many tokens (see retrieval.ContextPacker);
+            otherwise RETRIEVAL_TOP_K chunks are used as retrieved.
+        memory_token_limit (int, optional): Token budget of the verbatim conversation history;
+            0 disables memory for the retrieval chain.
+        llm (BaseChatModel, optional): Chat model to use instead of ChatOpenAI(model), such as
+            the offline stub in benchmarks.stubs. It also writes the conversation summaries.
 
     Returns:
         RetrievalQA or LLMChain: A chain with retrieval capabilities or memory-based fallback.
@@ -29,29 +75,65 @@ def create_rag_agent(index, embeddings, model="gpt-4", return_sources=False):
         raise ValueError("Invalid embeddings object provided.")
 
     try:
-        log_info(f"Creating RAG agent with model='{model}', return_sources={return_sources}.")
+        _ensure_imports()
+        log_info(
+            f"Creating RAG agent with model='{model}', return_sources={return_sources}, streaming={streaming}."
+        )
 
         # Initialize ChatOpenAI
-        llm = ChatOpenAI(model=model, openai_api_key=OPENAI_API_KEY)
+        if llm is None:
+            # stream_usage reports token counts for streamed responses too, for the metrics and the
+            # rate limiter; both models share the connection pools and the chat rate limiter
+            llm = ChatOpenAI(model=model, openai_api_key=OPENAI_API_KEY, streaming=streaming, stream_usage=True,
+                             **chat_client_kwargs())
+            # Summaries are written by a separate, non-streaming model so they never reach on_token
+            summarizer = ChatOpenAI(model=model, openai_api_key=OPENAI_API_KEY, **chat_client_kwargs())
+        else:
+            summarizer = llm
+        window = ConversationWindow(llm=summarizer, max_tokens=memory_token_limit)
 
         if index:
             # Retrieval-based RAG agent
-            vector_store = Pinecone(
-                index=index,
-                embedding=embeddings,
-                text_key="text"  # Ensure this matches the metadata key in Pinecone
-            )
-            log_info(f"Initialized Pinecone vector store successfully for index: '{PINECONE_INDEX}'.")
-
+            top_k = RERANK_CANDIDATES if context_token_budget > 0 else RETRIEVAL_TOP_K
+            if isinstance(index, LocalVectorIndex) or lexical_index is not None:
+                retriever = IndexRetriever(
+                    index=index, embeddings=embeddings, lexical_index=lexical_index, top_k=top_k
+                )
+                log_info(f"Initialized retriever (hybrid search: {lexical_index is not None}).")
+            else:
+                vector_store = Pinecone(
+                    index=index,
+                    embedding=embeddings,
+                    text_key="text"  # Ensure this matches the metadata key in Pinecone
+                )
+                retriever = vector_store.as_retriever(search_kwargs={"k": top_k})
+                log_info(f"Initialized Pinecone vector store successfully for index: '{PINECONE_INDEX}'.")
+            if context_token_budget > 0:
+                retriever = ContextualCompressionRetriever(
+                    base_compressor=ContextPacker(token_budget=context_token_budget), base_retriever=retriever
+                )
+
+            chain_kwargs = {}
+            if memory_token_limit > 0:
+                prompt = PromptTemplate(
+                    template=RETRIEVAL_PROMPT,
+                    input_variables=["context", "question"],
+                    partial_variables={"history": window.as_text}  # Read on every call
+                )
+                chain_kwargs = {
+                    "chain_type_kwargs": {"prompt": prompt},
+                    "memory": WindowMemory(window=window, input_key="query", output_key="result")
+                }
             qa_chain = RetrievalQA.from_chain_type(
                 llm=llm,
                 chain_type="stuff",
-                retriever=vector_store.as_retriever(),
-                return_source_documents=return_sources
+                retriever=retriever,
+                return_source_documents=return_sources,
+                **chain_kwargs
             )
             log_info("RetrievalQA chain created successfully.")
         else:
-            # Fallback to memory-based conversation with LLMChain and ConversationBufferMemory
+            # Fallback to memory-based conversation with LLMChain and the bounded window
             log_info("No Pinecone index detected; defaulting to memory-based responses.")
 
             # Prompt template for fallback responses
@@ -63,7 +145,7 @@ def create_rag_agent(index, embeddings, model="gpt-4", return_sources=False):
                 User: {input}
                 AI:"""
             )
-            memory = ConversationBufferMemory(memory_key="history", return_messages=True)
+            memory = WindowMemory(window=window, memory_key="history")
             qa_chain = LLMChain(prompt=prompt, llm=llm, memory=memory)
 
         return qa_chain
@@ -72,16 +154,34 @@ def create_rag_agent(index, embeddings, model="gpt-4", return_sources=False):
         raise RuntimeError("Failed to create RAG agent.") from e
 
 
-def generate_response_rag(qa_chain, query):
+def _extract_sources(response):
+    """
+    Returns the distinct sources of the documents a RetrievalQA response was based on.
+    """
+    sources = []
+    for document in response.get("source_documents") or []:
+        source = document.metadata.get("source")
+        if source and source not in sources:
+            sources.append(source)
+    return sources
+
+
+def generate_response_rag(qa_chain, query, on_token=None):
     """
     Generates a response from the RAG agent based on the user's query.
 
+    When on_token is given, tokens are passed to it as the LLM generates them (the agent
+    must be created with streaming=True), so the answer can be shown before it is complete.
+
     Args:
         qa_chain (RetrievalQA or LLMChain): The chain instance with or without retrieval.
         query (str): The user's query.
+        on_token (callable, optional): Called with each generated token.
 
     Returns:
-        str: The generated response.
+        dict: answer (str), sources (list of str), streamed (bool), time_to_first_token
+            (float or None, seconds), latency (float, seconds) and error (None on success,
+            otherwise the error message).
 
     Raises:
         ValueError: If query is invalid.
@@ -89,20 +189,46 @@ def generate_response_rag(qa_chain, query):
     if not isinstance(query, str) or not query.strip():
         raise ValueError("The query must be a non-empty string.")
 
+    start = time.perf_counter()
+    result = {"answer": ERROR_RESPONSE, "sources": [], "streamed": False, "time_to_first_token": None,
+              "error": None}
     try:
-        show_loading_message("Processing your query, please wait")
-        
+        _ensure_imports("RetrievalQA", "LLMChain", "TokenStreamHandler")
+        spinner = show_loading_message("Processing your query, please wait")
+        handler = TokenStreamHandler(on_token=on_token, on_first_token=spinner.stop)
+        config = {"callbacks": [handler]}
+
         # Check the type of qa_chain and use the correct input key
-        if isinstance(qa_chain, RetrievalQA):
-            response = qa_chain.invoke({"query": query})  # Use 'query' for RetrievalQA
-        elif isinstance(qa_chain, LLMChain):
-            response = qa_chain.invoke({"input": query})  # Use 'input' for LLMChain
+        with spinner:
+            if isinstance(qa_chain, RetrievalQA):
+                response = qa_chain.invoke({"query": query}, config=config)  # Use 'query' for RetrievalQA
+                answer_key = "result"
+            elif isinstance(qa_chain, LLMChain):
+                response = qa_chain.invoke({"input": query}, config=config)  # Use 'input' for LLMChain
+                answer_key = "text"
+            else:
+                raise ValueError("Unsupported chain type provided to generate_response_rag.")
+
+        if isinstance(response, dict):
+            result["answer"] = response.get(answer_key, "")
+            result["sources"] = _extract_sources(response)
         else:
-            raise ValueError("Unsupported chain type provided to generate_response_rag.")
-
-        log_info(f"Generated response for query: '{query}'")
-        return response
+            result["answer"] = str(response)
+        result["streamed"] = handler.streamed
+        result["time_to_first_token"] = handler.time_to_first_token
+        result["latency"] = time.perf_counter() - start
+        observe_stage("query", result["latency"])
+        if handler.streamed:
+            observe_stage("time_to_first_token", result["time_to_first_token"])
+        ttft = f"{result['time_to_first_token']:.3f}s" if handler.streamed else "n/a"
+        log_info(
+            f"Generated response for query: '{query}' "
+            f"(time to first token {ttft}, latency {result['latency']:.3f}s)",
+            hot=True, time_to_first_token=result["time_to_first_token"], latency=result["latency"]
+        )
     except Exception as e:
+        result["latency"] = time.perf_counter() - start
+        result["error"] = str(e)
+        increment("rag_query_errors_total", description="Queries that failed.")
         log_error(f"Error generating response for query '{query}': {e}")
-        return "I'm sorry, something went wrong. Please try again later."
-   
\ No newline at end of file
+    return result
@@ -0,0 +1,251 @@
+import asyncio
+import time
+from collections import OrderedDict
+from langchain_core.messages import HumanMessage, SystemMessage
+from config import (
+    OPENAI_API_KEY,
+    QUERY_MAX_CONCURRENCY,
+    QUERY_TIMEOUT_SECONDS,
+    SESSION_IDLE_SECONDS,
+    SESSION_MAX_COUNT,
+    RETRIEVAL_TOP_K,
+    CONTEXT_TOKEN_BUDGET,
+    RERANK_CANDIDATES,
+    MEMORY_TOKEN_LIMIT
+)
+from memory import ConversationWindow
+from metrics import timed, observe_stage, increment
+from retrieval import hybrid_search, select_context
+from utils import log_error, log_info
+
+SYSTEM_PROMPT = (
+    "You are a helpful AI assistant. Answer the user's question using the context below. "
+    "If the context does not contain the answer, answer from general knowledge.\n\nContext:\n{context}"
+)
+FALLBACK_SYSTEM_PROMPT = "You are a helpful AI assistant. Use the conversation history to maintain context."
+TIMEOUT_RESPONSE = "I'm sorry, that took too long. Please try again."
+ERROR_RESPONSE = "I'm sorry, something went wrong. Please try again later."
+
+
+class AsyncQueryEngine:
+    """
+    asyncio query engine that serves many concurrent conversations from one process.
+
+    Each query embeds the question (embeddings.aembed_query), searches the index on a
+    worker thread (the Pinecone and local index clients are synchronous) and streams the
+    answer from the chat model (llm.astream). Every session keeps its own history in a
+    memory.ConversationWindow, so long sessions send a bounded number of history tokens;
+    the turns it evicts are summarized in the background, after the query has returned.
+    At most max_concurrency queries run at once; the rest wait their turn, and a query
+    that does not finish within timeout seconds (including that wait) is abandoned.
+    Sessions idle for session_idle_seconds are forgotten, as are the least recently used
+    beyond max_sessions, so clients that never end their sessions do not grow memory.
+    """
+
+    def __init__(self, index, embeddings, llm, top_k=RETRIEVAL_TOP_K, max_concurrency=QUERY_MAX_CONCURRENCY,
+                 timeout=QUERY_TIMEOUT_SECONDS, lexical_index=None, context_token_budget=CONTEXT_TOKEN_BUDGET,
+                 memory_token_limit=MEMORY_TOKEN_LIMIT, session_idle_seconds=SESSION_IDLE_SECONDS,
+                 max_sessions=SESSION_MAX_COUNT):
+        """
+        Args:
+            index (pinecone.Index, LocalVectorIndex or None): The vector index, or None to
+                answer from general knowledge only.
+            embeddings (Embeddings): Embeddings used to embed queries.
+            llm (BaseChatModel): Chat model used to generate answers.
+            top_k (int, optional): Number of chunks used per query when context packing is off.
+            max_concurrency (int, optional): Maximum number of queries processed at once.
+            timeout (float, optional): Seconds before a query is abandoned.
+            lexical_index (bm25.BM25Index, optional): BM25 index for hybrid retrieval.
+            context_token_budget (int, optional): When positive, RERANK_CANDIDATES chunks are
+                retrieved and packed into this many tokens (see retrieval.select_context).
+            memory_token_limit (int, optional): Token budget of each session's verbatim history;
+                older turns are summarized by llm.
+            session_idle_seconds (float, optional): Seconds after its last query that a session is forgotten.
+            max_sessions (int, optional): Maximum number of sessions kept.
+        """
+        self.index = index
+        self.embeddings = embeddings
+        self.llm = llm
+        self.top_k = top_k
+        self.lexical_index = lexical_index
+        self.context_token_budget = context_token_budget
+        self.timeout = timeout
+        self.memory_token_limit = memory_token_limit
+        self.session_idle_seconds = session_idle_seconds
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()  # session_id -> ConversationWindow, least recently used first
+        self._last_used = {}
+        self._summaries = {}  # session_id -> task folding evicted turns into the session's summary
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def get_memory(self, session_id):
+        """
+        Returns a session's ConversationWindow, creating it on first use. Idle sessions, and the
+        least recently used beyond max_sessions, are evicted.
+        """
+        now = time.monotonic()
+        while self.sessions:
+            oldest = next(iter(self.sessions))
+            if oldest == session_id or now - self._last_used[oldest] < self.session_idle_seconds:
+                break
+            self.end_session(oldest)
+        if session_id not in self.sessions:
+            self.sessions[session_id] = ConversationWindow(llm=self.llm, max_tokens=self.memory_token_limit)
+        self.sessions.move_to_end(session_id)
+        self._last_used[session_id] = now
+        while len(self.sessions) > max(self.max_sessions, 1):
+            self.end_session(next(iter(self.sessions)))
+        return self.sessions[session_id]
+
+    def get_history(self, session_id):
+        """
+        Returns a session's history as chat messages: its summary, if any, then recent turns.
+        """
+        return self.get_memory(session_id).messages()
+
+    def end_session(self, session_id):
+        """
+        Forgets a session's history.
+        """
+        self.sessions.pop(session_id, None)
+        self._last_used.pop(session_id, None)
+
+    def _record_turn(self, session_id, query, answer):
+        """
+        Adds a finished turn to the session's history. Turns it evicts are summarized by a
+        background task, chained after the session's previous one, so the summary call counts
+        against neither the query's timeout nor the concurrency limit.
+        """
+        evicted = self.get_memory(session_id).record_turn(query, answer)
+        if not evicted:
+            return
+        task = asyncio.create_task(self._summarize(self.get_memory(session_id), evicted,
+                                                   self._summaries.get(session_id)))
+        self._summaries[session_id] = task
+        task.add_done_callback(
+            lambda done: self._summaries.pop(session_id) if self._summaries.get(session_id) is done else None
+        )
+
+    async def _summarize(self, memory, evicted, previous):
+        if previous is not None:
+            await previous
+        await memory.asummarize(evicted)
+
+    @timed("vector_query")
+    def _search(self, query, query_vector):
+        if self.context_token_budget <= 0:
+            return hybrid_search(self.index, query, query_vector, self.lexical_index, top_k=self.top_k)
+        matches = hybrid_search(self.index, query, query_vector, self.lexical_index, top_k=RERANK_CANDIDATES)
+        texts = [match["metadata"].get("text", "") for match in matches]
+        return [matches[position] for position in select_context(query, texts, self.context_token_budget)]
+
+    async def _retrieve(self, query):
+        query_vector = await self.embeddings.aembed_query(query)
+        matches = await asyncio.to_thread(self._search, query, query_vector)
+        return [match["metadata"] for match in matches]
+
+    async def _answer(self, session_id, query, on_token, result, start):
+        async with self._semaphore:
+            sources = []
+            if self.index is not None:
+                chunks = await self._retrieve(query)
+                context = "\n\n".join(chunk.get("text", "") for chunk in chunks)
+                system_prompt = SYSTEM_PROMPT.format(context=context)
+                for chunk in chunks:
+                    if chunk.get("source") and chunk["source"] not in sources:
+                        sources.append(chunk["source"])
+            else:
+                system_prompt = FALLBACK_SYSTEM_PROMPT
+
+            memory = self.get_memory(session_id)
+            messages = [SystemMessage(content=system_prompt), *memory.messages(), HumanMessage(content=query)]
+            tokens = []
+            llm_start = time.perf_counter()
+            async for chunk in self.llm.astream(messages):
+                if not chunk.content:
+                    continue
+                if not tokens:
+                    result["time_to_first_token"] = time.perf_counter() - start
+                tokens.append(chunk.content)
+                if on_token:
+                    on_token(chunk.content)
+
+            observe_stage("llm", time.perf_counter() - llm_start)
+            answer = "".join(tokens)
+            result.update(answer=answer, sources=sources, streamed=bool(tokens))
+
+    async def query(self, session_id, query, on_token=None):
+        """
+        Answers a query within a session.
+
+        Args:
+            session_id (str): Identifies the conversation the query belongs to.
+            query (str): The user's query.
+            on_token (callable, optional): Called with each generated token.
+
+        Returns:
+            dict: The same fields as api_handler.generate_response_rag (answer, sources,
+                streamed, time_to_first_token, latency) plus error, which is None on
+                success, 'timeout' or the error message.
+
+        Raises:
+            ValueError: If query is invalid.
+        """
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("The query must be a non-empty string.")
+
+        start = time.perf_counter()
+        result = {"answer": ERROR_RESPONSE, "sources": [], "streamed": False, "time_to_first_token": None,
+                  "error": None}
+        # The prompt needs the summary of the turns the session's last query evicted
+        if session_id in self._summaries:
+            await self._summaries[session_id]
+        try:
+            await asyncio.wait_for(self._answer(session_id, query, on_token, result, start), self.timeout)
+            self._record_turn(session_id, query, result["answer"])
+            log_info(
+                f"Answered query in session '{session_id}' in {time.perf_counter() - start:.3f}s.",
+                hot=True, session_id=session_id, latency=time.perf_counter() - start
+            )
+        except asyncio.TimeoutError:
+            result.update(answer=TIMEOUT_RESPONSE, error="timeout")
+            increment("rag_query_timeouts_total", description="Queries abandoned after the timeout.")
+            log_error(f"Query in session '{session_id}' timed out after {self.timeout}s.")
+        except Exception as e:
+            result["error"] = str(e)
+            increment("rag_query_errors_total", description="Queries that failed.")
+            log_error(f"Error answering query in session '{session_id}': {e}")
+        result["latency"] = time.perf_counter() - start
+        if result["error"] is None:
+            observe_stage("query", result["latency"])
+            if result["time_to_first_token"] is not None:
+                observe_stage("time_to_first_token", result["time_to_first_token"])
+        return result
+
+
+def create_query_engine(index, embeddings, model="gpt-4", **kwargs):
+    """
+    Creates an AsyncQueryEngine backed by a streaming OpenAI chat model.
+
+    Args:
+        index (pinecone.Index, LocalVectorIndex or None): The vector index, or None for fallback.
+        embeddings (Embeddings): The embeddings instance.
+        model (str): The OpenAI model to use (default: "gpt-4").
+        **kwargs: Passed on to AsyncQueryEngine (top_k, max_concurrency, timeout, lexical_index,
+            context_token_budget, memory_token_limit, session_idle_seconds, max_sessions).
+
+    Returns:
+        AsyncQueryEngine: The engine.
+    """
+    if index is not None and not hasattr(index, "query"):
+        raise ValueError("Invalid Pinecone index provided.")
+    if not embeddings or not hasattr(embeddings, "aembed_query"):
+        raise ValueError("Invalid embeddings object provided.")
+
+    from langchain_openai import ChatOpenAI
+    from clients import chat_client_kwargs
+
+    llm = ChatOpenAI(model=model, openai_api_key=OPENAI_API_KEY, streaming=True, stream_usage=True,
+                     **chat_client_kwargs())
+    log_info(f"Created async query engine with model='{model}'.")
+    return AsyncQueryEngine(index, embeddings, llm, **kwargs)
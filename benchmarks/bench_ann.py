@@ -0,0 +1,101 @@
+"""
+Compares exact (flat) and approximate (IVF) search in the local vector index.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ann
+    python -m benchmarks.bench_ann --vectors 200000 --dimension 1536 --nlist 1024 --nprobe 4 16 64
+
+Vectors are drawn around random cluster centres, like embeddings of documents on a
+number of topics. For each nprobe value this prints recall@k against exact search and
+the mean query latency. Pass --json to print the results as JSON instead.
+"""
+import argparse
+import json
+import tempfile
+import time
+import numpy as np
+from vector_store import LocalVectorIndex
+
+
+def clustered_vectors(count, dimension, clusters, spread=0.35, seed=0):
+    """
+    Generates count vectors scattered around clusters random directions.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    noise = rng.standard_normal((count, dimension)).astype(np.float32) * spread / np.sqrt(dimension)
+    return centres[rng.integers(clusters, size=count)] + noise
+
+
+def _build(path, vectors, index_type, nlist, batch_size=10000):
+    index = LocalVectorIndex(path, vectors.shape[1], index_type=index_type, nlist=nlist)
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        index.upsert([(str(start + i), row, {}) for i, row in enumerate(batch)])
+    return index
+
+
+def _search(index, queries, top_k, **kwargs):
+    start = time.perf_counter()
+    results = [
+        [match["id"] for match in index.query(vector=query, top_k=top_k, **kwargs).matches]
+        for query in queries
+    ]
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def run(vectors, queries, top_k, nlist, nprobes):
+    """
+    Searches queries exactly and with IVF at each nprobe, returning one result dict per run.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flat = _build(f"{tmp_dir}/flat", vectors, "flat", nlist)
+        start = time.perf_counter()
+        ivf = _build(f"{tmp_dir}/ivf", vectors, "ivf", nlist)
+        build_seconds = time.perf_counter() - start
+
+        exact, flat_latency = _search(flat, queries, top_k)
+        results = [{"index": "flat", "nprobe": None, "recall": 1.0, "latency_ms": flat_latency * 1000}]
+        for nprobe in nprobes:
+            approximate, latency = _search(ivf, queries, top_k, nprobe=nprobe)
+            recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approximate, exact)])
+            results.append({
+                "index": "ivf", "nprobe": nprobe, "recall": float(recall), "latency_ms": latency * 1000,
+                "build_seconds": build_seconds,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=500, help="Number of topics in the synthetic data.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    data = clustered_vectors(args.vectors + args.queries, args.dimension, args.clusters)
+    vectors, queries = data[:args.vectors], data[args.vectors:]
+    results = run(vectors, queries, args.top_k, args.nlist, args.nprobe)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.vectors:,} vectors of dimension {args.dimension}, {args.queries} queries, top_k={args.top_k}")
+    print(f"{'index':<6} {'nprobe':>7} {'recall@k':>9} {'ms/query':>9} {'speedup':>8}")
+    flat_latency = results[0]["latency_ms"]
+    for result in results:
+        print(
+            f"{result['index']:<6} {result['nprobe'] or '-':>7} {result['recall']:>9.3f} "
+            f"{result['latency_ms']:>9.3f} {flat_latency / result['latency_ms']:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
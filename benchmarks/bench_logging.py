@@ -0,0 +1,101 @@
+"""
+Measures what a log_info call costs the caller.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_logging
+    python -m benchmarks.bench_logging --messages 50000 --threads 8 --sample-rate 0.1
+
+Each thread logs --messages messages of the size of a typical query log line, first
+through a synchronous file handler (how logging was configured before) and then through
+the queued pipeline of utils.configure_logging. This prints the mean and p99 time per call
+as seen by the logging thread. Pass --json to print the results as JSON instead.
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+import utils
+
+
+def _log_from_threads(messages, threads, hot):
+    timings = []
+
+    def worker(worker_id):
+        local = np.empty(messages)
+        for i in range(messages):
+            start = time.perf_counter()
+            utils.log_info(f"Generated response for query 'what is item {i}?' in worker {worker_id} "
+                           f"(time to first token 0.412s, latency 1.873s)", hot=hot)
+            local[i] = time.perf_counter() - start
+        timings.append(local)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return np.concatenate(timings)
+
+
+def _summary(name, timings):
+    return {
+        "pipeline": name,
+        "calls": len(timings),
+        "mean_us": float(timings.mean() * 1e6),
+        "p99_us": float(np.percentile(timings, 99) * 1e6),
+    }
+
+
+def run(messages, threads, sample_rate):
+    """
+    Times log_info with a synchronous handler, the queue and the queue with sampling.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        utils.shutdown_logging()
+        root = logging.getLogger()
+        sync_handler = logging.FileHandler(os.path.join(tmp_dir, "sync.log"))
+        sync_handler.setFormatter(logging.Formatter(utils.TEXT_LOG_FORMAT))
+        root.addHandler(sync_handler)
+        try:
+            results.append(_summary("synchronous file", _log_from_threads(messages, threads, hot=False)))
+        finally:
+            root.removeHandler(sync_handler)
+            sync_handler.close()
+
+        utils.configure_logging(log_file=os.path.join(tmp_dir, "queued.log"))
+        results.append(_summary("queued json", _log_from_threads(messages, threads, hot=True)))
+        utils.configure_logging(log_file=os.path.join(tmp_dir, "sampled.log"), sample_rate=sample_rate)
+        results.append(_summary(f"queued json, sampled {sample_rate:g}",
+                                _log_from_threads(messages, threads, hot=True)))
+        utils.shutdown_logging()
+    utils.configure_logging()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000, help="Messages logged per thread.")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    results = run(args.messages, args.threads, args.sample_rate)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.threads} threads x {args.messages:,} messages")
+    print(f"{'pipeline':<28} {'mean us':>9} {'p99 us':>9}")
+    for result in results:
+        print(f"{result['pipeline']:<28} {result['mean_us']:>9.2f} {result['p99_us']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
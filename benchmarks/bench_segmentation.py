@@ -0,0 +1,85 @@
+"""
+Compares the throughput of the chunk_text sentence segmentation backends.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_segmentation
+    python -m benchmarks.bench_segmentation --chars 2000000 --files docs/a.txt docs/b.txt
+
+For each backend this prints throughput in characters per second and how closely its
+chunks match the 'spacy' backend (the share of baseline chunks reproduced exactly).
+"""
+import argparse
+import random
+import time
+from file_handler import SEGMENTERS, chunk_text, read_file
+
+_WORDS = (
+    "the retrieval model index vector query document chunk answer system data user "
+    "embedding search result context prompt token latency cost network service part number"
+).split()
+
+
+def synthetic_text(num_chars, seed=0):
+    """
+    Generates deterministic English-like text with sentences and paragraphs.
+    """
+    rng = random.Random(seed)
+    paragraphs = []
+    size = 0
+    while size < num_chars:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            words = [rng.choice(_WORDS) for _ in range(rng.randint(6, 24))]
+            sentences.append(" ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"]))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:num_chars]
+
+
+def run(text, chunk_size, chunk_overlap, repeat):
+    """
+    Chunks text with every backend and returns one result dict per backend.
+    """
+    results = []
+    baseline = None
+    for segmenter in SEGMENTERS:
+        chunk_text(text[:1000], chunk_size, chunk_overlap, segmenter=segmenter)  # warm up model loading
+        start = time.perf_counter()
+        for _ in range(repeat):
+            chunks = chunk_text(text, chunk_size, chunk_overlap, segmenter=segmenter)
+        elapsed = (time.perf_counter() - start) / repeat
+        if baseline is None:
+            baseline = set(chunks)
+        results.append({
+            "segmenter": segmenter,
+            "chars_per_sec": len(text) / elapsed if elapsed else float("inf"),
+            "seconds": elapsed,
+            "chunks": len(chunks),
+            "agreement": len(baseline.intersection(chunks)) / len(baseline) if baseline else 1.0,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, default=500000, help="Size of the synthetic text.")
+    parser.add_argument("--files", nargs="*", help="Benchmark on these documents instead of synthetic text.")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = "\n\n".join(read_file(path) for path in args.files) if args.files else synthetic_text(args.chars)
+    print(f"Segmenting {len(text):,} characters ({args.repeat} runs per backend)")
+    print(f"{'segmenter':<12} {'chars/sec':>14} {'seconds':>9} {'chunks':>8} {'agreement':>10}")
+    for result in run(text, args.chunk_size, args.chunk_overlap, args.repeat):
+        print(
+            f"{result['segmenter']:<12} {result['chars_per_sec']:>14,.0f} {result['seconds']:>9.3f} "
+            f"{result['chunks']:>8} {result['agreement']:>10.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
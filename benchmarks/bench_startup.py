@@ -0,0 +1,81 @@
+"""
+Measures CLI startup time and reports which imports it is spent on.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --module main --top 20 --max-ms 300
+
+Each run imports the module in a fresh interpreter with `-X importtime`. The report
+lists the slowest imports by cumulative time (the same numbers `python -X importtime`
+prints), and --max-ms makes the script exit non-zero when the median import time of the
+module exceeds the budget, so it can guard against startup regressions in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr):
+    """
+    Parses `-X importtime` output into {module: (self_us, cumulative_us)}.
+    """
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def measure(module):
+    """
+    Imports module in a fresh interpreter and returns its import timings.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=REPO_ROOT, check=True
+    )
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="Module to import (default: main).")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list.")
+    parser.add_argument("--max-ms", type=float, help="Fail if the median import time exceeds this.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    median_ms = statistics.median(run[args.module][1] for run in runs) / 1000
+    last_run = runs[-1]
+    slowest = sorted(last_run.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            "module": args.module,
+            "median_ms": median_ms,
+            "runs_ms": [run[args.module][1] / 1000 for run in runs],
+            "slowest": [{"module": name, "self_ms": s / 1000, "cumulative_ms": c / 1000} for name, (s, c) in slowest],
+        }, indent=2))
+    else:
+        print(f"import {args.module}: median {median_ms:.1f} ms over {args.runs} runs")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for name, (self_us, cumulative_us) in slowest:
+            print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print(f"Startup regression: {median_ms:.1f} ms exceeds the {args.max_ms:.1f} ms budget.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Synthetic document corpora for benchmarks: deterministic TXT, DOCX and PDF files of
+English-like text, so runs on different machines parse and chunk the same content.
+"""
+import os
+import random
+
+_WORDS = (
+    "the of and to in is that for it as with was on be by at this are from or have an they which one "
+    "you were all we her she there would their will when who him been has more if no out so said what "
+    "up its about into than them can only other new some could time these two may then do first any "
+    "like now my such make over our even most me state after also made many did must before back see "
+    "through way where get much go well your know should down work year because come people just say "
+    "each those take day good how long little world still own under last right place while around "
+    "system index vector query document chunk model latency memory network service request response "
+    "customer order invoice shipping refund account password report policy contract product release"
+).split()
+_IDENTIFIERS = ("XR-2000", "v1.2.3", "SKU-4471", "INC-0098", "api_v2", "RFC-7231")
+
+FORMATS = ("txt", "docx", "pdf")
+
+
+def synthetic_paragraphs(count, rng, sentences=6):
+    """
+    Returns count paragraphs of sentences made of common words and the odd identifier.
+    """
+    paragraphs = []
+    for _ in range(count):
+        sentence_list = []
+        for _ in range(sentences):
+            words = rng.choices(_WORDS, k=rng.randint(8, 24))
+            if rng.random() < 0.15:
+                words.insert(rng.randrange(len(words)), rng.choice(_IDENTIFIERS))
+            sentence_list.append(" ".join(words).capitalize() + ".")
+        paragraphs.append(" ".join(sentence_list))
+    return paragraphs
+
+
+def write_txt(path, paragraphs):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs))
+
+
+def write_docx(path, paragraphs):
+    import docx
+
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def write_pdf(path, paragraphs):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", size=11)
+    for paragraph in paragraphs:
+        pdf.multi_cell(0, 5, paragraph)
+        pdf.ln(3)
+    pdf.output(path)
+
+
+_WRITERS = {"txt": write_txt, "docx": write_docx, "pdf": write_pdf}
+
+
+def generate_corpus(directory, files=30, paragraphs=20, formats=FORMATS, seed=0):
+    """
+    Writes files documents to directory, cycling through formats.
+
+    Args:
+        directory (str): Directory to write to; created if missing.
+        files (int, optional): Number of documents.
+        paragraphs (int, optional): Paragraphs per document (about 100 words each).
+        formats (sequence of str, optional): Any of "txt", "docx" and "pdf".
+        seed (int, optional): Seed for the text, so the same arguments give the same corpus.
+
+    Returns:
+        list of str: Paths of the written files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(files):
+        extension = formats[i % len(formats)]
+        path = os.path.join(directory, f"doc{i:04d}.{extension}")
+        _WRITERS[extension](path, synthetic_paragraphs(paragraphs, rng))
+        paths.append(path)
+    return paths
@@ -0,0 +1,115 @@
+"""
+Load-tests the async query engine against local stub backends.
+
+Run from the repository root:
+
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --sessions 200 --queries 5 --concurrency 32 --llm-latency 0.5
+
+A local vector index is filled with stub-embedded chunks, then many sessions query the
+engine at once, each asking its questions one after another. This prints throughput,
+latency and time-to-first-token percentiles, and the number of timed-out queries.
+Pass --json to print the results as JSON instead.
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+import numpy as np
+from async_engine import AsyncQueryEngine
+from benchmarks.stubs import StubChatModel, StubEmbeddings
+from clients import TimedEmbeddings
+from vector_store import LocalVectorIndex
+
+
+def build_index(path, embeddings, chunks):
+    """
+    Creates a local index holding chunks stub documents.
+    """
+    index = LocalVectorIndex(path, embeddings.dimension)
+    texts = [f"Document chunk {i} about topic {i % 50}." for i in range(chunks)]
+    vectors = embeddings.embed_documents(texts)
+    index.upsert([
+        (f"chunk-{i}", vector, {"text": text, "source": f"doc{i % 50}.txt"})
+        for i, (text, vector) in enumerate(zip(texts, vectors))
+    ])
+    return index
+
+
+async def _session(engine, session_id, queries):
+    results = []
+    for i in range(queries):
+        results.append(await engine.query(session_id, f"Question {i} from {session_id}?"))
+    return results
+
+
+async def run_load(engine, sessions, queries):
+    """
+    Runs sessions concurrent sessions of queries sequential queries each.
+
+    Returns:
+        dict: Throughput, latency and time-to-first-token percentiles, and error counts.
+    """
+    start = time.perf_counter()
+    per_session = await asyncio.gather(*(_session(engine, f"session-{i}", queries) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    results = [result for session_results in per_session for result in session_results]
+    latencies = [result["latency"] for result in results if not result["error"]]
+    ttfts = [result["time_to_first_token"] for result in results if result["time_to_first_token"] is not None]
+
+    def percentiles(values):
+        if not values:
+            return {"p50": None, "p95": None, "p99": None}
+        return {f"p{q}": float(np.percentile(values, q)) for q in (50, 95, 99)}
+
+    return {
+        "queries": len(results),
+        "seconds": elapsed,
+        "queries_per_sec": len(results) / elapsed if elapsed else float("inf"),
+        "latency": percentiles(latencies),
+        "time_to_first_token": percentiles(ttfts),
+        "timeouts": sum(result["error"] == "timeout" for result in results),
+        "errors": sum(bool(result["error"]) and result["error"] != "timeout" for result in results),
+        "peak_llm_concurrency": engine.llm.max_in_flight,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100, help="Number of concurrent sessions.")
+    parser.add_argument("--queries", type=int, default=3, help="Queries per session.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Engine concurrency limit.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-query timeout in seconds.")
+    parser.add_argument("--chunks", type=int, default=10000, help="Chunks in the stub index.")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="Stub embedding latency in seconds.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub time to first token in seconds.")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Stub delay between tokens in seconds.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    embeddings = TimedEmbeddings(StubEmbeddings(latency=args.embed_latency))
+    llm = StubChatModel(first_token_latency=args.llm_latency, token_latency=args.token_latency)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = build_index(tmp_dir, StubEmbeddings(), args.chunks)
+        engine = AsyncQueryEngine(index, embeddings, llm, max_concurrency=args.concurrency, timeout=args.timeout)
+        results = asyncio.run(run_load(engine, args.sessions, args.queries))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    def fmt(values):
+        return " / ".join("-" if value is None else f"{value * 1000:.0f}" for value in values.values())
+
+    print(f"{results['queries']} queries from {args.sessions} sessions in {results['seconds']:.2f}s "
+          f"({results['queries_per_sec']:.1f} queries/sec)")
+    print(f"latency p50/p95/p99 (ms):             {fmt(results['latency'])}")
+    print(f"time to first token p50/p95/p99 (ms): {fmt(results['time_to_first_token'])}")
+    print(f"timeouts: {results['timeouts']}  errors: {results['errors']}  "
+          f"peak LLM concurrency: {results['peak_llm_concurrency']}")
+
+
+if __name__ == "__main__":
+    main()
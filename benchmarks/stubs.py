@@ -0,0 +1,148 @@
+"""
+Local stand-ins for the OpenAI embedding and chat APIs and the Pinecone index, for load
+tests and benchmarks.
+
+They return deterministic results after a configurable delay, so the app's own
+overheads and concurrency behaviour can be measured without network access or cost.
+"""
+import asyncio
+import hashlib
+import time
+import numpy as np
+from pydantic import Field
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from vector_store import LocalVectorIndex
+
+
+class StubEmbeddings(Embeddings):
+    """
+    Embeddings derived from a hash of the text, returned after latency seconds.
+    """
+
+    def __init__(self, dimension=64, latency=0.0):
+        self.dimension = dimension
+        self.latency = latency
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Chat model that answers with a canned text, with a delay before the first token and
+    between tokens. It records the messages of every call and the peak number of
+    concurrent calls, and works both inside LangChain chains (invoke, streaming through
+    callbacks) and on its own (astream, ainvoke).
+    """
+
+    answer: str = "This is a stub answer."
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    streaming: bool = False
+    calls: list = Field(default_factory=list)
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    @property
+    def tokens(self):
+        return [word + " " for word in self.answer.split()]
+
+    def _should_stream(self, *, async_api, run_manager=None, **kwargs):
+        return self.streaming or super()._should_stream(async_api=async_api, run_manager=run_manager, **kwargs)
+
+    def _enter(self, messages):
+        self.calls.append(list(messages))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._enter(messages)
+        try:
+            time.sleep(self.first_token_latency)
+            for i, token in enumerate(self.tokens):
+                if i:
+                    time.sleep(self.token_latency)
+                if run_manager:
+                    run_manager.on_llm_new_token(token)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        finally:
+            self.in_flight -= 1
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._enter(messages)
+        try:
+            await asyncio.sleep(self.first_token_latency)
+            for i, token in enumerate(self.tokens):
+                if i:
+                    await asyncio.sleep(self.token_latency)
+                if run_manager:
+                    await run_manager.on_llm_new_token(token)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        finally:
+            self.in_flight -= 1
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        content = "".join(chunk.message.content for chunk in self._stream(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        content = "".join([chunk.message.content async for chunk in self._astream(messages)])
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+class StubPineconeIndex:
+    """
+    Pinecone index stand-in: a LocalVectorIndex whose calls each take latency seconds,
+    like a network round trip. It has no save method, so the app treats it as remote.
+    """
+
+    def __init__(self, path, dimension, latency=0.0, **kwargs):
+        """
+        Args:
+            path (str): Directory the wrapped local index is stored in.
+            dimension (int): Vector dimension.
+            latency (float, optional): Seconds added to every call.
+            **kwargs: Passed on to LocalVectorIndex (index_type, nlist, nprobe).
+        """
+        self._index = LocalVectorIndex(path, dimension, **kwargs)
+        self.latency = latency
+
+    def upsert(self, vectors, **kwargs):
+        time.sleep(self.latency)
+        return self._index.upsert(vectors, **kwargs)
+
+    def delete(self, **kwargs):
+        time.sleep(self.latency)
+        return self._index.delete(**kwargs)
+
+    def query(self, **kwargs):
+        time.sleep(self.latency)
+        return self._index.query(**kwargs)
+
+    def describe_index_stats(self, **kwargs):
+        time.sleep(self.latency)
+        return self._index.describe_index_stats(**kwargs)
@@ -0,0 +1,291 @@
+"""
+End-to-end benchmark suite that runs offline against stub backends.
+
+Run from the repository root:
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --scenarios chunk_text retrieve_chunks --baseline results.json
+
+A synthetic corpus of TXT, DOCX and PDF files is generated, then each scenario times a
+part of the pipeline: process_files, chunk_text, add_chunks_to_pinecone, retrieve_chunks
+and generate_response_rag. process_files parses every file, while process_files_cached
+reads the PDF and DOCX text from a warm parsed text cache. OpenAI and Pinecone are replaced by the stubs in
+benchmarks.stubs, with the latencies set by --embed-latency, --index-latency and
+--llm-latency, so results depend only on this code and the machine. Retrieval is hybrid,
+with a BM25 index built alongside the vector index, as with the default HYBRID_SEARCH=true.
+
+Results are printed as a table and, with --output, written as JSON: per scenario the run
+count, latency percentiles, throughput and the per-stage breakdown from metrics. With
+--baseline, p50 latencies are compared with an earlier results file and the exit status
+is 1 if any scenario is slower than --max-regression times its baseline.
+
+Token counting uses tiktoken; on an air-gapped machine copy its cl100k_base file into
+TIKTOKEN_CACHE_DIR first.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import numpy as np
+import metrics
+from benchmarks.corpus import FORMATS, generate_corpus, synthetic_paragraphs
+from benchmarks.stubs import StubChatModel, StubEmbeddings, StubPineconeIndex
+from clients import TimedEmbeddings
+
+SCENARIOS = ("process_files", "process_files_cached", "chunk_text", "add_chunks_to_pinecone", "retrieve_chunks",
+             "generate_response_rag")
+
+
+def summarize(durations, items=None):
+    """
+    Returns latency statistics for a list of durations in seconds, and the throughput in
+    items per second if items (processed over all runs) is given.
+    """
+    durations = np.asarray(durations, dtype=float)
+    summary = {
+        "runs": len(durations),
+        "mean_s": float(durations.mean()),
+        "p50_s": float(np.percentile(durations, 50)),
+        "p95_s": float(np.percentile(durations, 95)),
+        "p99_s": float(np.percentile(durations, 99)),
+        "max_s": float(durations.max()),
+    }
+    if items is not None:
+        summary["items_per_sec"] = items / durations.sum() if durations.sum() else float("inf")
+    return summary
+
+
+def _stage_breakdown():
+    return {
+        entry["labels"]["stage"]: {key: entry[key] for key in ("count", "p50", "p95", "p99")}
+        for entry in metrics.REGISTRY.snapshot().get("rag_stage_duration_seconds", [])
+    }
+
+
+def _records(ctx):
+    if ctx.records is None:
+        from file_handler import iter_chunks
+        ctx.records = list(iter_chunks(ctx.corpus_dir, text_cache_path=""))
+    return ctx.records
+
+
+def _new_indexes(ctx, name):
+    from bm25 import BM25Index
+
+    path = os.path.join(ctx.tmp_dir, name)
+    index = StubPineconeIndex(os.path.join(path, "vectors"), ctx.embeddings.dimension, latency=ctx.index_latency)
+    return index, BM25Index(os.path.join(path, "bm25"))
+
+
+def _filled_indexes(ctx):
+    """
+    Returns a stub Pinecone index and a BM25 index holding the corpus, built on first use.
+    """
+    if ctx.index is None:
+        from db_connector import add_chunks_to_pinecone
+        ctx.index, ctx.lexical_index = _new_indexes(ctx, "index")
+        add_chunks_to_pinecone(ctx.index, _records(ctx), ctx.embeddings, lexical_index=ctx.lexical_index)
+    return ctx.index, ctx.lexical_index
+
+
+def _queries(ctx):
+    rng = random.Random(1)
+    return [paragraph.split(".")[0] + "?" for paragraph in synthetic_paragraphs(ctx.queries, rng, sentences=1)]
+
+
+def bench_process_files(ctx):
+    from file_handler import process_files
+
+    durations, chunks = [], 0
+    for _ in range(ctx.repeats):
+        start = time.perf_counter()
+        chunks = len(process_files(ctx.corpus_dir, text_cache_path=""))
+        durations.append(time.perf_counter() - start)
+    return dict(summarize(durations, items=len(ctx.paths) * ctx.repeats), files=len(ctx.paths), chunks=chunks)
+
+
+def bench_process_files_cached(ctx):
+    from file_handler import process_files
+
+    cache_path = os.path.join(ctx.tmp_dir, "parsed_text_cache.sqlite")
+    process_files(ctx.corpus_dir, text_cache_path=cache_path)  # Fill the cache
+    metrics.REGISTRY.reset()
+    durations, chunks = [], 0
+    for _ in range(ctx.repeats):
+        start = time.perf_counter()
+        chunks = len(process_files(ctx.corpus_dir, text_cache_path=cache_path))
+        durations.append(time.perf_counter() - start)
+    return dict(summarize(durations, items=len(ctx.paths) * ctx.repeats), files=len(ctx.paths), chunks=chunks)
+
+
+def bench_chunk_text(ctx):
+    from file_handler import chunk_text, read_file
+
+    texts = [read_file(path) for path in ctx.paths]
+    durations = []
+    for _ in range(ctx.repeats):
+        for text in texts:
+            start = time.perf_counter()
+            chunk_text(text)
+            durations.append(time.perf_counter() - start)
+    return dict(summarize(durations, items=len(durations)), characters=sum(map(len, texts)))
+
+
+def bench_add_chunks_to_pinecone(ctx):
+    from db_connector import add_chunks_to_pinecone
+
+    records = _records(ctx)
+    durations = []
+    for run in range(ctx.repeats):
+        index, lexical_index = _new_indexes(ctx, f"add-{run}")
+        start = time.perf_counter()
+        add_chunks_to_pinecone(index, records, ctx.embeddings, lexical_index=lexical_index)
+        durations.append(time.perf_counter() - start)
+    return dict(summarize(durations, items=len(records) * ctx.repeats), chunks=len(records))
+
+
+def bench_retrieve_chunks(ctx):
+    from db_connector import retrieve_chunks
+
+    index, lexical_index = _filled_indexes(ctx)
+    metrics.REGISTRY.reset()  # Leave out the stages of building the index
+    durations = []
+    for query in _queries(ctx):
+        start = time.perf_counter()
+        retrieve_chunks(index, query, ctx.embeddings, lexical_index=lexical_index)
+        durations.append(time.perf_counter() - start)
+    return summarize(durations, items=len(durations))
+
+
+def bench_generate_response_rag(ctx):
+    from api_handler import create_rag_agent, generate_response_rag
+
+    index, lexical_index = _filled_indexes(ctx)
+    metrics.REGISTRY.reset()
+    llm = StubChatModel(first_token_latency=ctx.llm_latency, token_latency=ctx.token_latency, streaming=True)
+    chain = create_rag_agent(index, ctx.embeddings, return_sources=True, streaming=True,
+                             lexical_index=lexical_index, llm=llm)
+    durations, ttfts = [], []
+    # The loading message is printed for every query; keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for query in _queries(ctx):
+            result = generate_response_rag(chain, query, on_token=lambda token: None)
+            if result["error"]:
+                raise RuntimeError(f"generate_response_rag failed: {result['error']}")
+            durations.append(result["latency"])
+            ttfts.append(result["time_to_first_token"])
+    summary = summarize(durations, items=len(durations))
+    summary["time_to_first_token_p50_s"] = float(np.percentile(ttfts, 50))
+    return summary
+
+
+def run_suite(scenarios=SCENARIOS, files=30, paragraphs=20, formats=FORMATS, repeats=3, queries=50,
+              embed_latency=0.0, index_latency=0.0, llm_latency=0.0, token_latency=0.0):
+    """
+    Runs the given scenarios on a fresh synthetic corpus.
+
+    Returns:
+        dict: "meta" (parameters, machine and time of the run) and "scenarios", mapping each
+            scenario name to its statistics.
+    """
+    params = {
+        "files": files, "paragraphs": paragraphs, "formats": list(formats), "repeats": repeats, "queries": queries,
+        "embed_latency": embed_latency, "index_latency": index_latency, "llm_latency": llm_latency,
+        "token_latency": token_latency,
+    }
+    results = {
+        "meta": {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": params,
+        },
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ctx = SimpleNamespace(
+            tmp_dir=tmp_dir, corpus_dir=os.path.join(tmp_dir, "corpus"), repeats=repeats, queries=queries,
+            embeddings=TimedEmbeddings(StubEmbeddings(latency=embed_latency)), index_latency=index_latency,
+            llm_latency=llm_latency, token_latency=token_latency, records=None, index=None, lexical_index=None,
+        )
+        ctx.paths = generate_corpus(ctx.corpus_dir, files, paragraphs, formats)
+        for name in scenarios:
+            metrics.REGISTRY.reset()
+            scenario = globals()[f"bench_{name}"](ctx)
+            scenario["stages"] = _stage_breakdown()
+            results["scenarios"][name] = scenario
+    metrics.REGISTRY.reset()
+    return results
+
+
+def compare(results, baseline, max_regression=1.2):
+    """
+    Compares each scenario's p50 latency with a baseline results dict.
+
+    Returns:
+        list of dict: One row per scenario in both: scenario, baseline_p50_s, p50_s, ratio
+            and regression (ratio above max_regression).
+    """
+    rows = []
+    for name, scenario in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        ratio = scenario["p50_s"] / previous["p50_s"] if previous["p50_s"] else float("inf")
+        rows.append({"scenario": name, "baseline_p50_s": previous["p50_s"], "p50_s": scenario["p50_s"],
+                     "ratio": ratio, "regression": ratio > max_regression})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--files", type=int, default=30, help="Documents in the synthetic corpus.")
+    parser.add_argument("--paragraphs", type=int, default=20, help="Paragraphs per document.")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--repeats", type=int, default=3, help="Runs of the ingestion scenarios.")
+    parser.add_argument("--queries", type=int, default=50, help="Queries in the query scenarios.")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Stub embedding latency in seconds.")
+    parser.add_argument("--index-latency", type=float, default=0.0, help="Stub index latency in seconds.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Stub time to first token in seconds.")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Stub delay between tokens in seconds.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Earlier results file to compare with.")
+    parser.add_argument("--max-regression", type=float, default=1.2,
+                        help="Slowdown of a p50 latency over the baseline that counts as a regression.")
+    args = parser.parse_args()
+
+    results = run_suite(args.scenarios, args.files, args.paragraphs, args.formats, args.repeats, args.queries,
+                        args.embed_latency, args.index_latency, args.llm_latency, args.token_latency)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    print(f"{'scenario':<24} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'items/s':>10}")
+    for name, scenario in results["scenarios"].items():
+        print(f"{name:<24} {scenario['runs']:>5} {scenario['p50_s'] * 1000:>9.2f} {scenario['p95_s'] * 1000:>9.2f} "
+              f"{scenario['items_per_sec']:>10.1f}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            rows = compare(results, json.load(f), args.max_regression)
+        print(f"\n{'scenario':<24} {'baseline ms':>12} {'now ms':>9} {'ratio':>7}")
+        for row in rows:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{row['scenario']:<24} {row['baseline_p50_s'] * 1000:>12.2f} {row['p50_s'] * 1000:>9.2f} "
+                  f"{row['ratio']:>6.2f}x{flag}")
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import atexit
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+import numpy as np
+from utils import commit_generation, current_generation, generation_file, log_error, log_info
+
+POSTINGS_FILE = "postings.npz"
+DOCUMENTS_FILE = "documents.json"
+
+# Words, numbers and identifiers such as "XR-2000" or "v1.2.3", kept whole
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_TOKEN_SEPARATORS = re.compile(r"[-_./]")
+
+
+def tokenize(text):
+    """
+    Lowercases text and splits it into terms. Identifiers are indexed whole and by their
+    parts, so "XR-2000" matches queries for "xr-2000", "xr 2000" and "2000".
+    """
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        if _TOKEN_SEPARATORS.search(token):
+            terms.extend(part for part in _TOKEN_SEPARATORS.split(token) if part)
+    return terms
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over document chunks, keyed by the same IDs as the vector index.
+
+    Postings are held in compressed sparse row form: for term t, the documents containing
+    it are doc_ids[offsets[t]:offsets[t + 1]] with term frequencies in the same slice of
+    tfs, as int32 and float32 arrays. Added documents are buffered and merged into the
+    arrays on the next search or save. Deleted documents are masked out until the index is
+    compacted on save. Each save writes a new generation of the files (see
+    utils.commit_generation), so an interrupted save leaves the previous one loadable.
+
+    searchable is cleared while the index is known to be missing chunks stored in the
+    vector index (see db_connector.check_lexical_coverage), so hybrid search leaves it out.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        """
+        Args:
+            path (str): Directory the index is stored in.
+            k1 (float, optional): Term frequency saturation.
+            b (float, optional): Document length normalisation.
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._terms = {}  # term -> term id
+        self._ids = []
+        self._metadata = []
+        self._id_to_doc = {}
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._doc_ids = np.zeros(0, dtype=np.int32)
+        self._tfs = np.zeros(0, dtype=np.float32)
+        self._pending = []  # (doc, Counter of term ids) not yet merged into the postings
+        self._dirty = False
+        self.searchable = True
+        self._generation = current_generation(path)
+
+        postings_path = os.path.join(path, generation_file(POSTINGS_FILE, self._generation))
+        documents_path = os.path.join(path, generation_file(DOCUMENTS_FILE, self._generation))
+        if os.path.exists(postings_path) and os.path.exists(documents_path):
+            with open(documents_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            with np.load(postings_path) as postings:
+                offsets, lengths = postings["offsets"], postings["lengths"]
+                if len(lengths) != len(stored["ids"]) or len(offsets) != len(stored["terms"]) + 1:
+                    # Files from two different saves; the index is rebuilt from the stored chunks
+                    # on the next ingest (see db_connector.backfill_lexical_index)
+                    log_error(f"BM25 index at '{path}' has postings and documents from different saves; "
+                              f"starting empty.")
+                    return
+                self._offsets = offsets
+                self._doc_ids = postings["doc_ids"]
+                self._tfs = postings["tfs"]
+                self._lengths = lengths
+            self._terms = {term: term_id for term_id, term in enumerate(stored["terms"])}
+            self._ids = stored["ids"]
+            self._metadata = stored["metadata"]
+            self._id_to_doc = {doc_id: doc for doc, doc_id in enumerate(self._ids)}
+            self._live = np.ones(len(self._ids), dtype=bool)
+
+    def __len__(self):
+        return len(self._id_to_doc)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._id_to_doc
+
+    def add(self, ids, texts, metadatas=None):
+        """
+        Indexes documents, replacing any with the same IDs.
+
+        Args:
+            ids (list of str): Document IDs.
+            texts (list of str): Document texts.
+            metadatas (list of dict, optional): Metadata returned with search results.
+        """
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            self.delete([doc_id for doc_id in ids if doc_id in self._id_to_doc])
+            lengths = []
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                counts = Counter(self._terms.setdefault(term, len(self._terms)) for term in tokenize(text))
+                doc = len(self._ids)
+                self._ids.append(doc_id)
+                self._metadata.append({**metadata, "text": text})
+                self._id_to_doc[doc_id] = doc
+                self._pending.append((doc, counts))
+                lengths.append(sum(counts.values()))
+            self._lengths = np.concatenate([self._lengths, np.asarray(lengths, dtype=np.float32)])
+            self._live = np.concatenate([self._live, np.ones(len(lengths), dtype=bool)])
+            self._dirty = True
+
+    def delete(self, ids):
+        """
+        Removes documents by ID; unknown IDs are ignored.
+        """
+        with self._lock:
+            for doc_id in ids:
+                doc = self._id_to_doc.pop(doc_id, None)
+                if doc is not None:
+                    self._live[doc] = False
+                    self._dirty = True
+
+    def _merge_pending(self):
+        """
+        Rebuilds the postings arrays with the buffered documents added.
+        """
+        if not self._pending:
+            return
+        term_ids, doc_ids, tfs = [], [], []
+        for doc, counts in self._pending:
+            term_ids.extend(counts.keys())
+            doc_ids.extend([doc] * len(counts))
+            tfs.extend(counts.values())
+        old_terms = np.repeat(np.arange(len(self._offsets) - 1), np.diff(self._offsets))
+        all_terms = np.concatenate([old_terms, np.asarray(term_ids, dtype=np.int64)])
+        all_docs = np.concatenate([self._doc_ids, np.asarray(doc_ids, dtype=np.int32)])
+        all_tfs = np.concatenate([self._tfs, np.asarray(tfs, dtype=np.float32)])
+        order = np.argsort(all_terms, kind="stable")
+        self._doc_ids = all_docs[order]
+        self._tfs = all_tfs[order]
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(all_terms, minlength=len(self._terms)))))
+        self._pending = []
+
+    def search(self, query, top_k=10):
+        """
+        Returns the top_k documents by BM25 score for query.
+
+        Returns:
+            list of dict: Matches with id, score and metadata, best first.
+        """
+        with self._lock:
+            self._merge_pending()
+            live_count = len(self._id_to_doc)
+            term_ids = {self._terms[term] for term in tokenize(query) if term in self._terms}
+            if not live_count or not term_ids:
+                return []
+            average_length = float(self._lengths[self._live].mean())
+            scores = np.zeros(len(self._ids), dtype=np.float32)
+            for term_id in term_ids:
+                start, end = self._offsets[term_id], self._offsets[term_id + 1]
+                docs = self._doc_ids[start:end]
+                live = self._live[docs]
+                docs, tfs = docs[live], self._tfs[start:end][live]
+                if not len(docs):
+                    continue
+                idf = math.log(1 + (live_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[docs] / average_length)
+                # Each document appears at most once per term, so plain fancy-index addition is safe
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+            hits = np.flatnonzero(scores)
+            if len(hits) > top_k:
+                hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+            hits = hits[np.argsort(-scores[hits], kind="stable")]
+            return [
+                {"id": self._ids[doc], "score": float(scores[doc]), "metadata": dict(self._metadata[doc])}
+                for doc in hits
+            ]
+
+    def _compact(self):
+        """
+        Drops deleted documents and renumbers the rest.
+        """
+        if self._live.all():
+            return
+        live_docs = np.flatnonzero(self._live)
+        new_doc = np.full(len(self._ids), -1, dtype=np.int64)
+        new_doc[live_docs] = np.arange(len(live_docs))
+        terms = np.repeat(np.arange(len(self._offsets) - 1), np.diff(self._offsets))
+        keep = self._live[self._doc_ids]
+        self._doc_ids = new_doc[self._doc_ids[keep]].astype(np.int32)
+        self._tfs = self._tfs[keep]
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(terms[keep], minlength=len(self._terms)))))
+        self._ids = [self._ids[doc] for doc in live_docs]
+        self._metadata = [self._metadata[doc] for doc in live_docs]
+        self._id_to_doc = {doc_id: doc for doc, doc_id in enumerate(self._ids)}
+        self._lengths = self._lengths[live_docs]
+        self._live = np.ones(len(self._ids), dtype=bool)
+
+    def save(self):
+        """
+        Writes the index to its directory if it changed since it was loaded or last saved.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            self._merge_pending()
+            self._compact()
+            os.makedirs(self.path, exist_ok=True)
+            generation = self._generation + 1
+            postings_path = os.path.join(self.path, generation_file(POSTINGS_FILE, generation))
+            documents_path = os.path.join(self.path, generation_file(DOCUMENTS_FILE, generation))
+            with open(postings_path, "wb") as f:
+                np.savez(f, offsets=self._offsets, doc_ids=self._doc_ids, tfs=self._tfs, lengths=self._lengths)
+            terms = sorted(self._terms, key=self._terms.get)
+            with open(documents_path, "w", encoding="utf-8") as f:
+                json.dump({"terms": terms, "ids": self._ids, "metadata": self._metadata}, f)
+            commit_generation(self.path, generation, [POSTINGS_FILE, DOCUMENTS_FILE])
+            self._generation = generation
+            self._dirty = False
+        log_info(f"Saved BM25 index with {len(self)} documents to '{self.path}'.")
+
+
+def open_bm25_index(path):
+    """
+    Opens (or creates) a BM25 index and saves it automatically on exit.
+
+    Args:
+        path (str): Directory the index is stored in.
+
+    Returns:
+        BM25Index: The index.
+    """
+    index = BM25Index(path)
+
+    def save_on_exit():
+        try:
+            index.save()
+        except Exception as e:
+            log_error(f"Error saving BM25 index '{path}': {e}")
+
+    atexit.register(save_on_exit)
+    log_info(f"Opened BM25 index '{path}' with {len(index)} documents.")
+    return index
@@ -0,0 +1,207 @@
+import json
+import os
+import time
+from config import CHECKPOINT_PATH, CHECKPOINT_INTERVAL_SECONDS
+from manifest import in_scope
+from utils import log_error, log_info
+
+# Checkpoints persist the whole local vector and BM25 indexes, which takes longer as they
+# grow, so they are spaced out to take at most this fraction of the ingestion time
+CHECKPOINT_MAX_OVERHEAD = 0.1
+
+
+def file_fingerprint(path):
+    """
+    Returns (size, mtime in ns) of a file, which changes whenever the file is rewritten.
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class IngestJournal:
+    """
+    Append-only journal of an ingestion run, so an interrupted run can be resumed.
+
+    Each line is a JSON record: {"batch": {source: [chunk IDs]}} for a batch of chunks that
+    was upserted, or {"file": source, "size": ..., "mtime": ..., "ids": [...]} for a file all
+    of whose chunks are stored. Records are buffered and written (and fsynced) by commit,
+    which add_chunks_to_pinecone calls once the indexes holding those chunks are persisted,
+    so the journal never claims more than the indexes hold. A crash therefore costs the
+    batches since the last commit; the next run skips the completed files without parsing
+    them and the upserted chunks of the others without embedding them. A torn last line
+    from a crash mid-write is ignored.
+
+    The journal is kept until the manifest has recorded the run (see clear), and holds
+    entries for any number of directories at once.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH, interval=CHECKPOINT_INTERVAL_SECONDS):
+        """
+        Args:
+            path (str, optional): Location of the journal file.
+            interval (float, optional): Minimum seconds between commits made while chunks
+                are still being added; 0 commits after every batch.
+        """
+        self.path = path
+        self.interval = interval
+        self.upserted = {}  # source -> set of upserted chunk IDs
+        self.completed = {}  # source -> {"size": ..., "mtime": ..., "ids": [...]}
+        self._buffer = []
+        self._sources = {}
+        self._known_ids = set()
+        self._failed = set()
+        self._last_commit = time.monotonic()
+        self._last_cost = 0.0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._apply(record)
+            log_info(f"Loaded ingestion checkpoint '{self.path}': {len(self.completed)} completed files, "
+                     f"{sum(map(len, self.upserted.values()))} upserted chunks.")
+        except Exception as e:
+            log_error(f"Error loading ingestion checkpoint {self.path}: {e}. Starting without it.")
+            self.upserted, self.completed = {}, {}
+
+    def _apply(self, record):
+        if "batch" in record:
+            for source, ids in record["batch"].items():
+                self.upserted.setdefault(source, set()).update(ids)
+        elif "file" in record:
+            self.completed[record["file"]] = {key: record[key] for key in ("size", "mtime", "ids")}
+
+    def completed_files(self, directory, recursive=False):
+        """
+        Returns the files in scope of directory that an earlier run finished and that have
+        not changed since.
+
+        Returns:
+            dict: Maps each such file to the IDs of its chunks.
+        """
+        completed = {}
+        for source, entry in self.completed.items():
+            if not in_scope(source, directory, recursive):
+                continue
+            try:
+                if file_fingerprint(source) == (entry["size"], entry["mtime"]):
+                    completed[source] = entry["ids"]
+            except OSError:
+                continue  # Deleted since; its chunks are left to the stale chunk cleanup
+        return completed
+
+    def upserted_ids(self, directory, recursive=False):
+        """
+        Returns the IDs of every chunk from files in scope of directory known to be stored.
+        """
+        ids = set()
+        for source, source_ids in self.upserted.items():
+            if in_scope(source, directory, recursive):
+                ids.update(source_ids)
+        for source, entry in self.completed.items():
+            if in_scope(source, directory, recursive):
+                ids.update(entry["ids"])
+        return ids
+
+    def track(self, sources, known_ids, failed=()):
+        """
+        Follows an ingestion so that commit can tell which files are complete.
+
+        Args:
+            sources (dict): Maps each source to its chunk IDs, filled in as chunks are read
+                (see manifest.filter_new_records).
+            known_ids (set): IDs already stored before this run started.
+            failed (set, optional): Filled in with files that failed partway (see
+                file_handler.iter_chunks); they are never complete.
+        """
+        self._sources = sources
+        self._known_ids = known_ids
+        self._failed = failed
+
+    def add_batch(self, vectors):
+        """
+        Buffers a batch of upserted vector records until the next commit.
+        """
+        batch = {}
+        for vector in vectors:
+            source = vector["metadata"].get("source")
+            if source is not None:
+                batch.setdefault(source, []).append(vector["id"])
+        for source, ids in batch.items():
+            self.upserted.setdefault(source, set()).update(ids)
+        if batch:
+            self._buffer.append({"batch": batch})
+
+    def due(self):
+        """
+        Returns True when the last commit is at least interval seconds old, and old enough
+        that checkpoints as slow as the last one stay within CHECKPOINT_MAX_OVERHEAD.
+        """
+        spacing = max(self.interval, self._last_cost / CHECKPOINT_MAX_OVERHEAD)
+        return time.monotonic() - self._last_commit >= spacing
+
+    def _completed_records(self, final):
+        sources = list(self._sources)
+        # The last source seen may still have chunks that have not been read yet
+        candidates = sources if final else sources[:-1]
+        records = []
+        for source in candidates:
+            if source in self.completed or source in self._failed:
+                continue
+            ids = self._sources[source]
+            stored = self.upserted.get(source, set())
+            if all(chunk_id in stored or chunk_id in self._known_ids for chunk_id in ids):
+                try:
+                    size, mtime = file_fingerprint(source)
+                except OSError:
+                    continue
+                record = {"file": source, "size": size, "mtime": mtime, "ids": list(ids)}
+                self.completed[source] = {"size": size, "mtime": mtime, "ids": list(ids)}
+                records.append(record)
+        return records
+
+    def commit(self, final=False, started=None):
+        """
+        Appends the buffered batches and the files they completed to the journal.
+
+        Args:
+            final (bool, optional): Whether every chunk has been read, so the last source
+                can be complete too.
+            started (float, optional): time.monotonic() when the checkpoint began, before
+                the indexes were persisted; the time since then spaces out later checkpoints.
+        """
+        records = self._buffer + self._completed_records(final)
+        self._buffer = []
+        if records:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record) + "\n" for record in records))
+                f.flush()
+                os.fsync(f.fileno())
+        self._last_commit = time.monotonic()
+        self._last_cost = self._last_commit - (started if started is not None else self._last_commit)
+
+    def clear(self, directory, recursive=False):
+        """
+        Drops the entries in scope of directory once the manifest has recorded its sync,
+        deleting the journal if nothing else is left in it.
+        """
+        self.upserted = {s: ids for s, ids in self.upserted.items() if not in_scope(s, directory, recursive)}
+        self.completed = {s: e for s, e in self.completed.items() if not in_scope(s, directory, recursive)}
+        self._buffer = []
+        if not self.upserted and not self.completed:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        records = [{"batch": {source: sorted(ids)}} for source, ids in self.upserted.items()]
+        records += [dict(entry, file=source) for source, entry in self.completed.items()]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+        os.replace(tmp_path, self.path)
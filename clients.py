@@ -0,0 +1,217 @@
+"""
+Shared HTTP connection pools and rate limiters for the OpenAI clients.
+
+OpenAIEmbeddings and every ChatOpenAI are given the same keep-alive httpx pools, so
+connections (and their TLS sessions) are reused across batches, queries and models instead
+of each client opening its own. Embedding and chat calls are held to the requests and
+tokens per minute of the account tier by one RateLimiter each, shared by all threads.
+"""
+import threading
+from typing import List
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.rate_limiters import BaseRateLimiter
+from config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_TIMEOUT,
+    OPENAI_EMBEDDING_RPM,
+    OPENAI_EMBEDDING_TPM,
+    OPENAI_CHAT_RPM,
+    OPENAI_CHAT_TPM,
+    RETRY_BACKOFF_SECONDS,
+    RETRY_MAX_BACKOFF_SECONDS
+)
+from rate_limit import RateLimiter, backoff_delay, is_rate_limit_error
+from metrics import timed
+from utils import log_info
+
+EMBEDDING_LIMITER = RateLimiter("openai_embeddings", OPENAI_EMBEDDING_RPM, OPENAI_EMBEDDING_TPM)
+CHAT_LIMITER = RateLimiter("openai_chat", OPENAI_CHAT_RPM, OPENAI_CHAT_TPM)
+
+_http_client = None
+_async_http_client = None
+_lock = threading.Lock()
+
+
+def _limits():
+    import httpx
+    return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+
+
+def get_http_client():
+    """
+    Returns the shared keep-alive httpx.Client, creating it on first use.
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx
+            _http_client = httpx.Client(limits=_limits(), timeout=HTTP_TIMEOUT)
+            log_info(f"Created HTTP connection pool (max {HTTP_MAX_CONNECTIONS} connections).")
+        return _http_client
+
+
+def get_async_http_client():
+    """
+    Returns the shared keep-alive httpx.AsyncClient, creating it on first use. Its
+    connections belong to the event loop that opens them, so it is meant for the single
+    loop of the server.
+    """
+    global _async_http_client
+    with _lock:
+        if _async_http_client is None:
+            import httpx
+            _async_http_client = httpx.AsyncClient(limits=_limits(), timeout=HTTP_TIMEOUT)
+        return _async_http_client
+
+
+def estimate_tokens(texts):
+    """
+    Returns a quick estimate of the tokens in texts, at about four characters per token,
+    which is close enough to charge a rate limiter without running the tokenizer.
+    """
+    return sum(len(text) // 4 + 1 for text in texts)
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings instance so that every call first waits for the limiter, and a
+    rate-limit error pauses the limiter for all callers before it is raised to be retried.
+    """
+
+    def __init__(self, embeddings, limiter=EMBEDDING_LIMITER):
+        """
+        Args:
+            embeddings (Embeddings): The wrapped embeddings, usually OpenAIEmbeddings.
+            limiter (rate_limit.RateLimiter, optional): The limiter to charge.
+        """
+        self.embeddings = embeddings
+        self.limiter = limiter
+
+    def _rate_limited(self, error):
+        if is_rate_limit_error(error):
+            self.limiter.rate_limited(backoff_delay(1, RETRY_BACKOFF_SECONDS, RETRY_MAX_BACKOFF_SECONDS, error))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.limiter.acquire(estimate_tokens(texts))
+        try:
+            return self.embeddings.embed_documents(texts)
+        except Exception as e:
+            self._rate_limited(e)
+            raise
+
+    def embed_query(self, text: str) -> List[float]:
+        self.limiter.acquire(estimate_tokens([text]))
+        try:
+            return self.embeddings.embed_query(text)
+        except Exception as e:
+            self._rate_limited(e)
+            raise
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await self.limiter.aacquire(estimate_tokens(texts))
+        try:
+            return await self.embeddings.aembed_documents(texts)
+        except Exception as e:
+            self._rate_limited(e)
+            raise
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await self.limiter.aacquire(estimate_tokens([text]))
+        try:
+            return await self.embeddings.aembed_query(text)
+        except Exception as e:
+            self._rate_limited(e)
+            raise
+
+
+class TimedEmbeddings(Embeddings):
+    """
+    Wraps the embeddings built by get_embeddings so query embeddings are timed as the
+    embed_query stage on every retrieval path, including langchain's Pinecone vector
+    store, and whether they come from the cache or the API.
+
+    Document embeddings are passed through; add_chunks_to_pinecone times them per batch.
+    Other attributes, such as a cache's close(), are those of the wrapped instance.
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__["embeddings"], name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with timed("embed_query"):
+            return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with timed("embed_query"):
+            return await self.embeddings.aembed_query(text)
+
+
+class ChatRateLimiter(BaseRateLimiter):
+    """
+    Adapts a RateLimiter to the rate_limiter of LangChain chat models.
+
+    A chat call's token count is only known once it has finished, so acquire charges the
+    request alone and TokenUsageCallback charges the tokens afterwards; a large answer
+    therefore delays the calls after it rather than itself.
+    """
+
+    def __init__(self, limiter=CHAT_LIMITER):
+        self.limiter = limiter
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        self.limiter.acquire()
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        await self.limiter.aacquire()
+        return True
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Charges the tokens each chat call used to the limiter, and pauses the limiter when a
+    call is rejected with a rate-limit error.
+    """
+
+    def __init__(self, limiter=CHAT_LIMITER):
+        self.limiter = limiter
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        tokens = usage.get("total_tokens", 0)
+        if not tokens:
+            # Streamed responses report usage on the message instead
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    tokens += metadata.get("total_tokens", 0)
+        if tokens:
+            self.limiter.tokens.reserve(tokens)
+
+    def on_llm_error(self, error, **kwargs):
+        if is_rate_limit_error(error):
+            self.limiter.rate_limited(backoff_delay(1, RETRY_BACKOFF_SECONDS, RETRY_MAX_BACKOFF_SECONDS, error))
+
+
+def chat_client_kwargs():
+    """
+    Returns the keyword arguments that connect a ChatOpenAI to the shared connection pools
+    and the chat rate limiter.
+    """
+    return {
+        "http_client": get_http_client(),
+        "http_async_client": get_async_http_client(),
+        "rate_limiter": ChatRateLimiter(),
+        "callbacks": [TokenUsageCallback()],
+    }
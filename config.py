@@ -6,4 +6,130 @@ load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-PINECONE_INDEX = os.getenv("PINECONE_INDEX")
\ No newline at end of file
+PINECONE_INDEX = os.getenv("PINECONE_INDEX")
+
+# Ingestion pipeline tuning
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+UPSERT_MAX_IN_FLIGHT = int(os.getenv("UPSERT_MAX_IN_FLIGHT", "4"))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "3"))
+
+# Local record of ingested chunks, used for incremental re-ingestion
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", "ingest_manifest.json")
+
+# Persistent embedding cache; set EMBEDDING_CACHE_PATH to an empty string to disable it
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+# Number of worker processes used to parse and chunk files (0 = one per CPU core)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+# Maximum number of files parsed ahead of the embedding stage (0 = twice the worker count)
+INGEST_PREFETCH = int(os.getenv("INGEST_PREFETCH", "0"))
+
+# Sentence segmentation backend used by chunk_text: spacy, sentencizer or regex
+SENTENCE_SEGMENTER = os.getenv("SENTENCE_SEGMENTER", "spacy")
+
+# Unit chunk sizes are measured in: chars, or tokens of CHUNK_TOKEN_ENCODING
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars")
+CHUNK_TOKEN_ENCODING = os.getenv("CHUNK_TOKEN_ENCODING", "cl100k_base")
+
+# Vector store backend: pinecone, or local for an in-process index stored under LOCAL_INDEX_PATH
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "local_index")
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+
+# Local index search: flat (exact) or ivf (approximate, scans ANN_NPROBE of ANN_NLIST clusters per query)
+LOCAL_INDEX_TYPE = os.getenv("LOCAL_INDEX_TYPE", "flat")
+ANN_NLIST = int(os.getenv("ANN_NLIST", "1024"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+
+# Print answers token by token as the LLM generates them
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+# Async query engine: queries processed at once, and seconds before a query is abandoned. Sessions
+# idle for SESSION_IDLE_SECONDS are forgotten, as are the least recently used beyond SESSION_MAX_COUNT
+QUERY_MAX_CONCURRENCY = int(os.getenv("QUERY_MAX_CONCURRENCY", "16"))
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", "60"))
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "3600"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+
+# Address the HTTP server (server.py) listens on
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+
+# Response cache for retrieval answers: entries kept (0 disables it), seconds they stay valid,
+# and the cosine similarity at which a different query reuses a cached answer
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))
+
+# Hybrid retrieval: a BM25 index under BM25_INDEX_PATH is built during ingestion and fused with
+# vector search; each retriever contributes HYBRID_CANDIDATES matches and RETRIEVAL_TOP_K are kept
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "bm25_index")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+
+# Context packing: RERANK_CANDIDATES retrieved chunks are de-duplicated (DEDUPE_SIMILARITY is the
+# word-trigram overlap above which a chunk counts as a duplicate), reranked, and packed into
+# CONTEXT_TOKEN_BUDGET prompt tokens (0 disables packing)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+DEDUPE_SIMILARITY = float(os.getenv("DEDUPE_SIMILARITY", "0.8"))
+
+# Conversation memory: recent turns are kept verbatim up to MEMORY_TOKEN_LIMIT tokens (0 disables
+# memory) and older turns are folded into a rolling summary of about MEMORY_SUMMARY_TOKENS tokens
+MEMORY_TOKEN_LIMIT = int(os.getenv("MEMORY_TOKEN_LIMIT", "1000"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "200"))
+
+# Logging: records are queued and written to LOG_FILE by a background thread, as JSON lines
+# (LOG_FORMAT=json) or plain text, rotated at LOG_MAX_BYTES or, if LOG_ROTATE_WHEN is set (e.g.
+# "midnight"), on that schedule. Per-file and per-query messages are logged at LOG_HOT_PATH_LEVEL
+# and only LOG_SAMPLE_RATE (0 to 1) of them are kept
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
+LOG_HOT_PATH_LEVEL = os.getenv("LOG_HOT_PATH_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# Metrics: per-stage latency histograms, counters and LLM token usage (METRICS_ENABLED=false stops
+# recording). If METRICS_EXPORT_PATH is set they are written there on exit, as JSON if it ends in
+# .json and in Prometheus text format otherwise; server.py also serves them at GET /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_EXPORT_PATH = os.getenv("METRICS_EXPORT_PATH", "")
+
+# API clients: HTTP connections to OpenAI are pooled and kept alive (at most HTTP_MAX_CONNECTIONS open,
+# HTTP_MAX_KEEPALIVE of them idle; HTTP_TIMEOUT seconds per request) and Pinecone requests use
+# PINECONE_POOL_THREADS threads. OpenAI calls are held within the requests and tokens per minute of the
+# account tier (0 disables a limit). A failed batch is retried with jittered exponential backoff from
+# RETRY_BACKOFF_SECONDS up to RETRY_MAX_BACKOFF_SECONDS, BATCH_MAX_RETRIES times in all, or
+# RATE_LIMIT_MAX_RETRIES times if it was rate limited
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "4"))
+OPENAI_EMBEDDING_RPM = int(os.getenv("OPENAI_EMBEDDING_RPM", "3000"))
+OPENAI_EMBEDDING_TPM = int(os.getenv("OPENAI_EMBEDDING_TPM", "1000000"))
+OPENAI_CHAT_RPM = int(os.getenv("OPENAI_CHAT_RPM", "500"))
+OPENAI_CHAT_TPM = int(os.getenv("OPENAI_CHAT_TPM", "10000"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("RETRY_BACKOFF_SECONDS", "1.0"))
+RETRY_MAX_BACKOFF_SECONDS = float(os.getenv("RETRY_MAX_BACKOFF_SECONDS", "60"))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "8"))
+
+# Resumable ingestion: upserted batches and completed files are journaled to CHECKPOINT_PATH, at
+# most every CHECKPOINT_INTERVAL_SECONDS (0 after every batch), so an interrupted run resumes from
+# the last checkpoint. Set CHECKPOINT_PATH to an empty value to disable checkpointing
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "ingest_checkpoint.jsonl")
+CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_INTERVAL_SECONDS", "10"))
+
+# Parsed text cache: text extracted from PDF and DOCX files is kept, compressed, in
+# PARSED_TEXT_CACHE_PATH (empty to disable), so unchanged files are not parsed again; the least
+# recently used texts are evicted beyond PARSED_TEXT_CACHE_MAX_BYTES
+PARSED_TEXT_CACHE_PATH = os.getenv("PARSED_TEXT_CACHE_PATH", "parsed_text_cache.sqlite")
+PARSED_TEXT_CACHE_MAX_BYTES = int(os.getenv("PARSED_TEXT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# TXT files larger than TXT_STREAM_THRESHOLD_BYTES are read and chunked incrementally, in blocks,
+# instead of being loaded whole
+TXT_STREAM_THRESHOLD_BYTES = int(os.getenv("TXT_STREAM_THRESHOLD_BYTES", str(32 * 1024 * 1024)))
\ No newline at end of file
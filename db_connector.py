@@ -1,36 +1,149 @@
-from pinecone import Pinecone, ServerlessSpec
-from langchain_openai import OpenAIEmbeddings
+import hashlib
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import islice
 from config import (
     PINECONE_API_KEY,
     PINECONE_INDEX,
-    OPENAI_API_KEY
+    OPENAI_API_KEY,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_DIMENSION,
+    LOCAL_INDEX_TYPE,
+    ANN_NLIST,
+    ANN_NPROBE,
+    VECTOR_BACKEND,
+    LOCAL_INDEX_PATH,
+    HYBRID_SEARCH,
+    BM25_INDEX_PATH,
+    EMBED_BATCH_SIZE,
+    UPSERT_MAX_IN_FLIGHT,
+    BATCH_MAX_RETRIES,
+    RATE_LIMIT_MAX_RETRIES,
+    RETRY_BACKOFF_SECONDS,
+    RETRY_MAX_BACKOFF_SECONDS,
+    PINECONE_POOL_THREADS
 )
-from utils import log_error, log_info
+from utils import log_error, log_info, lazy_imports
+from metrics import timed, increment
+from rate_limit import backoff_delay, is_rate_limit_error
+
+# The Pinecone and OpenAI SDKs are slow to import, so they are loaded on first use
+__getattr__, _ensure_imports = lazy_imports(globals(), {
+    "Pinecone": ("pinecone", "Pinecone"),
+    "ServerlessSpec": ("pinecone", "ServerlessSpec"),
+    "OpenAIEmbeddings": ("langchain_openai", "OpenAIEmbeddings"),
+})
 
 # Define the serverless spec for cloud and region
 CLOUD = 'aws'
 REGION = 'us-east-1'
-SPEC = ServerlessSpec(cloud=CLOUD, region=REGION)
 
-# Initialize Pinecone client instance
-pc = Pinecone(api_key=PINECONE_API_KEY)
+# Pinecone client instance, created by get_pinecone_client on first use
+_pinecone_client = None
+
+# BM25 index for hybrid search, opened by get_lexical_index on first use
+_lexical_index = None
+
+def get_pinecone_client():
+    """
+    Returns the shared Pinecone client, creating it on first use.
+
+    Returns:
+        pinecone.Pinecone: The Pinecone client.
+    """
+    global _pinecone_client
+    if _pinecone_client is None:
+        _ensure_imports("Pinecone")
+        # The client keeps a pool of keep-alive connections that every index handle shares
+        _pinecone_client = Pinecone(api_key=PINECONE_API_KEY, pool_threads=PINECONE_POOL_THREADS)
+    return _pinecone_client
+
+def get_lexical_index():
+    """
+    Returns the shared BM25 index at BM25_INDEX_PATH, opening it on first use.
+
+    The index is only searched once it holds every chunk in the manifest (see
+    check_lexical_coverage).
+
+    Returns:
+        bm25.BM25Index: The lexical index, or None if HYBRID_SEARCH is disabled or it
+            cannot be opened.
+    """
+    global _lexical_index
+    if HYBRID_SEARCH and _lexical_index is None:
+        try:
+            from bm25 import open_bm25_index
+            from manifest import load_manifest, known_chunk_ids
+            _lexical_index = open_bm25_index(BM25_INDEX_PATH)
+            check_lexical_coverage(_lexical_index, known_chunk_ids(load_manifest()))
+        except Exception as e:
+            log_error(f"Error opening BM25 index: {e}")
+    return _lexical_index if HYBRID_SEARCH else None
+
+def check_lexical_coverage(lexical_index, chunk_ids):
+    """
+    Lets hybrid search use the BM25 index only if it holds every chunk in chunk_ids.
+
+    Chunks ingested before hybrid search was enabled, or before a lost BM25 index was
+    recreated, are missing from it. Until an ingest adds them back (see
+    backfill_lexical_index), retrieval uses the vector index alone rather than a BM25
+    index that would silently miss them.
+
+    Args:
+        lexical_index (bm25.BM25Index): The BM25 index.
+        chunk_ids (iterable of str): IDs of the chunks stored in the vector index.
+
+    Returns:
+        int: The number of chunks missing from the BM25 index.
+    """
+    missing = sum(1 for chunk_id in chunk_ids if chunk_id not in lexical_index)
+    lexical_index.searchable = not missing
+    if missing:
+        log_info(f"BM25 index is missing {missing} stored chunks; using vector search only until "
+                 f"their documents are ingested again.")
+    return missing
+
+def initialize_local_index():
+    """
+    Opens the local in-process vector index at LOCAL_INDEX_PATH.
+
+    Returns:
+        vector_store.LocalVectorIndex: The local index, or None if initialization fails.
+    """
+    try:
+        from vector_store import open_local_index
+        return open_local_index(
+            LOCAL_INDEX_PATH, EMBEDDING_DIMENSION, index_type=LOCAL_INDEX_TYPE, nlist=ANN_NLIST, nprobe=ANN_NPROBE
+        )
+    except Exception as e:
+        log_error(f"Error initializing local vector index: {e}")
+        return None
 
 def initialize_pinecone():
     """
     Initializes the Pinecone client and ensures that the specified index exists.
 
+    When VECTOR_BACKEND is 'local', the local in-process index is returned instead; it
+    supports the same upsert/delete/query/describe_index_stats calls.
+
     Returns:
-        pinecone.Index: An instance of the Pinecone index, or None if initialization fails.
+        pinecone.Index or LocalVectorIndex: The vector index, or None if initialization fails.
     """
+    if VECTOR_BACKEND == "local":
+        return initialize_local_index()
     try:
+        _ensure_imports("ServerlessSpec")
+        pc = get_pinecone_client()
         # List available indexes and check if the desired index exists
         existing_indexes = pc.list_indexes().names()
         if PINECONE_INDEX not in existing_indexes:
             pc.create_index(
                 name=PINECONE_INDEX,
-                dimension=1536,  # Ensure this matches your embedding dimensionality
+                dimension=EMBEDDING_DIMENSION,  # Ensure this matches your embedding dimensionality
                 metric='cosine',
-                spec=SPEC
+                spec=ServerlessSpec(cloud=CLOUD, region=REGION)
             )
             log_info(f"Created new Pinecone index: {PINECONE_INDEX}")
         
@@ -46,46 +159,327 @@ def get_embeddings():
     """
     Initializes the OpenAIEmbeddings instance with the provided OpenAI API key.
 
+    The instance uses the shared connection pools and is wrapped in a RateLimitedEmbeddings
+    that keeps it within OPENAI_EMBEDDING_RPM and OPENAI_EMBEDDING_TPM (see clients.py).
+    Unless EMBEDDING_CACHE_PATH is empty, that is wrapped in turn in a persistent
+    CachedEmbeddings so repeated chunk texts and queries are only embedded once, and cache
+    hits do not count against the rate limits. The outermost TimedEmbeddings records the
+    embed_query stage for every query.
+
     Returns:
-        OpenAIEmbeddings: An instance of OpenAIEmbeddings.
+        TimedEmbeddings: The embeddings instance.
     """
     try:
-        embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+        _ensure_imports("OpenAIEmbeddings")
+        from clients import RateLimitedEmbeddings, TimedEmbeddings, get_async_http_client, get_http_client
+        openai_embeddings = OpenAIEmbeddings(
+            openai_api_key=OPENAI_API_KEY, http_client=get_http_client(), http_async_client=get_async_http_client()
+        )
+        embeddings = RateLimitedEmbeddings(openai_embeddings)
         log_info("OpenAIEmbeddings initialized successfully.")
-        return embeddings
+        if EMBEDDING_CACHE_PATH:
+            from embedding_cache import CachedEmbeddings
+            model_name = str(getattr(openai_embeddings, "model", type(openai_embeddings).__name__))
+            embeddings = CachedEmbeddings(embeddings, model_name, path=EMBEDDING_CACHE_PATH)
+        return TimedEmbeddings(embeddings)
     except Exception as e:
         log_error(f"Error initializing OpenAIEmbeddings: {e}")
         raise e
 
-def add_chunks_to_pinecone(index, chunks, embeddings, pbar=None):
+def make_chunk_id(source, text):
+    """
+    Builds a stable, content-addressed vector ID for a chunk.
+
+    Args:
+        source (str or None): Path of the file the chunk came from.
+        text (str): The chunk text.
+
+    Returns:
+        str: An ID made of a digest of the source path and a digest of the chunk content.
+    """
+    source_digest = hashlib.sha1((source or "").encode("utf-8")).hexdigest()[:16]
+    content_digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+    return f"{source_digest}-{content_digest}"
+
+def _to_vector(chunk, values):
+    """
+    Builds a Pinecone vector record from a chunk, which is either a str, a (source, text)
+    pair or a (source, text, metadata) record as produced by file_handler.iter_chunks.
+    """
+    if isinstance(chunk, str):
+        source, text = None, chunk
+        metadata = {"text": text}
+    else:
+        source, text = chunk[0], chunk[1]
+        metadata = dict(chunk[2]) if len(chunk) > 2 else {}
+        metadata.update({"text": text, "source": source})
+    return {"id": make_chunk_id(source, text), "values": values, "metadata": metadata}
+
+def _add_to_lexical_index(lexical_index, vectors):
+    """
+    Adds the texts of vector records to the BM25 index, keyed by the same IDs.
+    """
+    lexical_index.add(
+        [vector["id"] for vector in vectors],
+        [vector["metadata"]["text"] for vector in vectors],
+        [{k: v for k, v in vector["metadata"].items() if k != "text"} for vector in vectors]
+    )
+
+def backfill_lexical_index(records, lexical_index, stored_ids, batch_size=EMBED_BATCH_SIZE):
+    """
+    Passes chunk records through, adding those already stored in the vector index but
+    missing from the BM25 index to it, without embedding them again.
+
+    Args:
+        records (iterable): (source, text, metadata) records, as from file_handler.iter_chunks.
+        lexical_index (bm25.BM25Index): The BM25 index.
+        stored_ids (set): IDs of the chunks already stored in the vector index.
+        batch_size (int, optional): Number of chunks added to the BM25 index at once.
+
+    Yields:
+        Every record, unchanged.
+    """
+    batch = []
+    added = 0
+    for record in records:
+        vector = _to_vector(record, None)
+        if vector["id"] in stored_ids and vector["id"] not in lexical_index:
+            batch.append(vector)
+            if len(batch) >= batch_size:
+                _add_to_lexical_index(lexical_index, batch)
+                added += len(batch)
+                batch = []
+        yield record
+    if batch:
+        _add_to_lexical_index(lexical_index, batch)
+        added += len(batch)
+    if added:
+        log_info(f"Added {added} stored chunks missing from the BM25 index to it.")
+
+def _persist(index):
+    """
+    Saves a local vector or BM25 index after a write; Pinecone indexes persist on their own.
+    """
+    save = getattr(type(index), "save", None)
+    if callable(save):
+        index.save()
+
+def _batched(iterable, batch_size):
+    """
+    Yields successive lists of at most batch_size items from an iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def _with_retries(operation, description, max_retries, rate_limit_retries=RATE_LIMIT_MAX_RETRIES):
+    """
+    Calls operation(), retrying with jittered exponential backoff if it raises.
+
+    Rate-limit (429) errors only mean the batch came too early, so they get a larger budget
+    of attempts and wait at least as long as the response's Retry-After asks.
+
+    Args:
+        operation (callable): Zero-argument callable to invoke.
+        description (str): Human-readable label used in log messages.
+        max_retries (int): Maximum number of attempts before giving up.
+        rate_limit_retries (int, optional): Maximum number of attempts while the failures
+            are rate-limit errors.
+
+    Returns:
+        The return value of operation().
+    """
+    attempt = 1
+    while True:
+        try:
+            return operation()
+        except Exception as e:
+            rate_limited = is_rate_limit_error(e)
+            limit = max(max_retries, rate_limit_retries) if rate_limited else max_retries
+            if attempt >= limit:
+                raise
+            delay = backoff_delay(attempt, RETRY_BACKOFF_SECONDS, RETRY_MAX_BACKOFF_SECONDS, error=e)
+            increment("rag_batch_retries_total", 1, "Batch calls retried after an error.",
+                      reason="rate_limit" if rate_limited else "error")
+            log_error(f"{description} failed (attempt {attempt}/{limit}): {e}. Retrying in {delay:.1f}s.")
+            time.sleep(delay)
+            attempt += 1
+
+def _upsert_batch(index, vectors, max_retries):
+    """
+    Upserts a single batch of vectors, retrying only this batch on failure.
+    """
+    with timed("upsert"):
+        _with_retries(lambda: index.upsert(vectors), f"Upsert of {len(vectors)} vectors", max_retries)
+    return len(vectors)
+
+def _collect_upsert(entry, pbar=None, journal=None):
+    """
+    Waits for a submitted upsert to finish, advances the progress bar by its batch size and
+    records the batch in the checkpoint journal.
+    """
+    future, vectors = entry
+    count = future.result()
+    if pbar:
+        pbar.update(count)
+    if journal is not None:
+        journal.add_batch(vectors)
+    return count
+
+def _checkpoint(journal, index, lexical_index, final=False):
+    """
+    Persists the indexes and then commits the journal, so it only lists chunks they hold.
+
+    Local indexes are rewritten whole, so the journal spaces out checkpoints by how long
+    this takes (see IngestJournal.due).
+    """
+    started = time.monotonic()
+    _persist(index)
+    _persist(lexical_index)
+    journal.commit(final=final, started=started)
+
+def _checkpoint_finished(journal, pending, index, lexical_index):
+    """
+    After a failure, waits for the pending upserts and checkpoints the ones that succeeded,
+    so the failure costs no more than the batch that failed.
+    """
+    try:
+        wait([future for future, _ in pending])
+        for future, vectors in pending:
+            if not future.cancelled() and future.exception() is None:
+                journal.add_batch(vectors)
+        _checkpoint(journal, index, lexical_index)
+    except Exception as e:
+        log_error(f"Error checkpointing ingestion progress: {e}")
+
+def _invalidate_response_caches():
+    """
+    Clears cached answers after the indexed documents change. If response_cache was never
+    imported there are no caches, so it is not imported just to find that out.
+    """
+    response_cache = sys.modules.get("response_cache")
+    if response_cache:
+        response_cache.invalidate_response_caches()
+
+def add_chunks_to_pinecone(index, chunks, embeddings, pbar=None, batch_size=EMBED_BATCH_SIZE,
+                           max_in_flight=UPSERT_MAX_IN_FLIGHT, max_retries=BATCH_MAX_RETRIES, lexical_index=None,
+                           journal=None):
     """
     Adds document chunks to the Pinecone index with their corresponding embeddings.
 
+    Each chunk gets a content-addressed ID (see make_chunk_id), so re-adding an unchanged
+    chunk overwrites its existing vector instead of creating a duplicate.
+
+    Chunks are embedded in batches of batch_size. Each embedded batch is upserted on a
+    background thread while the next batch is being embedded, with at most max_in_flight
+    upserts outstanding at once so memory stays bounded. A failed embedding or upsert call
+    is retried for that batch alone.
+
+    With a journal, upserted batches are checkpointed as they complete (at most every
+    journal.interval seconds, after persisting local indexes), so an interrupted run can
+    be resumed without re-embedding them.
+
     Args:
         index (pinecone.Index): The Pinecone index instance.
-        chunks (list of str): List of text chunks to be embedded and added.
+        chunks (iterable): Text chunks, (source, text) pairs or (source, text, metadata)
+            records to be embedded and added. Generators are consumed one batch at a time.
         embeddings (OpenAIEmbeddings): The embeddings instance to generate embeddings.
-        pbar (tqdm.tqdm, optional): Progress bar instance for visual feedback.
+        pbar (tqdm.tqdm, optional): Progress bar instance, advanced once per upserted batch.
+        batch_size (int, optional): Number of chunks per embedding/upsert request.
+        max_in_flight (int, optional): Maximum number of concurrent pending upserts.
+        max_retries (int, optional): Attempts per batch before the ingestion is aborted.
+        lexical_index (bm25.BM25Index, optional): BM25 index the chunks are also added to.
+        journal (checkpoint.IngestJournal, optional): Checkpoint journal of upserted batches.
+
+    Returns:
+        int: The number of chunks added.
     """
     try:
-        vectors = []
-        embed = embeddings.embed_documents(chunks)
-        for i, chunk in enumerate(chunks):
-            vector = {
-                "id": f"chunk-{i}",
-                "values": embed[i],
-                "metadata": {"text": chunk}
-            }
-            vectors.append(vector)
-            if pbar:
-                pbar.update(1)
-        index.upsert(vectors)
-        log_info(f"Added {len(vectors)} chunks to Pinecone successfully.")
+        total = 0
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            try:
+                for batch in _batched(chunks, batch_size):
+                    texts = [chunk if isinstance(chunk, str) else chunk[1] for chunk in batch]
+                    with timed("embed_documents"):
+                        embed = _with_retries(
+                            lambda: embeddings.embed_documents(texts),
+                            f"Embedding of {len(texts)} chunks",
+                            max_retries
+                        )
+                    vectors = [_to_vector(chunk, embed[i]) for i, chunk in enumerate(batch)]
+                    if lexical_index is not None:
+                        _add_to_lexical_index(lexical_index, vectors)
+
+                    # Apply back-pressure: wait for the oldest upsert before queueing another
+                    if len(pending) >= max_in_flight:
+                        total += _collect_upsert(pending.popleft(), pbar, journal)
+                        if journal is not None and journal.due():
+                            _checkpoint(journal, index, lexical_index)
+                    pending.append((executor.submit(_upsert_batch, index, vectors, max_retries), vectors))
+
+                while pending:
+                    total += _collect_upsert(pending.popleft(), pbar, journal)
+            except BaseException:
+                if journal is not None:
+                    # Embedded batches cost the most to redo, so they are still upserted and
+                    # checkpointed after an error; on Ctrl-C only the running ones finish
+                    if not isinstance(sys.exc_info()[1], Exception):
+                        for future, _ in pending:
+                            future.cancel()
+                    _checkpoint_finished(journal, pending, index, lexical_index)
+                else:
+                    for future, _ in pending:
+                        future.cancel()
+                raise
+        if journal is not None:
+            _checkpoint(journal, index, lexical_index, final=True)
+        else:
+            _persist(index)
+            _persist(lexical_index)
+        if total:
+            _invalidate_response_caches()
+        increment("rag_chunks_added_total", total, "Chunks embedded and upserted.")
+        log_info(f"Added {total} chunks to Pinecone successfully.")
+        return total
     except Exception as e:
         log_error(f"Error adding chunks to Pinecone: {e}")
         raise e
 
-def retrieve_chunks(index, query, embeddings, top_k=5):
+def delete_chunks_from_pinecone(index, ids, batch_size=1000, lexical_index=None):
+    """
+    Deletes vectors from the Pinecone index by ID.
+
+    Args:
+        index (pinecone.Index): The Pinecone index instance.
+        ids (list of str): IDs of the vectors to delete.
+        batch_size (int, optional): IDs per delete request (Pinecone accepts at most 1000).
+        lexical_index (bm25.BM25Index, optional): BM25 index the chunks are also removed from.
+
+    Returns:
+        int: The number of IDs deleted.
+    """
+    try:
+        for batch in _batched(ids, batch_size):
+            with timed("delete"):
+                index.delete(ids=batch)
+        _persist(index)
+        if lexical_index is not None:
+            lexical_index.delete(ids)
+            _persist(lexical_index)
+        if ids:
+            _invalidate_response_caches()
+        increment("rag_chunks_deleted_total", len(ids), "Stale chunks deleted.")
+        log_info(f"Deleted {len(ids)} stale chunks from Pinecone.")
+        return len(ids)
+    except Exception as e:
+        log_error(f"Error deleting chunks from Pinecone: {e}")
+        raise e
+
+def retrieve_chunks(index, query, embeddings, top_k=5, lexical_index=None):
     """
     Retrieves the top_k most relevant chunks from Pinecone based on the query.
 
@@ -94,15 +488,24 @@ def retrieve_chunks(index, query, embeddings, top_k=5):
         query (str): The user's query string.
         embeddings (OpenAIEmbeddings): The embeddings instance to generate query embeddings.
         top_k (int, optional): Number of top results to retrieve. Defaults to 5.
+        lexical_index (bm25.BM25Index, optional): BM25 index fused with the vector results
+            (see retrieval.hybrid_search).
 
     Returns:
         list of str: List of retrieved text chunks, or an empty list if an error occurs.
     """
     try:
+        # The embeddings from get_embeddings time the embed_query stage
         query_vector = embeddings.embed_query(query)
-        results = index.query(vector=query_vector, top_k=top_k, include_metadata=True)
-        retrieved_chunks = [match['metadata']['text'] for match in results.matches]
-        log_info(f"Retrieved {len(retrieved_chunks)} chunks from Pinecone for the query.")
+        with timed("vector_query"):
+            if lexical_index is not None:
+                from retrieval import hybrid_search
+                matches = hybrid_search(index, query, query_vector, lexical_index, top_k=top_k)
+                retrieved_chunks = [match['metadata']['text'] for match in matches]
+            else:
+                results = index.query(vector=query_vector, top_k=top_k, include_metadata=True)
+                retrieved_chunks = [match['metadata']['text'] for match in results.matches]
+        log_info(f"Retrieved {len(retrieved_chunks)} chunks from Pinecone for the query.", hot=True)
         return retrieved_chunks
     except Exception as e:
         log_error(f"Error retrieving chunks from Pinecone: {e}")
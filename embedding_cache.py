@@ -0,0 +1,183 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+from utils import log_error, log_info
+
+# SQLite's default limit on bound parameters per statement is 999
+_SQLITE_MAX_PARAMS = 900
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings instance with a persistent SQLite cache.
+
+    Vectors are keyed by a digest of the model name and the text, and stored as float32
+    blobs. The least recently used entries are evicted once the cache holds more than
+    max_entries vectors.
+    """
+
+    def __init__(self, embeddings, model_name, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            embeddings (Embeddings): The embeddings instance used on cache misses.
+            model_name (str): Name of the embedding model, part of every cache key.
+            path (str, optional): Location of the SQLite cache file.
+            max_entries (int, optional): Maximum number of cached vectors.
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        log_info(f"Opened embedding cache '{path}' with {self._entries} entries for model '{model_name}'.")
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def _lookup(self, keys):
+        """
+        Fetches cached vectors for keys in as few queries as possible and marks them as used.
+        """
+        found = {}
+        now = time.time()
+        for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+            batch = keys[start:start + _SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if rows:
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                    [now] + [key for key, _ in rows]
+                )
+        return found
+
+    def _store(self, items):
+        """
+        Inserts (key, vector) pairs and evicts the least recently used entries if over capacity.
+        """
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+        )
+        self._entries += len(items)
+        if self._entries > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (self._entries - self.max_entries,)
+            )
+            self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _cached(self, texts):
+        """
+        Returns the keys of texts, the cached vectors found for them and the texts missing,
+        keyed and de-duplicated.
+        """
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            try:
+                found = self._lookup(keys)
+                self._conn.commit()
+            except Exception as e:
+                log_error(f"Error reading embedding cache: {e}")
+                found = {}
+
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        return keys, found, missing
+
+    def _save(self, found, missing, vectors):
+        computed = list(zip(missing.keys(), vectors))
+        found.update(computed)
+        with self._lock:
+            try:
+                self._store(computed)
+                self._conn.commit()
+            except Exception as e:
+                log_error(f"Error writing embedding cache: {e}")
+
+    def _get_or_compute(self, texts, compute):
+        keys, found, missing = self._cached(texts)
+        if missing:
+            self._save(found, missing, compute(list(missing.values())))
+        return [found[key] for key in keys]
+
+    async def _aget_or_compute(self, texts, compute):
+        keys, found, missing = self._cached(texts)
+        if missing:
+            self._save(found, missing, await compute(list(missing.values())))
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts):
+        """
+        Embeds texts, calling the wrapped embeddings only for texts not already cached.
+        """
+        return self._get_or_compute(texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        """
+        Embeds a query string, served from the cache when the same text was embedded before.
+        """
+        return self._get_or_compute([text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    async def aembed_documents(self, texts):
+        """
+        Async version of embed_documents; misses go to the wrapped embeddings' aembed_documents.
+        """
+        return await self._aget_or_compute(texts, self.embeddings.aembed_documents)
+
+    async def aembed_query(self, text):
+        """
+        Async version of embed_query; a miss goes to the wrapped embeddings' aembed_query.
+        """
+
+        async def compute(texts):
+            return [await self.embeddings.aembed_query(texts[0])]
+
+        return (await self._aget_or_compute([text], compute))[0]
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """
+        Returns cache counters as a dict with hits, misses, hit_rate and entries.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "entries": self._entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
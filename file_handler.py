@@ -1,128 +1,531 @@
+import codecs
 import os
-from pypdf import PdfReader
-import docx
-import chardet
-from langchain.text_splitter import CharacterTextSplitter
-from utils import log_error, log_info
-import spacy
-
-# Load spaCy model globally
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    from spacy.cli import download
-    download("en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
-
-def read_pdf(file_path):
+import re
+from collections import deque
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor
+from config import (
+    INGEST_WORKERS, INGEST_PREFETCH, SENTENCE_SEGMENTER, CHUNK_UNIT, PARSED_TEXT_CACHE_PATH,
+    TXT_STREAM_THRESHOLD_BYTES
+)
+from utils import log_error, log_info, worker_logging
+from metrics import timed, increment
+from text_cache import get_text_cache
+import tokenizer
+
+SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.txt']
+
+# Formats whose extracted text is worth caching; plain text is as quick to read again
+CACHED_EXTENSIONS = ['.pdf', '.docx']
+
+# TXT files that are not UTF-8 have their encoding detected from a sample of this many bytes,
+# and TXT files above TXT_STREAM_THRESHOLD_BYTES are read and chunked in blocks of about
+# TXT_BLOCK_CHARS characters
+TXT_DETECT_SAMPLE_BYTES = 64 * 1024
+TXT_BLOCK_CHARS = 4 * 1024 * 1024
+
+SEGMENTERS = ['spacy', 'sentencizer', 'regex']
+CHUNK_UNITS = ['chars', 'tokens']
+
+# Components of en_core_web_sm that sentence segmentation does not need
+_UNUSED_COMPONENTS = ['tagger', 'attribute_ruler', 'lemmatizer', 'ner']
+
+# Long texts are segmented in windows of about this many characters, which keeps
+# spaCy well under its max_length limit and lets nlp.pipe batch the work
+SEGMENT_WINDOW_CHARS = 100000
+SEGMENT_BATCH_SIZE = 8
+
+# A sentence ends at ., ! or ? (optionally followed by closing quotes/brackets) before whitespace,
+# or at a blank line. Periods after initials and common abbreviations do not end a sentence.
+_ABBREVIATIONS = ['Mr', 'Mrs', 'Ms', 'Dr', 'Prof', 'Sr', 'Jr', 'St', 'vs', 'etc', 'e.g', 'i.e', 'No', 'Fig']
+_SENTENCE_BOUNDARY = re.compile(
+    r'(?:(?<=[.!?])|(?<=[.!?][\'")\]]))'
+    + r'(?<!\b[A-Z]\.)'
+    + ''.join(rf'(?<!\b{re.escape(abbreviation)}\.)' for abbreviation in _ABBREVIATIONS)
+    + r'\s+|\n\s*\n'
+)
+
+@lru_cache(maxsize=None)
+def get_nlp():
+    """
+    Loads the spaCy model on first use, keeping only the parser needed for doc.sents.
+
+    The model is cached, so each process (including each ingestion worker) loads it once.
+    """
+    import spacy
+    try:
+        return spacy.load("en_core_web_sm", exclude=_UNUSED_COMPONENTS)
+    except OSError:
+        from spacy.cli import download
+        download("en_core_web_sm")
+        return spacy.load("en_core_web_sm", exclude=_UNUSED_COMPONENTS)
+
+@timed("read_pdf")
+def read_pdf(file_path, strict=False):
     """
     Reads and extracts text from a PDF file.
+
+    Errors are logged and an empty string is returned, unless strict is True, in which case
+    they are raised so a file that fails to parse can be told apart from an empty one.
     """
     try:
+        from pypdf import PdfReader
         reader = PdfReader(file_path)
-        text = ""
+        pages = []
         for page in reader.pages:
             extracted_text = page.extract_text()
             if extracted_text:
-                text += extracted_text + "\n"
-        log_info(f"Successfully read PDF: {file_path}")
+                pages.append(extracted_text + "\n")
+        text = "".join(pages)
+        log_info(f"Successfully read PDF: {file_path}", hot=True)
         return text
     except Exception as e:
         log_error(f"Error reading PDF {file_path}: {e}")
+        if strict:
+            raise e
         return ""
 
-def read_docx(file_path):
+@timed("read_docx")
+def read_docx(file_path, strict=False):
     """
-    Reads and extracts text from a DOCX file.
+    Reads and extracts text from a DOCX file. Errors are handled as in read_pdf.
     """
     try:
+        import docx
         doc = docx.Document(file_path)
         text = "\n".join([para.text for para in doc.paragraphs])
-        log_info(f"Successfully read DOCX: {file_path}")
+        log_info(f"Successfully read DOCX: {file_path}", hot=True)
         return text
     except Exception as e:
         log_error(f"Error reading DOCX {file_path}: {e}")
+        if strict:
+            raise e
         return ""
 
-def read_txt(file_path):
+def _detect_encoding(sample):
+    """
+    Guesses the encoding of a TXT file from a sample of its bytes with chardet, falling back
+    to UTF-8 when the guess is unsure.
     """
-    Reads and extracts text from a TXT file with encoding detection.
+    import chardet
+    detected = chardet.detect(sample)
+    if detected['encoding'] and detected['confidence'] > 0.5:
+        return detected['encoding']
+    return 'utf-8'
+
+def _decode_txt(raw_data):
+    """
+    Decodes the bytes of a TXT file, returning (text, encoding).
+
+    UTF-8 is tried first, since decoding it is fast and most files are. Otherwise chardet
+    looks only at a sample around the first byte that is not UTF-8, not at the whole file,
+    and bytes the detected encoding cannot decode are replaced.
+    """
+    if raw_data.startswith(codecs.BOM_UTF8):
+        return raw_data[len(codecs.BOM_UTF8):].decode('utf-8', errors='replace'), 'utf-8-sig'
+    try:
+        return raw_data.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError as e:
+        start = max(0, e.start - TXT_DETECT_SAMPLE_BYTES // 2)
+        encoding = _detect_encoding(raw_data[start:start + TXT_DETECT_SAMPLE_BYTES])
+        return raw_data.decode(encoding, errors='replace'), encoding
+
+def _normalize_newlines(text):
+    # Text mode reads translated \r\n and \r to \n; keep doing so for bytes decoded directly
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+@timed("read_txt")
+def read_txt(file_path, strict=False):
+    """
+    Reads and extracts text from a TXT file with encoding detection. Errors are handled as
+    in read_pdf.
+
+    The file is read once and decoded in memory (see _decode_txt). Files too large to hold
+    comfortably are better read with iter_txt_blocks.
     """
     try:
         with open(file_path, 'rb') as f:
             raw_data = f.read()
-            detected = chardet.detect(raw_data)
-            encoding = detected['encoding'] if detected['confidence'] > 0.5 else 'utf-8'
-        with open(file_path, 'r', encoding=encoding) as f:
-            text = f.read()
-        log_info(f"Successfully read TXT: {file_path} with encoding {encoding}")
-        return text
+        text, encoding = _decode_txt(raw_data)
+        log_info(f"Successfully read TXT: {file_path} with encoding {encoding}", hot=True)
+        return _normalize_newlines(text)
     except Exception as e:
         log_error(f"Error reading TXT {file_path}: {e}")
+        if strict:
+            raise e
         return ""
 
-def chunk_text(text, max_length=1000, chunk_overlap=100):
+def iter_txt_blocks(file_path, block_chars=TXT_BLOCK_CHARS):
     """
-    Splits text into chunks using spaCy for sentence segmentation, ensuring that chunk_overlap < max_length.
+    Lazily reads a TXT file in blocks of about block_chars characters, so memory stays
+    bounded however large the file is.
+
+    The encoding is detected from the first TXT_DETECT_SAMPLE_BYTES bytes: UTF-8 if they
+    decode as UTF-8, otherwise chardet's guess. Undecodable bytes are replaced. Blocks end
+    at a blank line, or failing that a line break, so they split between paragraphs.
+
+    Yields:
+        str: Consecutive blocks of the file's text.
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(TXT_DETECT_SAMPLE_BYTES)
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    else:
+        try:
+            # The sample may end partway through a character, so it is not decoded as final
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            encoding = 'utf-8'
+        except UnicodeDecodeError:
+            encoding = _detect_encoding(sample)
+    log_info(f"Streaming TXT: {file_path} with encoding {encoding}", hot=True)
+
+    with open(file_path, 'r', encoding=encoding, errors='replace') as f:
+        carry = ""
+        while True:
+            block = f.read(block_chars)
+            if not block:
+                break
+            block = carry + block
+            cut = block.rfind('\n\n')
+            if cut < len(block) // 2:
+                cut = block.rfind('\n')
+            if cut <= 0:
+                cut = len(block)
+            carry = block[cut:]
+            yield block[:cut]
+        if carry.strip():
+            yield carry
+
+@lru_cache(maxsize=None)
+def _get_sentencizer():
+    """
+    Returns a blank English pipeline with spaCy's rule-based sentencizer.
+    """
+    import spacy
+    sentencizer = spacy.blank("en")
+    sentencizer.add_pipe("sentencizer")
+    return sentencizer
+
+def _split_windows(text, window_chars=SEGMENT_WINDOW_CHARS):
+    """
+    Splits text into windows of at most window_chars, preferring paragraph and line breaks.
+    """
+    windows = []
+    start = 0
+    while len(text) - start > window_chars:
+        end = start + window_chars
+        cut = text.rfind("\n\n", start, end)
+        if cut <= start:
+            cut = text.rfind("\n", start, end)
+        if cut <= start:
+            cut = text.rfind(". ", start, end) + 1
+        if cut <= start:
+            cut = end
+        windows.append(text[start:cut])
+        start = cut
+    windows.append(text[start:])
+    return windows
+
+def split_sentences(text, segmenter=None):
+    """
+    Splits text into sentences with the selected segmentation backend.
+
+    Args:
+        text (str): The text to segment.
+        segmenter (str, optional): 'spacy' (en_core_web_sm parser), 'sentencizer' (spaCy's
+            rule-based sentencizer) or 'regex' (punctuation-based splitter). Defaults to
+            SENTENCE_SEGMENTER from config.
+
+    Returns:
+        list of str: The sentences, without surrounding whitespace.
+    """
+    segmenter = segmenter or SENTENCE_SEGMENTER
+    if segmenter == 'regex':
+        sentences = _SENTENCE_BOUNDARY.split(text)
+    elif segmenter in ('spacy', 'sentencizer'):
+        pipeline = get_nlp() if segmenter == 'spacy' else _get_sentencizer()
+        windows = _split_windows(text)
+        sentences = [
+            sent.text
+            for doc in pipeline.pipe(windows, batch_size=SEGMENT_BATCH_SIZE)
+            for sent in doc.sents
+        ]
+    else:
+        raise ValueError(f"Unknown sentence segmenter '{segmenter}'. Expected one of {SEGMENTERS}.")
+    return [sentence.strip() for sentence in sentences if sentence and sentence.strip()]
+
+def _count_sentence_tokens(sentences, max_tokens, encoding):
+    """
+    Encodes all sentences in one batch call and returns (sentence, token_count) pairs.
+
+    Sentences longer than max_tokens are split into pieces of at most max_tokens tokens.
+    """
+    pieces = []
+    for sentence, tokens in zip(sentences, encoding.encode_ordinary_batch(sentences)):
+        if len(tokens) <= max_tokens:
+            pieces.append((sentence, len(tokens)))
+            continue
+        for start in range(0, len(tokens), max_tokens):
+            window = tokens[start:start + max_tokens]
+            pieces.append((encoding.decode(window).strip(), len(window)))
+    return pieces
+
+def _chunk_by_tokens(sentences, max_tokens, overlap_tokens, encoding):
+    """
+    Packs whole sentences into chunks of at most max_tokens tokens.
+
+    Each new chunk starts with the trailing sentences of the previous chunk that fit in
+    overlap_tokens, so the overlap never cuts a sentence in half.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for sentence, count in _count_sentence_tokens(sentences, max_tokens, encoding):
+        if current and current_tokens + count > max_tokens:
+            chunks.append(" ".join(text for text, _ in current))
+            overlap = []
+            overlap_count = 0
+            for text, text_count in reversed(current):
+                if overlap_count + text_count > overlap_tokens or overlap_count + text_count + count > max_tokens:
+                    break
+                overlap.insert(0, (text, text_count))
+                overlap_count += text_count
+            current = overlap
+            current_tokens = overlap_count
+        current.append((sentence, count))
+        current_tokens += count
+    if current:
+        chunks.append(" ".join(text for text, _ in current))
+    return chunks
+
+def _chunk_by_chars(sentences, max_length, chunk_overlap):
+    """
+    Packs sentences into chunks of about max_length characters, carrying over the last
+    chunk_overlap characters of the sentence that starts a new chunk.
+    """
+    chunks = []
+    current_chunk = ""
+
+    for sentence in sentences:
+        if len(current_chunk) + len(sentence) > max_length:
+            chunks.append(current_chunk.strip())
+            current_chunk = sentence[-chunk_overlap:]  # Add overlap
+        else:
+            current_chunk += " " + sentence
+
+    if current_chunk.strip():
+        chunks.append(current_chunk.strip())
+    return chunks
+
+@timed("chunk_text")
+def chunk_text(text, max_length=1000, chunk_overlap=100, segmenter=None, unit=None, strict=False):
+    """
+    Splits text into chunks on sentence boundaries, ensuring that chunk_overlap < max_length.
+
+    Sentences are found with split_sentences using the given segmenter backend. unit selects
+    how max_length and chunk_overlap are measured: 'chars' (default) or 'tokens', which
+    counts tiktoken tokens and overlaps chunks by whole sentences. Defaults to CHUNK_UNIT
+    from config.
+
+    Errors are logged and an empty list is returned, unless strict is True.
     """
     try:
+        unit = unit or CHUNK_UNIT
+        if unit not in CHUNK_UNITS:
+            raise ValueError(f"Unknown chunk unit '{unit}'. Expected one of {CHUNK_UNITS}.")
         if chunk_overlap >= max_length:
             log_error(f"chunk_overlap ({chunk_overlap}) >= max_length ({max_length}). Adjusting chunk_overlap to {max_length - 1}.")
             chunk_overlap = max_length - 1  # Adjust to ensure overlap is less than chunk size
 
-        doc = nlp(text)
-        sentences = [sent.text for sent in doc.sents]
-        chunks = []
-        current_chunk = ""
+        sentences = split_sentences(text, segmenter)
+        if unit == 'tokens':
+            chunks = _chunk_by_tokens(sentences, max_length, chunk_overlap, tokenizer.get_encoding())
+        else:
+            chunks = _chunk_by_chars(sentences, max_length, chunk_overlap)
 
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) > max_length:
-                chunks.append(current_chunk.strip())
-                current_chunk = sentence[-chunk_overlap:]  # Add overlap
-            else:
-                current_chunk += " " + sentence
-        
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
-
-        log_info(f"Successfully chunked text into {len(chunks)} chunks.")
+        increment("rag_chunks_created_total", len(chunks), "Chunks produced by chunk_text.")
+        log_info(f"Successfully chunked text into {len(chunks)} chunks.", hot=True)
         return chunks
     except Exception as e:
         log_error(f"Error chunking text: {e}")
+        if strict:
+            raise e
         return []
 
-def process_files(directory, chunk_size=1000, chunk_overlap=100, recursive=False):
+def read_file(file_path, text_cache_path="", strict=False):
     """
-    Processes supported files in a directory and optionally subdirectories.
+    Extracts text from a supported file, dispatching on its extension.
+
+    With a text_cache_path, the text of PDF and DOCX files is served from the parsed text
+    cache there when the file is unchanged (see text_cache.ParsedTextCache). strict is
+    passed on to the reader.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    readers = {'.pdf': read_pdf, '.docx': read_docx, '.txt': read_txt}
+    if ext not in readers:
+        return ""
+    reader = partial(readers[ext], strict=strict)
+    cache = get_text_cache(text_cache_path) if ext in CACHED_EXTENSIONS else None
+    if cache is not None:
+        return cache.get_or_parse(file_path, reader)
+    return reader(file_path)
+
+def _iter_file_paths(directory, recursive=False):
+    """
+    Yields the paths of supported files in a directory, in os.walk/os.listdir order.
+    """
+    for root, _, files in os.walk(directory) if recursive else [(directory, [], os.listdir(directory))]:
+        for filename in files:
+            ext = os.path.splitext(filename)[1].lower()
+            if ext not in SUPPORTED_EXTENSIONS:
+                log_info(f"Skipping unsupported file type: {filename}", hot=True)
+                continue
+            yield os.path.join(root, filename)
+
+def _chunk_file(file_path, chunk_size, chunk_overlap, segmenter=None, unit=None, text_cache_path=""):
+    """
+    Reads and chunks a single file. Runs in worker processes when process_files is parallel.
+
+    Returns:
+        list of str: The file's chunks (none if it has no text), or None if it could not be
+            read or chunked.
+    """
+    try:
+        text = read_file(file_path, text_cache_path, strict=True)
+        if not text:
+            return []
+        return chunk_text(text, max_length=chunk_size, chunk_overlap=chunk_overlap, segmenter=segmenter,
+                          unit=unit, strict=True)
+    except Exception as e:
+        log_error(f"Error processing file {file_path}: {e}")
+        return None
+
+def _is_large_txt(file_path):
+    """
+    Checks whether a file is a TXT file big enough to be streamed (see TXT_STREAM_THRESHOLD_BYTES).
     """
     try:
-        supported_extensions = ['.pdf', '.docx', '.txt']
-        all_chunks = []
-
-        for root, _, files in os.walk(directory) if recursive else [(directory, [], os.listdir(directory))]:
-            for filename in files:
-                ext = os.path.splitext(filename)[1].lower()
-                if ext not in supported_extensions:
-                    log_info(f"Skipping unsupported file type: {filename}")
-                    continue
-                file_path = os.path.join(root, filename)
-                try:
-                    if ext == '.pdf':
-                        text = read_pdf(file_path)
-                    elif ext == '.docx':
-                        text = read_docx(file_path)
-                    elif ext == '.txt':
-                        text = read_txt(file_path)
-                    else:
-                        text = ""
-                    if text:
-                        chunks = chunk_text(text, max_length=chunk_size, chunk_overlap=chunk_overlap)
-                        all_chunks.extend(chunks)
-                except Exception as e:
-                    log_error(f"Error processing file {file_path}: {e}")
-
-        log_info(f"Processed {len(all_chunks)} chunks from directory '{directory}'.")
-        return all_chunks
+        return (os.path.splitext(file_path)[1].lower() == '.txt'
+                and os.path.getsize(file_path) > TXT_STREAM_THRESHOLD_BYTES)
+    except OSError:
+        return False
+
+def _iter_txt_chunks(file_path, chunk_size, chunk_overlap, segmenter=None, unit=None):
+    """
+    Lazily chunks a large TXT file one block at a time (see iter_txt_blocks), so neither
+    its text nor its chunks are held in memory at once. Chunks do not span blocks, which
+    end between paragraphs.
+
+    Errors are raised, since the chunks yielded before them are only part of the file.
+    """
+    for block in iter_txt_blocks(file_path, TXT_BLOCK_CHARS):
+        yield from chunk_text(block, max_length=chunk_size, chunk_overlap=chunk_overlap, segmenter=segmenter,
+                              unit=unit, strict=True)
+
+def _iter_chunked_files(file_paths, chunk_size, chunk_overlap, workers, prefetch, segmenter=None, unit=None,
+                        text_cache_path=""):
+    """
+    Yields (file_path, chunks) in input order, parsing at most prefetch files ahead of the consumer.
+
+    Large TXT files are chunked lazily in this process as they are consumed rather than in
+    a worker, whose result would have to be held and sent back whole.
+    """
+    if workers <= 1:
+        for file_path in file_paths:
+            if _is_large_txt(file_path):
+                yield file_path, _iter_txt_chunks(file_path, chunk_size, chunk_overlap, segmenter, unit)
+            else:
+                yield file_path, _chunk_file(file_path, chunk_size, chunk_overlap, segmenter, unit, text_cache_path)
+        return
+
+    def result(file_path, future):
+        if future is None:
+            return _iter_txt_chunks(file_path, chunk_size, chunk_overlap, segmenter, unit)
+        return future.result()
+
+    with worker_logging() as pool_kwargs, ProcessPoolExecutor(max_workers=workers, **pool_kwargs) as executor:
+        pending = deque()
+        for file_path in file_paths:
+            future = None
+            if not _is_large_txt(file_path):
+                future = executor.submit(_chunk_file, file_path, chunk_size, chunk_overlap, segmenter, unit,
+                                         text_cache_path)
+            pending.append((file_path, future))
+            if len(pending) >= prefetch:
+                done_path, future = pending.popleft()
+                yield done_path, result(done_path, future)
+        while pending:
+            done_path, future = pending.popleft()
+            yield done_path, result(done_path, future)
+
+def iter_chunks(directory, chunk_size=1000, chunk_overlap=100, recursive=False, workers=INGEST_WORKERS,
+                prefetch=INGEST_PREFETCH, segmenter=None, unit=None, exclude=(), text_cache_path=None, failed=None):
+    """
+    Lazily yields (source, chunk, metadata) records for supported files in a directory.
+
+    Files are only read as records are consumed, so a slow consumer (such as the
+    embedding/upsert stage) holds back parsing and memory stays bounded by the files in
+    flight rather than the size of the corpus. With workers > 1 (or 0 for one per CPU
+    core), up to prefetch files are read and chunked ahead in a pool of worker processes;
+    records are still yielded in the same order as a serial run. segmenter and unit are
+    passed on to chunk_text. Files whose paths are in exclude are not read at all.
+
+    A file that cannot be read or chunked (locked, unreadable, corrupt) yields no records
+    and, if a failed set is given, its path is added to it, so callers can tell it apart
+    from a file that has been deleted or emptied. A large TXT file that fails partway has
+    already yielded some records; it is reported as failed in the same way.
+
+    An error that stops the scan itself, such as an unreadable directory or a broken worker
+    pool, is raised rather than ending the stream early, so a partial scan is never taken
+    for the directory's full contents.
+
+    The text of unchanged PDF and DOCX files comes from the parsed text cache at
+    text_cache_path (PARSED_TEXT_CACHE_PATH by default; "" disables it), so changing the
+    chunking parameters only re-chunks them.
+    """
+    if text_cache_path is None:
+        text_cache_path = PARSED_TEXT_CACHE_PATH
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    prefetch = max(prefetch or 2 * workers, 1)
+    try:
+        file_paths = (path for path in _iter_file_paths(directory, recursive) if path not in exclude)
+        for file_path, chunks in _iter_chunked_files(file_paths, chunk_size, chunk_overlap, workers, prefetch,
+                                                         segmenter, unit, text_cache_path):
+            if chunks is None:
+                if failed is not None:
+                    failed.add(file_path)
+                continue
+            try:
+                for i, chunk in enumerate(chunks):
+                    yield file_path, chunk, {"chunk_index": i}
+            except Exception as e:
+                # Only large TXT files are chunked as they are consumed, and so can fail here
+                log_error(f"Error processing file {file_path}: {e}")
+                if failed is not None:
+                    failed.add(file_path)
     except Exception as e:
         log_error(f"Error processing files in directory '{directory}': {e}")
-        return []
\ No newline at end of file
+        raise e
+
+def process_files(directory, chunk_size=1000, chunk_overlap=100, recursive=False, with_sources=False,
+                  workers=INGEST_WORKERS, text_cache_path=None):
+    """
+    Processes supported files in a directory and optionally subdirectories.
+
+    This collects iter_chunks into a list; prefer iter_chunks for large corpora.
+    When with_sources is True, each chunk is returned as a (file_path, chunk) pair.
+    """
+    records = iter_chunks(directory, chunk_size, chunk_overlap, recursive, workers, text_cache_path=text_cache_path)
+    try:
+        if with_sources:
+            all_chunks = [(source, chunk) for source, chunk, _ in records]
+        else:
+            all_chunks = [chunk for _, chunk, _ in records]
+    except Exception:
+        return []  # Logged by iter_chunks
+    log_info(f"Processed {len(all_chunks)} chunks from directory '{directory}'.")
+    return all_chunks
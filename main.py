@@ -1,8 +1,16 @@
-from ui import get_user_input, prompt_add_documents, show_loading_message
-from file_handler import process_files
-from db_connector import initialize_pinecone, get_embeddings, add_chunks_to_pinecone, retrieve_chunks
+from ui import get_user_input, prompt_add_documents
+from file_handler import iter_chunks
+from db_connector import (
+    initialize_pinecone, get_embeddings, get_lexical_index, add_chunks_to_pinecone, delete_chunks_from_pinecone,
+    retrieve_chunks, backfill_lexical_index, check_lexical_coverage
+)
+from manifest import (
+    load_manifest, save_manifest, filter_new_records, find_stale_ids, record_sync, known_chunk_ids, keep_failed_sources
+)
+from checkpoint import IngestJournal
 from api_handler import create_rag_agent, generate_response_rag
 from utils import display_progress, log_info, log_error, log_conversation
+from config import STREAM_RESPONSES, CHECKPOINT_PATH
 import os
 import sys
 
@@ -20,6 +28,73 @@ def initialize_application():
         print(f"Error initializing Pinecone: {e}")
         sys.exit(1)
 
+def ingest_directory(index, embeddings, directory, pbar=None):
+    """
+    Adds new or changed chunks from a directory to the vector database and removes stale ones.
+
+    Progress is checkpointed to CHECKPOINT_PATH as batches are upserted. If an earlier run on
+    the directory was interrupted, files it completed are not parsed again and chunks it
+    upserted are not embedded again. If the scan of the directory fails partway, the error
+    is raised before any chunk is deleted or the manifest is updated. Files that exist but
+    cannot be read keep their chunks and manifest entries; only files that are gone (or no
+    longer have any text) have their chunks removed.
+
+    Args:
+        index (pinecone.Index or LocalVectorIndex): The vector index.
+        embeddings (OpenAIEmbeddings): The embeddings instance.
+        directory (str): Directory containing the documents.
+        pbar (tqdm, optional): Progress bar advanced as chunks are added.
+
+    Returns:
+        dict: Counts of files with content, chunks added, stale chunks removed, files
+            skipped because an interrupted run had completed them and files that could not
+            be read.
+    """
+    directory = os.path.abspath(directory)
+    manifest = load_manifest()
+    sources = {}
+    failed = set()
+    completed, stored_ids = {}, set()
+    journal = IngestJournal() if CHECKPOINT_PATH else None
+    if journal is not None:
+        completed = journal.completed_files(directory)
+        stored_ids = journal.upserted_ids(directory)
+        if stored_ids:
+            log_info(f"Resuming ingestion of '{directory}': skipping {len(completed)} completed files "
+                     f"and {len(stored_ids)} upserted chunks.")
+        sources.update(completed)
+        journal.track(sources, known_chunk_ids(manifest), failed)
+    # Files are parsed lazily as add_chunks_to_pinecone pulls batches of new chunks
+    records = iter_chunks(directory, exclude=completed, failed=failed)
+    lexical_index = get_lexical_index()
+    if lexical_index is not None:
+        # Unchanged chunks the BM25 index lacks are added to it without being embedded again
+        records = backfill_lexical_index(records, lexical_index, known_chunk_ids(manifest) | stored_ids)
+    new_records = filter_new_records(manifest, records, sources, stored_ids)
+    added = add_chunks_to_pinecone(index, new_records, embeddings, pbar, lexical_index=lexical_index,
+                                   journal=journal)
+    if failed:
+        log_error(f"Could not read {len(failed)} files in '{directory}'; their stored chunks are kept.")
+        keep_failed_sources(manifest, sources, failed)
+    if not sources:
+        log_info("No chunks processed; directory may not contain valid files.")
+        return {"files": 0, "added": 0, "removed": 0, "resumed": 0, "failed": len(failed)}
+    log_info("Added chunks to Pinecone successfully.")
+    stale_ids = find_stale_ids(manifest, sources, directory)
+    # Chunks upserted by the interrupted run from files that have changed since
+    current_ids = {chunk_id for ids in sources.values() for chunk_id in ids}
+    stale_ids += sorted(stored_ids - current_ids - set(stale_ids))
+    if stale_ids:
+        delete_chunks_from_pinecone(index, stale_ids, lexical_index=lexical_index)
+    record_sync(manifest, sources, directory)
+    save_manifest(manifest)
+    if lexical_index is not None:
+        check_lexical_coverage(lexical_index, known_chunk_ids(manifest))
+    if journal is not None:
+        journal.clear(directory)
+    return {"files": len(sources), "added": added, "removed": len(stale_ids), "resumed": len(completed),
+            "failed": len(failed)}
+
 def process_documents(index, embeddings):
     """
     Process and add documents to the vector database.
@@ -29,21 +104,28 @@ def process_documents(index, embeddings):
         directory = get_user_input("Enter the directory path containing your documents (or type 'exit' to quit): ", exit_message="Exiting document processing.")
         if os.path.isdir(directory):
             try:
-                chunks = process_files(directory)
-                if not chunks:
+                print("Processing new or changed chunks...")
+                pbar = display_progress(None, description="Adding chunks to Pinecone")
+                result = ingest_directory(index, embeddings, directory, pbar)
+                pbar.close()
+                if result["failed"]:
+                    print(f"Could not read {result['failed']} files; their existing chunks were kept. See the log for details.")
+                if not result["files"]:
                     print("No valid content found in the directory.")
-                    log_info("No chunks processed; directory may not contain valid files.")
                     return
-                num_chunks = len(chunks)
-                print(f"Processing {num_chunks} chunks...")
-                pbar = display_progress(num_chunks, description="Adding chunks to Pinecone")
-                add_chunks_to_pinecone(index, chunks, embeddings, pbar)
-                pbar.close()
-                log_info("Added chunks to Pinecone successfully.")
-                print("All documents have been added to the vector database.")
+                if result["resumed"]:
+                    print(f"Resumed an interrupted run; {result['resumed']} files were already done.")
+                if result["removed"]:
+                    print(f"Removed {result['removed']} stale chunks.")
+                if result["added"] or result["removed"]:
+                    print("All documents have been added to the vector database.")
+                else:
+                    print("All documents are already up to date.")
             except Exception as e:
                 log_error(f"Error processing files: {e}")
                 print(f"Error processing files: {e}")
+                if CHECKPOINT_PATH:
+                    print("Progress has been checkpointed; process the directory again to resume.")
         else:
             log_error("Invalid directory path provided by user.")
             print("Invalid directory path.")
@@ -59,20 +141,57 @@ def check_documents_in_database(index):
         log_error(f"Error checking Pinecone database: {e}")
         return False
 
-def start_query_loop(qa_chain):
+def start_query_loop(qa_chain, cache=None):
     """
     Start the query-response loop with the RAG agent, retaining context.
+
+    When a response cache is given, a query asked while the conversation is empty (its first
+    query, or the first after 'new') is answered from it if the same or a near-duplicate query
+    was answered before; later answers depend on the history, so they are neither looked up
+    nor cached.
     """
     print("RAG agent with LangChain is ready for use!")
-    conversation_history = []  # To log conversation history
+    # The chain's bounded conversation window (see api_handler.create_rag_agent), if it has memory
+    window = getattr(getattr(qa_chain, "memory", None), "window", None)
+    turn = 0  # The chain keeps the conversation history; the log gets one entry per turn
     while True:
-        user_query = get_user_input("\nEnter your query (or type 'exit' to quit): ", exit_message="Exiting the application.")
+        user_query = get_user_input(
+            "\nEnter your query ('new' starts a new conversation, 'exit' quits): ",
+            exit_message="Exiting the application."
+        )
+        if user_query.lower() == "new":
+            if window is not None:
+                window.clear()
+            print("Started a new conversation.")
+            log_info("User started a new conversation.")
+            continue
+        streamed_tokens = []
+
+        def print_token(token):
+            # Print tokens as they arrive, prefixed once per answer
+            print(token if streamed_tokens else f"Agent: {token}", end="", flush=True)
+            streamed_tokens.append(token)
+
         try:
-            show_loading_message("Processing your query, please wait")
-            response = generate_response_rag(qa_chain, user_query)
-            print(f"Agent: {response}")
-            log_conversation(user_query, response, conversation_history)
-            conversation_history.append({"query": user_query, "response": response})
+            stateless = window is None or (len(window) == 0 and not window.summary)
+            cached = cache.get(user_query) if cache and stateless else None
+            if cached:
+                result = dict(cached, streamed=False)
+                if window is not None:
+                    window.add_turn(user_query, result["answer"])  # The chain did not see this turn
+                log_info("Answered query from the response cache.", hot=True, **cache.stats())
+            else:
+                result = generate_response_rag(qa_chain, user_query, on_token=print_token)
+                if cache and stateless and not result.get("error"):
+                    cache.put(user_query, result)
+            if result["streamed"]:
+                print()  # End the streamed answer line
+            else:
+                print(f"Agent: {result['answer']}")
+            if result["sources"]:
+                print(f"Sources: {', '.join(result['sources'])}")
+            turn += 1
+            log_conversation(user_query, result["answer"], turn, sources=result["sources"])
         except Exception as e:
             log_error(f"Error generating response: {e}")
             print(f"Error generating response: {e}")
@@ -94,15 +213,24 @@ def main():
     # Create RAG Agent
     pinecone_index = index if documents_exist else None
     try:
-        qa_chain = create_rag_agent(pinecone_index, embeddings, model="gpt-4")
+        qa_chain = create_rag_agent(
+            pinecone_index, embeddings, model="gpt-4", return_sources=True, streaming=STREAM_RESPONSES,
+            lexical_index=get_lexical_index() if documents_exist else None
+        )
         log_info("RAG agent created successfully.")
     except Exception as e:
         log_error(f"Error creating RAG agent: {e}")
         print(f"Error creating RAG agent: {e}")
         sys.exit(1)
 
+    # start_query_loop only uses the cache for queries that don't depend on conversation history
+    cache = None
+    if documents_exist:
+        from response_cache import create_response_cache
+        cache = create_response_cache(embeddings)
+
     # Query Loop
-    start_query_loop(qa_chain)
+    start_query_loop(qa_chain, cache)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,160 @@
+import json
+import os
+from config import MANIFEST_PATH
+from db_connector import make_chunk_id
+from utils import log_error, log_info
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Loads the ingestion manifest from disk.
+
+    The manifest maps each ingested source file to the IDs of the chunks stored for it:
+    {"sources": {"/abs/path/file.pdf": ["<chunk id>", ...]}}
+
+    Args:
+        path (str, optional): Location of the manifest file.
+
+    Returns:
+        dict: The manifest, or an empty manifest if the file is missing or unreadable.
+    """
+    if not os.path.exists(path):
+        return {"sources": {}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest.setdefault("sources", {})
+        return manifest
+    except Exception as e:
+        log_error(f"Error loading manifest {path}: {e}. Starting from an empty manifest.")
+        return {"sources": {}}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """
+    Atomically writes the ingestion manifest to disk.
+
+    Args:
+        manifest (dict): The manifest to save.
+        path (str, optional): Location of the manifest file.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+    log_info(f"Saved manifest with {len(manifest['sources'])} sources to {path}.")
+
+
+def in_scope(source, directory, recursive=False):
+    """
+    Checks whether a manifest source would be visited by scanning directory.
+    """
+    directory = os.path.abspath(directory)
+    source_dir = os.path.dirname(os.path.abspath(source))
+    if source_dir == directory:
+        return True
+    return recursive and source_dir.startswith(directory + os.sep)
+
+
+def known_chunk_ids(manifest):
+    """
+    Returns the set of every chunk ID recorded in the manifest.
+    """
+    known_ids = set()
+    for ids in manifest["sources"].values():
+        known_ids.update(ids)
+    return known_ids
+
+
+def filter_new_records(manifest, records, sources, stored_ids=()):
+    """
+    Lazily filters a stream of chunk records down to the ones not yet ingested.
+
+    Args:
+        manifest (dict): The manifest from load_manifest.
+        records (iterable): (source, chunk) pairs or (source, chunk, metadata) records.
+        sources (dict): Filled in as records stream past with each source's current chunk IDs.
+        stored_ids (set, optional): Further IDs already in the index, such as those in the
+            checkpoint journal of an interrupted run.
+
+    Yields:
+        The records whose IDs are neither in the manifest nor in stored_ids, each at most once.
+    """
+    known_ids = known_chunk_ids(manifest)
+    known_ids.update(stored_ids)
+
+    seen_ids = set()
+    for record in records:
+        source, chunk = record[0], record[1]
+        chunk_id = make_chunk_id(source, chunk)
+        if chunk_id in seen_ids:
+            continue
+        seen_ids.add(chunk_id)
+        sources.setdefault(source, []).append(chunk_id)
+        if chunk_id not in known_ids:
+            yield record
+
+
+def find_stale_ids(manifest, sources, directory, recursive=False):
+    """
+    Lists previously ingested chunk IDs in scope of directory that no longer exist.
+
+    Args:
+        manifest (dict): The manifest from load_manifest.
+        sources (dict): Mapping of source to current chunk IDs, as filled by filter_new_records.
+        directory (str): The directory that was scanned.
+        recursive (bool, optional): Whether subdirectories were scanned.
+
+    Returns:
+        list of str: IDs to delete from the index.
+    """
+    current_ids = set()
+    for ids in sources.values():
+        current_ids.update(ids)
+    return [
+        chunk_id
+        for source, ids in manifest["sources"].items()
+        if in_scope(source, directory, recursive)
+        for chunk_id in ids
+        if chunk_id not in current_ids
+    ]
+
+
+def keep_failed_sources(manifest, sources, failed):
+    """
+    Treats files that could not be read as unchanged, so a locked or corrupt file keeps its
+    stored chunks and manifest entry until a later scan can read it.
+
+    Chunks read from a file before it failed are kept alongside its recorded ones, so they
+    are tracked and removed as stale once the file is read in full.
+
+    Args:
+        manifest (dict): The manifest from load_manifest.
+        sources (dict): Mapping of source to current chunk IDs, updated in place.
+        failed (iterable of str): Paths of the files that could not be read.
+    """
+    for source in failed:
+        ids = list(dict.fromkeys(manifest["sources"].get(source, []) + sources.get(source, [])))
+        if ids:
+            sources[source] = ids
+        else:
+            sources.pop(source, None)
+
+
+def record_sync(manifest, sources, directory, recursive=False):
+    """
+    Updates the manifest after a successful sync of directory.
+
+    Sources in scope that were not seen in this scan are dropped.
+
+    Args:
+        manifest (dict): The manifest to update in place.
+        sources (dict): Mapping of source to current chunk IDs, as filled by filter_new_records
+            and adjusted by keep_failed_sources.
+        directory (str): The directory that was scanned.
+        recursive (bool, optional): Whether subdirectories were scanned.
+    """
+    for source in list(manifest["sources"]):
+        if in_scope(source, directory, recursive) and source not in sources:
+            del manifest["sources"][source]
+    manifest["sources"].update(sources)
@@ -0,0 +1,160 @@
+import threading
+from collections import deque
+from typing import Any
+from langchain_core.memory import BaseMemory
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from config import MEMORY_TOKEN_LIMIT, MEMORY_SUMMARY_TOKENS
+from tokenizer import count_tokens
+from utils import log_error, log_info
+
+SUMMARY_PROMPT = (
+    "Progressively summarize the conversation below, adding to the previous summary. "
+    "Keep names, facts and open questions the user may refer back to, and use at most "
+    "{max_words} words.\n\nPrevious summary:\n{summary}\n\nNew lines of conversation:\n{lines}\n\n"
+    "New summary:"
+)
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+
+class ConversationWindow:
+    """
+    Conversation history bounded by a token budget.
+
+    Recent turns are kept verbatim while they fit in max_tokens. When a new turn overflows
+    the budget, the oldest turns are evicted until the window is back to half of it and are
+    folded into a rolling summary by the llm, so a summary is written every few turns rather
+    than on every one. The prompt cost of the history therefore stays bounded however long
+    the session runs. Without an llm, evicted turns are dropped.
+    """
+
+    def __init__(self, llm=None, max_tokens=MEMORY_TOKEN_LIMIT, summary_tokens=MEMORY_SUMMARY_TOKENS):
+        """
+        Args:
+            llm (BaseChatModel, optional): Chat model that writes the rolling summary.
+            max_tokens (int, optional): Token budget of the verbatim turns; 0 keeps no history.
+            summary_tokens (int, optional): Approximate length the summary is asked to stay within.
+        """
+        self.llm = llm
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        self._turns = deque()  # (query, answer, tokens)
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._turns)
+
+    def messages(self):
+        """
+        Returns the history as chat messages: the summary, if any, then the recent turns.
+        """
+        with self._lock:
+            messages = [SystemMessage(content=SUMMARY_PREFIX + self.summary)] if self.summary else []
+            for query, answer, _ in self._turns:
+                messages.extend([HumanMessage(content=query), AIMessage(content=answer)])
+        return messages
+
+    def as_text(self):
+        """
+        Returns the history formatted for a text prompt.
+        """
+        with self._lock:
+            lines = [SUMMARY_PREFIX + self.summary] if self.summary else []
+            for query, answer, _ in self._turns:
+                lines.extend([f"User: {query}", f"AI: {answer}"])
+        return "\n".join(lines)
+
+    def record_turn(self, query, answer):
+        """
+        Adds a turn and returns the turns evicted to bring the window back within budget,
+        without summarizing them (see asummarize).
+        """
+        if self.max_tokens <= 0:
+            return []
+        # Each turn is counted once, when it is added
+        tokens = sum(count_tokens([query, answer]))
+        with self._lock:
+            self._turns.append((query, answer, tokens))
+            self._tokens += tokens
+            evicted = []
+            if self._tokens > self.max_tokens:
+                while self._turns and self._tokens > self.max_tokens // 2:
+                    turn = self._turns.popleft()
+                    self._tokens -= turn[2]
+                    evicted.append(turn)
+            return evicted
+
+    def _summary_prompt(self, evicted):
+        lines = "\n".join(f"User: {query}\nAI: {answer}" for query, answer, _ in evicted)
+        prompt = SUMMARY_PROMPT.format(
+            max_words=max(1, self.summary_tokens * 3 // 4), summary=self.summary or "(none)", lines=lines
+        )
+        return [HumanMessage(content=prompt)]
+
+    def add_turn(self, query, answer):
+        """
+        Records a turn, summarizing the turns it pushes out of the window.
+        """
+        evicted = self.record_turn(query, answer)
+        if evicted and self.llm is not None:
+            try:
+                self.summary = self.llm.invoke(self._summary_prompt(evicted)).content.strip()
+                log_info(f"Folded {len(evicted)} turns into the conversation summary.", hot=True)
+            except Exception as e:
+                log_error(f"Error summarizing conversation history: {e}")
+
+    async def aadd_turn(self, query, answer):
+        """
+        Async version of add_turn.
+        """
+        await self.asummarize(self.record_turn(query, answer))
+
+    async def asummarize(self, evicted):
+        """
+        Folds turns returned by record_turn into the rolling summary.
+        """
+        if evicted and self.llm is not None:
+            try:
+                self.summary = (await self.llm.ainvoke(self._summary_prompt(evicted))).content.strip()
+                log_info(f"Folded {len(evicted)} turns into the conversation summary.", hot=True)
+            except Exception as e:
+                log_error(f"Error summarizing conversation history: {e}")
+
+    def clear(self):
+        """
+        Forgets the turns and the summary.
+        """
+        with self._lock:
+            self._turns.clear()
+            self._tokens = 0
+            self.summary = ""
+
+
+class WindowMemory(BaseMemory):
+    """
+    LangChain memory backed by a ConversationWindow, usable by LLMChain and RetrievalQA.
+
+    Unlike ConversationBufferMemory, output_key is explicit, so it also works with chains
+    that return source documents alongside the answer.
+    """
+
+    window: Any
+    memory_key: str = "history"
+    input_key: str = "input"
+    output_key: str = "text"
+    return_messages: bool = False
+
+    @property
+    def memory_variables(self):
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs):
+        history = self.window.messages() if self.return_messages else self.window.as_text()
+        return {self.memory_key: history}
+
+    def save_context(self, inputs, outputs):
+        self.window.add_turn(inputs[self.input_key], outputs[self.output_key])
+
+    def clear(self):
+        self.window.clear()
@@ -0,0 +1,268 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from functools import wraps
+from config import METRICS_ENABLED, METRICS_EXPORT_PATH
+from utils import log_error, log_info
+
+# Upper bounds in seconds, from 1ms to 2 minutes in roughly 2.5x steps
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60, 120)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """
+    A monotonically increasing count.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """
+    Distribution of observed values in fixed buckets, as Prometheus histograms are.
+
+    Recording is a binary search and an increment, so memory and cost per observation
+    stay constant however many values are recorded. Quantiles are estimated by linear
+    interpolation within the bucket they fall in.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """
+        Returns the estimated q-quantile (0 to 1), or None if nothing was observed.
+        """
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for position, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[position - 1] if position else 0.0
+                if position == len(self.buckets):
+                    return lower  # Beyond the last bound; report the bound
+                return lower + (self.buckets[position] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """
+    Named counters and histograms, each optionally split by labels, with Prometheus and
+    JSON export.
+    """
+
+    def __init__(self):
+        self._metrics = {}  # name -> (kind, help, {label key: Counter or Histogram})
+        self._lock = threading.Lock()
+
+    def _get(self, kind, factory, name, description, labels):
+        key = _label_key(labels)
+        family = self._metrics.get(name)
+        if family is None or key not in family[2]:
+            with self._lock:
+                family = self._metrics.setdefault(name, (kind, description, {}))
+                if family[0] != kind:
+                    raise ValueError(f"Metric '{name}' is already registered as a {family[0]}.")
+                family[2].setdefault(key, factory())
+        return family[2][key]
+
+    def counter(self, name, description="", **labels):
+        """
+        Returns the counter for name and labels, creating it on first use.
+        """
+        return self._get("counter", Counter, name, description, labels)
+
+    def histogram(self, name, description="", **labels):
+        """
+        Returns the latency histogram for name and labels, creating it on first use.
+        """
+        return self._get("histogram", Histogram, name, description, labels)
+
+    def reset(self):
+        """
+        Drops every metric.
+        """
+        with self._lock:
+            self._metrics.clear()
+
+    def snapshot(self):
+        """
+        Returns the current values: counters as numbers, histograms as count, sum and the
+        p50/p95/p99 estimates.
+
+        Returns:
+            dict: Maps each metric name to a list of {"labels": ..., ...} entries.
+        """
+        with self._lock:
+            families = [(name, kind, dict(series)) for name, (kind, _, series) in sorted(self._metrics.items())]
+        snapshot = {}
+        for name, kind, series in families:
+            entries = []
+            for key, metric in sorted(series.items()):
+                entry = {"labels": dict(key)}
+                if kind == "counter":
+                    entry["value"] = metric.value
+                else:
+                    entry.update(count=metric.count, sum=metric.sum)
+                    entry.update((f"p{round(q * 100)}", metric.quantile(q)) for q in QUANTILES)
+                entries.append(entry)
+            snapshot[name] = entries
+        return snapshot
+
+    def to_prometheus(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            families = [(name, kind, description, dict(series))
+                        for name, (kind, description, series) in sorted(self._metrics.items())]
+        lines = []
+        for name, kind, description, series in families:
+            if description:
+                lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in sorted(series.items()):
+                if kind == "counter":
+                    lines.append(f"{name}{_format_labels(key)} {metric.value}")
+                    continue
+                with metric._lock:
+                    counts, total, value_sum = list(metric.counts), metric.count, metric.sum
+                cumulative = 0
+                for bound, count in zip([*metric.buckets, "+Inf"], counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {value_sum}")
+                lines.append(f"{name}_count{_format_labels(key)} {total}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """
+        Writes the metrics to path: JSON if it ends in .json, otherwise Prometheus text
+        (which node_exporter's textfile collector can pick up).
+        """
+        content = json.dumps(self.snapshot(), indent=2) if path.endswith(".json") else self.to_prometheus()
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(f"{path}.tmp", path)
+
+
+REGISTRY = MetricsRegistry()
+
+
+class timed:
+    """
+    Records the duration of a stage in the rag_stage_duration_seconds histogram, and
+    failures in rag_stage_errors_total. Use as a context manager or a decorator:
+
+        with timed("embed_query"):
+            ...
+
+        @timed("read_pdf")
+        def read_pdf(file_path): ...
+
+    Does nothing when METRICS_ENABLED is off.
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if METRICS_ENABLED:
+            REGISTRY.histogram("rag_stage_duration_seconds", "Time spent in each stage.",
+                               stage=self.stage).observe(time.perf_counter() - self._start)
+            if exc_type is not None:
+                REGISTRY.counter("rag_stage_errors_total", "Stages that raised.", stage=self.stage).inc()
+        return False
+
+    def __call__(self, function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(self.stage):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+def observe_stage(stage, seconds):
+    """
+    Records a stage duration measured elsewhere, such as from a callback.
+    """
+    if METRICS_ENABLED:
+        REGISTRY.histogram("rag_stage_duration_seconds", "Time spent in each stage.", stage=stage).observe(seconds)
+
+
+def observe(name, seconds, description="", **labels):
+    """
+    Records a duration in a latency histogram other than the stage one.
+    """
+    if METRICS_ENABLED:
+        REGISTRY.histogram(name, description, **labels).observe(seconds)
+
+
+def increment(name, amount=1, description="", **labels):
+    """
+    Adds amount to a counter.
+    """
+    if METRICS_ENABLED:
+        REGISTRY.counter(name, description, **labels).inc(amount)
+
+
+def record_token_usage(model, prompt_tokens=0, completion_tokens=0):
+    """
+    Adds an LLM call's token usage to rag_llm_tokens_total.
+    """
+    increment("rag_llm_tokens_total", prompt_tokens, "Tokens used by LLM calls.", model=model, type="prompt")
+    increment("rag_llm_tokens_total", completion_tokens, "Tokens used by LLM calls.", model=model,
+              type="completion")
+
+
+def _export_on_exit():
+    try:
+        REGISTRY.export(METRICS_EXPORT_PATH)
+        log_info(f"Wrote metrics to '{METRICS_EXPORT_PATH}'.")
+    except Exception as e:
+        log_error(f"Error writing metrics to '{METRICS_EXPORT_PATH}': {e}")
+
+
+if METRICS_ENABLED and METRICS_EXPORT_PATH:
+    atexit.register(_export_on_exit)
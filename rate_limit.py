@@ -0,0 +1,164 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from metrics import increment, observe
+from utils import log_info
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute, holding at most capacity tokens.
+
+    A reservation takes its tokens straight away, even if that drives the bucket into debt,
+    and the caller then waits until the debt is repaid. Callers are therefore served in the
+    order they arrive, and a request larger than the capacity (a big embedding batch) is
+    delayed rather than refused.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        """
+        Args:
+            rate_per_minute (float): Tokens added per minute; 0 or less disables the limit.
+            capacity (float, optional): Largest burst; defaults to one minute's worth.
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """
+        Takes amount tokens and returns the number of seconds to wait before using them.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def pause(self, seconds):
+        """
+        Empties the bucket so that nothing is granted for the next seconds, as after a 429.
+        """
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits of one API, shared by every thread and
+    coroutine calling it.
+
+    The time callers spend waiting is recorded in the rag_rate_limit_wait_seconds histogram
+    and 429 responses in rag_rate_limited_total, both labelled with the limiter name.
+    """
+
+    def __init__(self, name, requests_per_minute=0, tokens_per_minute=0):
+        """
+        Args:
+            name (str): Label of the limiter in logs and metrics.
+            requests_per_minute (float, optional): Request limit; 0 disables it.
+            tokens_per_minute (float, optional): Token limit; 0 disables it.
+        """
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def _reserve(self, tokens):
+        delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        increment("rag_rate_limit_requests_total", 1, "Requests admitted by each rate limiter.", limiter=self.name)
+        if tokens:
+            increment("rag_rate_limit_tokens_total", tokens, "Estimated tokens admitted by each rate limiter.",
+                      limiter=self.name)
+        observe("rag_rate_limit_wait_seconds", delay, "Time spent waiting for a rate limiter.", limiter=self.name)
+        return delay
+
+    def acquire(self, tokens=0):
+        """
+        Blocks until a request of the given number of tokens is within the limits.
+
+        Returns:
+            float: The number of seconds waited.
+        """
+        delay = self._reserve(tokens)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    async def aacquire(self, tokens=0):
+        """
+        Async version of acquire.
+        """
+        delay = self._reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+    def rate_limited(self, delay):
+        """
+        Records a 429 response and holds back every caller for delay seconds, so that
+        concurrent workers back off together instead of each hitting the limit again.
+        """
+        increment("rag_rate_limited_total", 1, "Requests rejected with a rate-limit error.", limiter=self.name)
+        self.requests.pause(delay)
+        log_info(f"Rate limited by {self.name}; pausing requests for {delay:.1f}s.")
+
+
+def is_rate_limit_error(error):
+    """
+    Returns True if error is a rate-limit (HTTP 429) response from OpenAI, Pinecone or httpx.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after(error):
+    """
+    Returns the delay in seconds asked for by the Retry-After header of an error's HTTP
+    response, or None if it has none.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return float(value) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0, error=None):
+    """
+    Returns the delay before retry number attempt (from 1): exponential backoff with full
+    jitter, so concurrent workers that failed together do not retry together. A Retry-After
+    from the error's response is honoured if it asks for longer.
+
+    Args:
+        attempt (int): The attempt that failed, from 1.
+        base (float, optional): Delay ceiling of the first retry in seconds.
+        cap (float, optional): Largest delay ceiling in seconds.
+        error (Exception, optional): The error that caused the retry.
+
+    Returns:
+        float: Seconds to wait.
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+    requested = retry_after(error) if error is not None else None
+    return max(delay, min(requested, cap)) if requested is not None else delay
@@ -0,0 +1,171 @@
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+import numpy as np
+from config import RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_SIMILARITY
+from utils import log_error, log_info
+
+# Every live cache, so ingestion can invalidate them without holding a reference
+_caches = weakref.WeakSet()
+
+
+def normalize_query(query):
+    """
+    Normalises case and whitespace so trivially different queries share an exact-match key.
+    """
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class ResponseCache:
+    """
+    In-memory cache of query results with an exact-match and a semantic layer.
+
+    A query is first looked up by its normalised text. On a miss, and if embeddings are
+    given, its embedding is compared with those of the cached queries and the answer of
+    the most similar one is reused when the cosine similarity reaches similarity_threshold.
+    Entries expire after ttl seconds, the least recently used are evicted beyond
+    max_entries, and every cache is cleared when documents are added or removed.
+
+    Only use it for stateless (retrieval) chains; answers that depend on conversation
+    history must not be shared between queries.
+    """
+
+    def __init__(self, embeddings=None, similarity_threshold=RESPONSE_CACHE_SIMILARITY,
+                 ttl=RESPONSE_CACHE_TTL_SECONDS, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            embeddings (Embeddings, optional): Used to embed queries for the semantic layer;
+                without it only exact matches are served.
+            similarity_threshold (float, optional): Minimum cosine similarity for a semantic hit.
+            ttl (float, optional): Seconds an entry stays valid.
+            max_entries (int, optional): Maximum number of cached results.
+        """
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (result, vector, expires_at)
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def _embed(self, query):
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now):
+        expired = [key for key, (_, _, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _semantic_match(self, vector):
+        """
+        Returns the key of the most similar cached query above the threshold, or None.
+        """
+        if self._matrix is None:
+            self._matrix_keys = [key for key, (_, cached, _) in self._entries.items() if cached is not None]
+            self._matrix = np.array([self._entries[key][1] for key in self._matrix_keys], dtype=np.float32)
+        if not self._matrix_keys:
+            return None
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        return self._matrix_keys[best] if scores[best] >= self.similarity_threshold else None
+
+    def get(self, query):
+        """
+        Returns the cached result for query or a semantically equivalent one, or None.
+        """
+        key = normalize_query(query)
+        with self._lock:
+            self._expire(time.time())
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return self._entries[key][0]
+            has_candidates = self.embeddings is not None and bool(self._entries)
+
+        if has_candidates:
+            try:
+                vector = self._embed(query)
+            except Exception as e:
+                log_error(f"Error embedding query for the response cache: {e}")
+                vector = None
+            with self._lock:
+                match = self._semantic_match(vector) if vector is not None else None
+                if match is not None and match in self._entries:
+                    self._entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    log_info(f"Response cache semantic hit for query '{query}' (cached query '{match}').", hot=True)
+                    return self._entries[match][0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, query, result):
+        """
+        Caches the result for query, evicting the least recently used entry if full.
+        """
+        vector = None
+        if self.embeddings is not None:
+            try:
+                vector = self._embed(query)
+            except Exception as e:
+                log_error(f"Error embedding query for the response cache: {e}")
+        with self._lock:
+            self._entries[normalize_query(query)] = (result, vector, time.time() + self.ttl)
+            self._entries.move_to_end(normalize_query(query))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self):
+        """
+        Drops every cached result.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        """
+        Returns hit/miss counters, the hit rate and the number of entries.
+        """
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
+
+
+def invalidate_response_caches():
+    """
+    Clears every response cache; called whenever the indexed documents change.
+    """
+    for cache in list(_caches):
+        cache.invalidate()
+
+
+def create_response_cache(embeddings=None):
+    """
+    Creates a ResponseCache from the RESPONSE_CACHE_* settings.
+
+    Returns:
+        ResponseCache: The cache, or None if RESPONSE_CACHE_MAX_ENTRIES is 0.
+    """
+    if RESPONSE_CACHE_MAX_ENTRIES <= 0:
+        return None
+    return ResponseCache(embeddings)
@@ -0,0 +1,226 @@
+import math
+from typing import Any, List, Optional, Sequence
+from langchain_core.callbacks import CallbackManagerForRetrieverRun, Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores import Pinecone
+from bm25 import tokenize
+from config import HYBRID_CANDIDATES, CONTEXT_TOKEN_BUDGET, DEDUPE_SIMILARITY
+from metrics import timed
+from tokenizer import count_tokens
+
+# Rank offset in reciprocal rank fusion; 60 is the value from the original RRF paper
+RRF_K = 60
+
+# Weight of query term coverage against the retrieval rank when reranking
+RERANK_TERM_WEIGHT = 0.7
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merges ranked lists of IDs by reciprocal rank fusion.
+
+    Each ID scores sum(1 / (k + rank)) over the lists it appears in (rank starting at 1),
+    so IDs ranked well by several retrievers rise to the top without needing their raw
+    scores to be comparable.
+
+    Args:
+        rankings (list of list of str): ID lists, best first.
+        k (int, optional): Rank offset damping the weight of the top ranks.
+
+    Returns:
+        list of tuple: (id, fused score) pairs, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+
+def hybrid_search(index, query, query_vector, lexical_index=None, top_k=4, candidates=HYBRID_CANDIDATES):
+    """
+    Searches the vector index and, if given, the BM25 index, and fuses the results.
+
+    Each retriever contributes its best `candidates` matches; exact terms such as part
+    numbers that dense search ranks poorly are still found lexically, so a small top_k
+    keeps recall high. A BM25 index that is empty or not searchable (missing stored
+    chunks) is left out.
+
+    Args:
+        index (pinecone.Index or LocalVectorIndex): The vector index.
+        query (str): The query text, for lexical search.
+        query_vector (list of float): The query embedding, for dense search.
+        lexical_index (bm25.BM25Index, optional): The BM25 index.
+        top_k (int, optional): Number of matches returned.
+        candidates (int, optional): Matches taken from each retriever before fusion.
+
+    Returns:
+        list of dict: Matches with id, score and metadata, best first.
+    """
+    use_lexical = lexical_index is not None and lexical_index.searchable and len(lexical_index) > 0
+    pool = max(top_k, candidates) if use_lexical else top_k
+    dense = [
+        {"id": match["id"], "score": match["score"], "metadata": dict(match["metadata"] or {})}
+        for match in index.query(vector=query_vector, top_k=pool, include_metadata=True)["matches"]
+    ]
+    lexical = lexical_index.search(query, pool) if use_lexical else []
+    if not lexical:
+        return dense[:top_k]
+
+    by_id = {match["id"]: match for match in lexical}
+    by_id.update({match["id"]: match for match in dense})
+    fused = reciprocal_rank_fusion([[match["id"] for match in dense], [match["id"] for match in lexical]])
+    return [{**by_id[match_id], "score": score} for match_id, score in fused[:top_k]]
+
+
+class IndexRetriever(BaseRetriever):
+    """
+    Retriever over any index exposing Pinecone's query API, including LocalVectorIndex.
+
+    langchain's Pinecone vector store only accepts a real pinecone.Index, so the RAG chain
+    uses this retriever for the local backend, and for hybrid search when a BM25
+    lexical_index is given (see hybrid_search).
+    """
+
+    index: Any
+    embeddings: Any
+    lexical_index: Any = None
+    top_k: int = 4
+    candidates: int = HYBRID_CANDIDATES
+    text_key: str = "text"
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        with timed("vector_query"):
+            matches = hybrid_search(
+                self.index, query, query_vector, self.lexical_index, top_k=self.top_k, candidates=self.candidates
+            )
+        documents = []
+        for match in matches:
+            metadata = dict(match["metadata"])
+            text = metadata.pop(self.text_key, "")
+            metadata["score"] = match["score"]
+            documents.append(Document(page_content=text, metadata=metadata))
+        return documents
+
+
+class TimedPinecone(Pinecone):
+    """
+    langchain's Pinecone vector store with its index query timed as the vector_query stage,
+    so the default RAG chain splits retrieval time like IndexRetriever does. The query
+    embedding is timed by the embeddings (see clients.TimedEmbeddings).
+    """
+
+    def similarity_search_by_vector_with_score(self, *args, **kwargs):
+        with timed("vector_query"):
+            return super().similarity_search_by_vector_with_score(*args, **kwargs)
+
+
+def _shingles(text, size=3):
+    words = text.lower().split()
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def dedupe_texts(texts, threshold=DEDUPE_SIMILARITY):
+    """
+    Returns the positions of texts to keep, dropping any whose word-trigram Jaccard
+    similarity to an earlier kept text reaches threshold.
+    """
+    kept, kept_shingles = [], []
+    for position, text in enumerate(texts):
+        shingles = _shingles(text)
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(position)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def rerank_texts(query, texts, term_weight=RERANK_TERM_WEIGHT):
+    """
+    Orders texts (given best first by retrieval) by a cheap local relevance score.
+
+    The score blends how much of the query a text covers with its original retrieval rank.
+    Query terms are weighted by their rarity among the candidates, so a chunk that has the
+    distinctive terms of the question moves up, while terms that every chunk or no chunk
+    contains do not affect the order.
+
+    Returns:
+        list of int: Positions in texts, most relevant first.
+    """
+    query_terms = set(tokenize(query))
+    text_terms = [query_terms.intersection(tokenize(text)) for text in texts]
+    weights = {}
+    for term in query_terms:
+        frequency = sum(term in terms for terms in text_terms)
+        if frequency:
+            weights[term] = math.log(1 + len(texts) / (1 + frequency))
+    total_weight = sum(weights.values())
+    scores = []
+    for position, terms in enumerate(text_terms):
+        coverage = sum(weights[term] for term in terms) / total_weight if total_weight else 0.0
+        prior = 1.0 - position / len(texts)
+        scores.append(term_weight * coverage + (1 - term_weight) * prior)
+    return sorted(range(len(texts)), key=lambda position: scores[position], reverse=True)
+
+
+def pack_texts(texts, token_budget, token_counts=None):
+    """
+    Greedily selects texts, in the given order, that fit together within token_budget.
+
+    A text that does not fit is skipped in favour of shorter ones after it. The first text
+    is always kept so a query never goes without context.
+
+    Returns:
+        list of int: Positions of the selected texts, in the given order.
+    """
+    token_counts = token_counts or count_tokens(texts)
+    selected, used = [], 0
+    for position, tokens in enumerate(token_counts):
+        if used + tokens <= token_budget or not selected:
+            selected.append(position)
+            used += tokens
+    return selected
+
+
+@timed("select_context")
+def select_context(query, texts, token_budget=CONTEXT_TOKEN_BUDGET, dedupe_threshold=DEDUPE_SIMILARITY):
+    """
+    De-duplicates, reranks and packs retrieved texts into a prompt token budget.
+
+    Args:
+        query (str): The user's query.
+        texts (list of str): Retrieved chunk texts, best first.
+        token_budget (int, optional): Maximum total tokens of the selected texts.
+        dedupe_threshold (float, optional): Similarity at which a text counts as a duplicate.
+
+    Returns:
+        list of int: Positions in texts of the chunks to use, most relevant first.
+    """
+    unique = dedupe_texts(texts, dedupe_threshold)
+    ranked = [unique[i] for i in rerank_texts(query, [texts[position] for position in unique])]
+    packed = pack_texts([texts[position] for position in ranked], token_budget)
+    return [ranked[i] for i in packed]
+
+
+class ContextPacker(BaseDocumentCompressor):
+    """
+    Document compressor applying select_context to retrieved documents.
+
+    Wrapped around a retriever that returns a wide candidate set (with
+    langchain's ContextualCompressionRetriever), it sends the "stuff" chain only the
+    distinct, most relevant chunks that fit in token_budget.
+    """
+
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+    dedupe_threshold: float = DEDUPE_SIMILARITY
+
+    def compress_documents(self, documents: Sequence[Document], query: str,
+                           callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        if not documents:
+            return []
+        texts = [document.page_content for document in documents]
+        return [documents[position] for position in select_context(
+            query, texts, self.token_budget, self.dedupe_threshold
+        )]
@@ -0,0 +1,229 @@
+"""
+HTTP API for the RAG app.
+
+Run from the repository root:
+
+    python server.py --host 0.0.0.0 --port 8080
+
+Endpoints:
+    POST /ingest  {"directory": "/path/to/docs"} or
+                  {"documents": [{"source": "notes.txt", "text": "..."}]}
+    POST /query   {"query": "...", "session_id": "optional", "stream": false}
+    GET  /stats
+    GET  /metrics (Prometheus text format)
+    GET  /health
+
+A streamed query returns newline-delimited JSON: one {"token": ...} object per token,
+then the full result object.
+"""
+import argparse
+import asyncio
+import json
+import os
+from aiohttp import web
+from config import SERVER_HOST, SERVER_PORT
+from utils import log_error, log_info
+
+APP_STATE = web.AppKey("state", dict)
+
+
+def _json_error(status, message):
+    return web.json_response({"error": message}, status=status)
+
+
+async def _json_body(request):
+    # Returns the request's JSON object, or None if the body is not one
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def _stats_dict(stats):
+    # Pinecone returns a response object, the local index a plain dict
+    return stats.to_dict() if hasattr(stats, "to_dict") else dict(stats)
+
+
+def _ingest_documents(index, embeddings, documents, lexical_index=None):
+    """
+    Chunks and adds documents posted as text. Chunk IDs are content-addressed, so
+    posting the same document again does not duplicate it.
+    """
+    from file_handler import chunk_text
+    from db_connector import add_chunks_to_pinecone
+
+    records = (
+        (document["source"], chunk, {"chunk_index": i})
+        for document in documents
+        for i, chunk in enumerate(chunk_text(document["text"]))
+    )
+    added = add_chunks_to_pinecone(index, records, embeddings, lexical_index=lexical_index)
+    return {"files": len(documents), "added": added, "removed": 0}
+
+
+async def handle_ingest(request):
+    state = request.app[APP_STATE]
+    body = await _json_body(request)
+    if body is None:
+        return _json_error(400, "Request body must be a JSON object.")
+
+    directory = body.get("directory")
+    documents = body.get("documents")
+    if directory:
+        if not os.path.isdir(directory):
+            return _json_error(400, f"Directory not found: {directory}")
+    elif documents:
+        if not isinstance(documents, list) or not all(isinstance(doc, dict) and doc.get("source") and isinstance(doc.get("text"), str)
+                   for doc in documents):
+            return _json_error(400, "Each document needs a source and a text.")
+    else:
+        return _json_error(400, "Provide a directory or a list of documents.")
+
+    from main import ingest_directory
+
+    # Ingestion blocks on parsing and network calls, so it runs on a worker thread;
+    # the lock keeps concurrent ingests from racing on the manifest
+    async with state["ingest_lock"]:
+        try:
+            if directory:
+                result = await asyncio.to_thread(ingest_directory, state["index"], state["embeddings"], directory)
+            else:
+                result = await asyncio.to_thread(
+                    _ingest_documents, state["index"], state["embeddings"], documents, state["engine"].lexical_index
+                )
+        except Exception as e:
+            log_error(f"Error ingesting documents: {e}")
+            return _json_error(500, "Ingestion failed.")
+    log_info(f"Ingested documents over HTTP: {result}")
+    return web.json_response(result)
+
+
+async def handle_query(request):
+    state = request.app[APP_STATE]
+    body = await _json_body(request)
+    if body is None:
+        return _json_error(400, "Request body must be a JSON object.")
+    query = body.get("query")
+    if not isinstance(query, str) or not query.strip():
+        return _json_error(400, "The query must be a non-empty string.")
+    session_id = str(body.get("session_id") or id(request))
+    engine = state["engine"]
+    # Answers within a session depend on its history, so only stateless queries are cached
+    cache = state["cache"] if not body.get("session_id") else None
+    cached = await asyncio.to_thread(cache.get, query) if cache else None
+
+    if not body.get("stream"):
+        if cached:
+            return web.json_response(dict(cached, cached=True))
+        result = await engine.query(session_id, query)
+        if not body.get("session_id"):
+            engine.end_session(session_id)
+        if cache and not result["error"]:
+            await asyncio.to_thread(cache.put, query, result)
+        return web.json_response(result, status=504 if result["error"] == "timeout" else 200)
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    if cached:
+        await response.write(json.dumps({"token": cached["answer"]}).encode("utf-8") + b"\n")
+        await response.write(json.dumps(dict(cached, cached=True)).encode("utf-8") + b"\n")
+        await response.write_eof()
+        return response
+    tokens = asyncio.Queue()
+    task = asyncio.create_task(engine.query(session_id, query, on_token=tokens.put_nowait))
+    try:
+        while not (task.done() and tokens.empty()):
+            getter = asyncio.ensure_future(tokens.get())
+            await asyncio.wait([getter, task], return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                continue
+            await response.write(json.dumps({"token": getter.result()}).encode("utf-8") + b"\n")
+        result = task.result()
+        await response.write(json.dumps(result).encode("utf-8") + b"\n")
+        if cache and not result["error"]:
+            await asyncio.to_thread(cache.put, query, result)
+    finally:
+        task.cancel()
+        if not body.get("session_id"):
+            engine.end_session(session_id)
+    await response.write_eof()
+    return response
+
+
+async def handle_stats(request):
+    state = request.app[APP_STATE]
+    try:
+        stats = await asyncio.to_thread(state["index"].describe_index_stats)
+    except Exception as e:
+        log_error(f"Error reading index stats: {e}")
+        return _json_error(500, "Could not read index stats.")
+    return web.json_response({
+        "index": _stats_dict(stats),
+        "sessions": len(state["engine"].sessions),
+        "response_cache": state["cache"].stats() if state["cache"] else None,
+    })
+
+
+async def handle_metrics(request):
+    from metrics import REGISTRY
+
+    return web.Response(text=REGISTRY.to_prometheus(), content_type="text/plain")
+
+
+async def handle_health(request):
+    return web.json_response({"status": "ok"})
+
+
+def create_app(index, embeddings, engine, cache=None):
+    """
+    Builds the aiohttp application.
+
+    The index, embeddings and query engine are created once and shared by every request,
+    so their HTTP connection pools are reused instead of rebuilt per call.
+
+    Args:
+        index (pinecone.Index or LocalVectorIndex): The vector index.
+        embeddings (Embeddings): The embeddings instance.
+        engine (async_engine.AsyncQueryEngine): Engine answering queries.
+        cache (response_cache.ResponseCache, optional): Cache for queries sent without a session_id.
+
+    Returns:
+        web.Application: The application.
+    """
+    app = web.Application()
+    app[APP_STATE] = {
+        "index": index, "embeddings": embeddings, "engine": engine, "cache": cache, "ingest_lock": asyncio.Lock()
+    }
+    app.router.add_post("/ingest", handle_ingest)
+    app.router.add_post("/query", handle_query)
+    app.router.add_get("/stats", handle_stats)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--model", default="gpt-4")
+    args = parser.parse_args()
+
+    from db_connector import initialize_pinecone, get_embeddings, get_lexical_index
+    from async_engine import create_query_engine
+    from response_cache import create_response_cache
+
+    index = initialize_pinecone()
+    if index is None:
+        raise SystemExit("Could not initialize the vector index; see app.log.")
+    embeddings = get_embeddings()
+    engine = create_query_engine(index, embeddings, model=args.model, lexical_index=get_lexical_index())
+    log_info(f"Starting HTTP server on {args.host}:{args.port}.")
+    app = create_app(index, embeddings, engine, create_response_cache(embeddings))
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
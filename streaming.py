@@ -0,0 +1,89 @@
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from metrics import observe_stage, record_token_usage
+
+
+class TokenStreamHandler(BaseCallbackHandler):
+    """
+    Callback handler that forwards LLM tokens as they are generated and times the response.
+
+    Passed to chain.invoke through config={"callbacks": [...]}, so it reaches the retriever
+    and the LLM inside both RetrievalQA and LLMChain. It also records the retrieve, prompt
+    (from the end of retrieval to the LLM call) and llm stage durations, the time to first
+    token and the LLM's token usage in metrics.
+    """
+
+    def __init__(self, on_token=None, on_first_token=None):
+        """
+        Args:
+            on_token (callable, optional): Called with each new token.
+            on_first_token (callable, optional): Called once, just before the first token is
+                forwarded (e.g. to stop a loading spinner).
+        """
+        self.on_token = on_token
+        self.on_first_token = on_first_token
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.token_count = 0
+        self._retriever_starts = {}  # run_id -> start time
+        self._retrieved_time = None
+        self._llm_start_time = None
+        self._model = None
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._retriever_starts[run_id] = time.perf_counter()
+
+    def on_retriever_end(self, documents, *, run_id, parent_run_id=None, **kwargs):
+        start = self._retriever_starts.pop(run_id, None)
+        # A compression retriever wraps the base retriever; only the outer one is recorded
+        if start is not None and parent_run_id not in self._retriever_starts:
+            self._retrieved_time = time.perf_counter()
+            observe_stage("retrieve", self._retrieved_time - start)
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._llm_start_time = time.perf_counter()
+        if self._retrieved_time is not None:
+            observe_stage("prompt", self._llm_start_time - self._retrieved_time)
+        self._model = (kwargs.get("invocation_params") or {}).get("model_name", "unknown")
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.on_llm_start(serialized, [], **kwargs)
+
+    def on_llm_end(self, response, **kwargs):
+        if self._llm_start_time is None:
+            return
+        observe_stage("llm", time.perf_counter() - self._llm_start_time)
+        if self.first_token_time is not None:
+            observe_stage("llm_first_token", self.first_token_time - self._llm_start_time)
+        usage = (response.llm_output or {}).get("token_usage")
+        if usage:
+            record_token_usage(self._model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+            return
+        # Streamed responses report usage on the message instead
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    record_token_usage(self._model, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+
+    def on_llm_new_token(self, token, **kwargs):
+        if not token:
+            return
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+            if self.on_first_token:
+                self.on_first_token()
+        self.token_count += 1
+        if self.on_token:
+            self.on_token(token)
+
+    @property
+    def streamed(self):
+        return self.first_token_time is not None
+
+    @property
+    def time_to_first_token(self):
+        """
+        Seconds from the start of the query to the first token, or None if nothing streamed.
+        """
+        return self.first_token_time - self.start_time if self.streamed else None
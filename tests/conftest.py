@@ -0,0 +1,11 @@
+import os
+import shutil
+import tempfile
+
+# Keep the suite's logs out of the repository's app.log; set before config is imported
+_log_dir = tempfile.mkdtemp(prefix="rag_app_tests_")
+os.environ.setdefault("LOG_FILE", os.path.join(_log_dir, "app.log"))
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_log_dir, ignore_errors=True)
@@ -0,0 +1,15 @@
+"""
+Test doubles shared by several test modules.
+"""
+
+
+class WhitespaceEncoding:
+    """
+    Stand-in for a tiktoken encoding where every whitespace-separated word is one token.
+    """
+
+    def encode_ordinary_batch(self, texts):
+        return [text.split() for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
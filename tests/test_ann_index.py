@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from ann_index import IVFIndex, spherical_kmeans
+from vector_store import LocalVectorIndex
+from benchmarks.bench_ann import clustered_vectors
+
+
+class TestIVFIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "index")
+        data = clustered_vectors(2050, 16, clusters=20)
+        self.vectors, self.queries = data[:2000], data[2000:]
+        self.index = self._build(self.path, self.vectors)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _build(self, path, vectors, start=0):
+        index = LocalVectorIndex(path, dimension=16, index_type="ivf", nlist=16, nprobe=4)
+        self._upsert(index, vectors, start)
+        return index
+
+    def _upsert(self, index, vectors, start=0):
+        index.upsert([(f"v{start + i}", row, {"n": start + i}) for i, row in enumerate(vectors)])
+
+    def _ids(self, index, query, **kwargs):
+        return [match["id"] for match in index.query(vector=query, top_k=10, **kwargs).matches]
+
+    def test_spherical_kmeans_returns_normalised_centroids(self):
+        centroids = spherical_kmeans(self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True), 8)
+
+        self.assertEqual(centroids.shape, (8, 16))
+        np.testing.assert_allclose(np.linalg.norm(centroids, axis=1), 1.0, rtol=1e-5)
+
+    def test_index_trains_once_large_enough(self):
+        small = LocalVectorIndex(os.path.join(self.tmp_dir.name, "small"), 16, index_type="ivf", nlist=16)
+        self._upsert(small, self.vectors[:100])
+        self.assertFalse(small.ann.trained)
+
+        self.assertTrue(self.index.ann.trained)
+
+    def test_probing_every_list_matches_exact_search(self):
+        flat = LocalVectorIndex(os.path.join(self.tmp_dir.name, "flat"), dimension=16)
+        self._upsert(flat, self.vectors)
+
+        for query in self.queries:
+            self.assertEqual(self._ids(self.index, query, nprobe=16), self._ids(flat, query))
+
+    def test_recall_at_default_nprobe(self):
+        flat = LocalVectorIndex(os.path.join(self.tmp_dir.name, "flat"), dimension=16)
+        self._upsert(flat, self.vectors)
+
+        recall = np.mean([
+            len(set(self._ids(self.index, query)) & set(self._ids(flat, query))) / 10 for query in self.queries
+        ])
+        self.assertGreater(recall, 0.9)
+
+    def test_vectors_added_after_training_are_found(self):
+        self._upsert(self.index, self.queries[:1], start=5000)
+
+        self.assertEqual(self._ids(self.index, self.queries[0])[0], "v5000")
+
+    def test_delete_keeps_lists_consistent(self):
+        self.index.delete(ids=[f"v{i}" for i in range(0, 2000, 2)])
+
+        ids = self._ids(self.index, self.vectors[1], nprobe=16)
+        self.assertEqual(ids[0], "v1")
+        self.assertTrue(all(int(vector_id[1:]) % 2 for vector_id in ids))
+        candidates = self.index.ann.candidates(self.vectors[1], self.index._count, nprobe=16)
+        self.assertEqual(sorted(candidates), list(range(1000)))
+
+    def test_save_and_reload(self):
+        self.index.save()
+        self.assertTrue(os.path.exists(os.path.join(self.path, "ivf.1.npz")))
+
+        reopened = LocalVectorIndex(self.path, dimension=16, index_type="ivf", nlist=16, nprobe=4)
+
+        np.testing.assert_array_equal(reopened.ann.centroids, self.index.ann.centroids)
+        for query in self.queries[:5]:
+            self.assertEqual(self._ids(reopened, query), self._ids(self.index, query))
+
+    def test_load_rejects_mismatched_index(self):
+        self.index.save()
+        ivf = IVFIndex(nlist=16)
+
+        self.assertFalse(ivf.load(os.path.join(self.path, "ivf.1.npz"), count=1999))
+        self.assertFalse(ivf.trained)
+
+    def test_unknown_index_type(self):
+        with self.assertRaises(ValueError):
+            LocalVectorIndex(self.path, dimension=16, index_type="hnsw")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,7 @@
+import time
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, ANY
+import api_handler
 from api_handler import create_rag_agent, generate_response_rag
 from langchain.chains import RetrievalQA, LLMChain
 
@@ -10,12 +12,13 @@ MOCK_QUERY = "What is the capital of France?"
 MOCK_RESPONSE = "Paris is the capital of France."
 
 
+@patch("api_handler.ContextualCompressionRetriever")
 @patch("api_handler.Pinecone")
 @patch("api_handler.RetrievalQA")
-@patch("api_handler.ConversationBufferMemory")
+@patch("api_handler.WindowMemory")
 @patch("api_handler.ChatOpenAI")
 def test_create_rag_agent_with_retrieval(
-    mock_chatopenai, mock_memory, mock_retrievalqa, mock_pinecone
+    mock_chatopenai, mock_memory, mock_retrievalqa, mock_pinecone, mock_compression
 ):
     """Test successful creation of a RAG agent with retrieval."""
     mock_chatopenai.return_value = MagicMock()
@@ -30,12 +33,37 @@ def test_create_rag_agent_with_retrieval(
         text_key="text"
     )
     mock_retrievalqa.from_chain_type.assert_called_once()
-    mock_memory.assert_not_called()  # Ensure ConversationBufferMemory is not used in retrieval mode
+    # Retrieved chunks are packed into the context token budget before reaching the chain
+    assert mock_compression.call_args.kwargs["base_retriever"] == mock_pinecone.return_value.as_retriever.return_value
+    assert mock_retrievalqa.from_chain_type.call_args.kwargs["retriever"] == mock_compression.return_value
+    # The retrieval chain keeps bounded memory, and its prompt reads the same window
+    chain_kwargs = mock_retrievalqa.from_chain_type.call_args.kwargs
+    assert chain_kwargs["memory"] == mock_memory.return_value
+    assert mock_memory.call_args.kwargs["input_key"] == "query"
+    assert mock_memory.call_args.kwargs["output_key"] == "result"
+    prompt = chain_kwargs["chain_type_kwargs"]["prompt"]
+    assert set(prompt.input_variables) == {"context", "question"}
+    assert prompt.partial_variables["history"] == mock_memory.call_args.kwargs["window"].as_text
     assert result == mock_retrievalqa.from_chain_type.return_value
 
 
+@patch("api_handler.ContextualCompressionRetriever")
+@patch("api_handler.Pinecone")
+@patch("api_handler.RetrievalQA")
+@patch("api_handler.ChatOpenAI")
+def test_create_rag_agent_with_retrieval_without_memory(
+    mock_chatopenai, mock_retrievalqa, mock_pinecone, mock_compression
+):
+    """Test a memory token limit of 0 creates a stateless retrieval chain."""
+    create_rag_agent(MOCK_INDEX, MOCK_EMBEDDINGS, memory_token_limit=0)
+
+    chain_kwargs = mock_retrievalqa.from_chain_type.call_args.kwargs
+    assert "memory" not in chain_kwargs
+    assert "chain_type_kwargs" not in chain_kwargs
+
+
 @patch("api_handler.LLMChain")
-@patch("api_handler.ConversationBufferMemory")
+@patch("api_handler.WindowMemory")
 @patch("api_handler.ChatOpenAI")
 def test_create_rag_agent_without_retrieval(
     mock_chatopenai, mock_memory, mock_llmchain
@@ -48,7 +76,8 @@ def test_create_rag_agent_without_retrieval(
     result = create_rag_agent(None, MOCK_EMBEDDINGS)
 
     # Assertions
-    mock_memory.assert_called_once_with(memory_key="history", return_messages=True)
+    mock_memory.assert_called_once_with(window=ANY, memory_key="history")
+    assert mock_memory.call_args.kwargs["window"].max_tokens == api_handler.MEMORY_TOKEN_LIMIT
     mock_llmchain.assert_called_once()
     assert result == mock_llmchain.return_value
 
@@ -99,4 +128,55 @@ def test_generate_response_rag_failure(mock_retrievalqa):
     result = generate_response_rag(mock_chain, MOCK_QUERY)
 
     # Assertions
-    assert result == "I'm sorry, something went wrong. Please try again later."
\ No newline at end of file
+    assert result["answer"] == "I'm sorry, something went wrong. Please try again later."
+    assert result["sources"] == []
+
+
+@patch("time.sleep", side_effect=AssertionError("time.sleep called on the query path"))
+def test_generate_response_rag_adds_no_fixed_delay(mock_sleep):
+    """Test a query returns as soon as the chain does, with no artificial waits."""
+    mock_chain = MagicMock(spec=LLMChain)
+    mock_chain.invoke.return_value = {"input": MOCK_QUERY, "text": MOCK_RESPONSE}
+
+    start = time.perf_counter()
+    result = generate_response_rag(mock_chain, MOCK_QUERY)
+
+    assert result["answer"] == MOCK_RESPONSE
+    assert time.perf_counter() - start < 0.5
+    mock_sleep.assert_not_called()
+
+
+def test_generate_response_rag_streams_tokens_and_returns_sources():
+    """Test tokens reach on_token as the LLM emits them and sources are returned with the answer."""
+    mock_chain = MagicMock(spec=RetrievalQA)
+
+    def invoke(inputs, config):
+        handler = config["callbacks"][0]
+        for token in ["Paris ", "is ", "the ", "capital."]:
+            handler.on_llm_new_token(token)
+        documents = [MagicMock(metadata={"source": "a.txt"}), MagicMock(metadata={"source": "a.txt"}),
+                     MagicMock(metadata={"source": "b.txt"})]
+        return {"query": inputs["query"], "result": "Paris is the capital.", "source_documents": documents}
+
+    mock_chain.invoke.side_effect = invoke
+    tokens = []
+
+    result = generate_response_rag(mock_chain, MOCK_QUERY, on_token=tokens.append)
+
+    assert tokens == ["Paris ", "is ", "the ", "capital."]
+    assert result["answer"] == "Paris is the capital."
+    assert result["sources"] == ["a.txt", "b.txt"]
+    assert result["streamed"] is True
+    assert 0 <= result["time_to_first_token"] <= result["latency"]
+
+
+def test_generate_response_rag_without_streaming():
+    """Test a non-streaming chain reports no time to first token."""
+    mock_chain = MagicMock(spec=LLMChain)
+    mock_chain.invoke.return_value = {"input": MOCK_QUERY, "text": MOCK_RESPONSE}
+
+    result = generate_response_rag(mock_chain, MOCK_QUERY)
+
+    assert result["streamed"] is False
+    assert result["time_to_first_token"] is None
+    assert result["latency"] >= 0
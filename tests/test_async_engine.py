@@ -0,0 +1,156 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from langchain_core.messages import AIMessage, HumanMessage
+from async_engine import AsyncQueryEngine, create_query_engine, TIMEOUT_RESPONSE
+from benchmarks.load_test import build_index, run_load
+from benchmarks.stubs import StubChatModel, StubEmbeddings
+from tests.helpers import WhitespaceEncoding
+
+
+class TestAsyncQueryEngine(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = patch("tokenizer.get_encoding", return_value=WhitespaceEncoding())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.embeddings = StubEmbeddings(dimension=16)
+        self.index = build_index(os.path.join(self.tmp_dir.name, "index"), self.embeddings, 200)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def test_query_streams_answer_and_returns_sources(self):
+        llm = StubChatModel(answer="Paris is the capital.")
+        engine = AsyncQueryEngine(self.index, self.embeddings, llm, top_k=3)
+        tokens = []
+
+        result = await engine.query("s1", "Document chunk 7 about topic 7.", on_token=tokens.append)
+
+        self.assertIsNone(result["error"])
+        self.assertEqual(result["answer"], "Paris is the capital. ")
+        self.assertEqual("".join(tokens), result["answer"])
+        self.assertIn("doc7.txt", result["sources"])
+        self.assertIn("Document chunk 7 about topic 7.", llm.calls[0][0].content)
+        self.assertTrue(result["streamed"])
+        self.assertLessEqual(result["time_to_first_token"], result["latency"])
+
+    async def test_sessions_keep_separate_history(self):
+        llm = StubChatModel(answer="Noted.")
+        engine = AsyncQueryEngine(None, self.embeddings, llm)
+
+        await engine.query("alice", "My name is Alice.")
+        await engine.query("bob", "My name is Bob.")
+        await engine.query("alice", "What is my name?")
+
+        history = llm.calls[2][1:-1]
+        self.assertEqual(history, [HumanMessage(content="My name is Alice."), AIMessage(content="Noted. ")])
+        self.assertEqual(len(engine.get_history("bob")), 2)
+        engine.end_session("bob")
+        self.assertNotIn("bob", engine.sessions)
+
+    async def test_least_recently_used_sessions_are_evicted(self):
+        engine = AsyncQueryEngine(None, self.embeddings, StubChatModel(answer="Noted."), max_sessions=2)
+
+        await engine.query("alice", "Hello.")
+        await engine.query("bob", "Hello.")
+        await engine.query("alice", "Hello again.")
+        await engine.query("carol", "Hello.")
+
+        self.assertEqual(list(engine.sessions), ["alice", "carol"])
+        self.assertEqual(len(engine.get_history("alice")), 4)
+
+    async def test_idle_sessions_are_evicted(self):
+        engine = AsyncQueryEngine(None, self.embeddings, StubChatModel(answer="Noted."), session_idle_seconds=60)
+
+        with patch("async_engine.time.monotonic", return_value=1000.0):
+            await engine.query("alice", "Hello.")
+        with patch("async_engine.time.monotonic", return_value=1030.0):
+            await engine.query("bob", "Hello.")
+        with patch("async_engine.time.monotonic", return_value=1070.0):
+            await engine.query("carol", "Hello.")
+
+        self.assertEqual(list(engine.sessions), ["bob", "carol"])
+
+    async def test_long_sessions_send_bounded_history(self):
+        llm = StubChatModel(answer="Noted.")
+        engine = AsyncQueryEngine(None, self.embeddings, llm, memory_token_limit=20)
+
+        for i in range(30):
+            await engine.query("s1", f"Remember fact number {i}.")
+
+        # Old turns are summarized by the same model instead of being re-sent verbatim
+        last_prompt = llm.calls[-1]
+        self.assertLess(len(last_prompt), 10)
+        self.assertTrue(last_prompt[1].content.startswith("Summary of the earlier conversation:"))
+
+    async def test_slow_summaries_do_not_time_out_answers(self):
+        engine = AsyncQueryEngine(None, self.embeddings, StubChatModel(answer="Noted."), max_concurrency=1,
+                                  timeout=0.2, memory_token_limit=3)
+
+        async def slow_summary(memory, evicted):
+            await asyncio.sleep(0.5)
+
+        with patch("memory.ConversationWindow.asummarize", slow_summary):
+            start = time.perf_counter()
+            results = await asyncio.gather(engine.query("s1", "Remember this fact."), engine.query("s2", "Hello."))
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual([result["error"] for result in results], [None, None])
+        self.assertEqual(results[0]["answer"], "Noted. ")
+        # Neither summary held the single concurrency slot while it ran
+        self.assertLess(elapsed, 0.4)
+        self.assertIn("s1", engine._summaries)
+
+    async def test_concurrent_queries_overlap_up_to_the_limit(self):
+        llm = StubChatModel(first_token_latency=0.1)
+        engine = AsyncQueryEngine(self.index, self.embeddings, llm, max_concurrency=4)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(engine.query(f"s{i}", "Hello?") for i in range(8)))
+        elapsed = time.perf_counter() - start
+
+        self.assertTrue(all(result["error"] is None for result in results))
+        self.assertEqual(llm.max_in_flight, 4)
+        # Two waves of 0.1s, not eight sequential calls
+        self.assertLess(elapsed, 0.6)
+
+    async def test_query_times_out(self):
+        llm = StubChatModel(first_token_latency=5)
+        engine = AsyncQueryEngine(self.index, self.embeddings, llm, timeout=0.05)
+
+        result = await engine.query("s1", "Hello?")
+
+        self.assertEqual(result["error"], "timeout")
+        self.assertEqual(result["answer"], TIMEOUT_RESPONSE)
+        self.assertEqual(engine.get_history("s1"), [])
+
+    async def test_invalid_query(self):
+        engine = AsyncQueryEngine(self.index, self.embeddings, StubChatModel())
+
+        with self.assertRaises(ValueError):
+            await engine.query("s1", " ")
+
+    async def test_load_harness(self):
+        engine = AsyncQueryEngine(self.index, self.embeddings, StubChatModel(token_latency=0.001), max_concurrency=8)
+
+        results = await run_load(engine, sessions=20, queries=2)
+
+        self.assertEqual(results["queries"], 40)
+        self.assertEqual(results["timeouts"] + results["errors"], 0)
+        self.assertLessEqual(results["peak_llm_concurrency"], 8)
+
+    @patch("langchain_openai.ChatOpenAI")
+    def test_create_query_engine(self, mock_chatopenai):
+        engine = create_query_engine(self.index, self.embeddings, model="gpt-4", max_concurrency=2)
+
+        self.assertIs(engine.llm, mock_chatopenai.return_value)
+        self.assertTrue(mock_chatopenai.call_args.kwargs["streaming"])
+
+
+if __name__ == "__main__":
+    unittest.main()
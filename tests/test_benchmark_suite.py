@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from benchmarks.corpus import generate_corpus
+from benchmarks.suite import SCENARIOS, compare, run_suite
+from file_handler import read_file
+from tests.helpers import WhitespaceEncoding
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch("tokenizer.get_encoding", return_value=WhitespaceEncoding())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_corpus_is_deterministic_and_readable(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            paths = generate_corpus(first, files=3, paragraphs=2, seed=7)
+            generate_corpus(second, files=3, paragraphs=2, seed=7)
+
+            self.assertEqual([os.path.splitext(path)[1] for path in paths], [".txt", ".docx", ".pdf"])
+            for path in paths:
+                text = read_file(path)
+                self.assertGreater(len(text.split()), 20)
+                self.assertEqual(text, read_file(os.path.join(second, os.path.basename(path))))
+
+    def test_run_suite_reports_every_scenario(self):
+        results = run_suite(files=3, paragraphs=2, repeats=1, queries=3, llm_latency=0.001)
+
+        self.assertEqual(list(results["scenarios"]), list(SCENARIOS))
+        self.assertEqual(results["meta"]["params"]["files"], 3)
+        for scenario in results["scenarios"].values():
+            self.assertGreater(scenario["runs"], 0)
+            self.assertLessEqual(scenario["p50_s"], scenario["max_s"])
+        generate = results["scenarios"]["generate_response_rag"]
+        self.assertGreaterEqual(generate["time_to_first_token_p50_s"], 0.001)
+        self.assertIn("llm", generate["stages"])
+        self.assertIn("embed_documents", results["scenarios"]["add_chunks_to_pinecone"]["stages"])
+
+    def test_compare_flags_regressions(self):
+        baseline = {"scenarios": {"chunk_text": {"p50_s": 0.010}, "retrieve_chunks": {"p50_s": 0.010}}}
+        results = {"scenarios": {"chunk_text": {"p50_s": 0.011}, "retrieve_chunks": {"p50_s": 0.015},
+                                 "process_files": {"p50_s": 1.0}}}
+
+        rows = {row["scenario"]: row for row in compare(results, baseline, max_regression=1.2)}
+
+        self.assertEqual(set(rows), {"chunk_text", "retrieve_chunks"})
+        self.assertFalse(rows["chunk_text"]["regression"])
+        self.assertTrue(rows["retrieve_chunks"]["regression"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from bm25 import BM25Index, tokenize
+from retrieval import hybrid_search, reciprocal_rank_fusion
+from db_connector import (
+    add_chunks_to_pinecone, delete_chunks_from_pinecone, make_chunk_id, backfill_lexical_index, check_lexical_coverage
+)
+from vector_store import LocalVectorIndex
+
+DOCUMENTS = {
+    "pump": "The XR-2000 pump needs a new seal every year.",
+    "valve": "Replace the valve gasket when the pressure drops.",
+    "manual": "This manual covers pumps, valves and seals.",
+}
+
+
+class TestBM25Index(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "bm25")
+        self.index = BM25Index(self.path)
+        self.index.add(list(DOCUMENTS), list(DOCUMENTS.values()), [{"source": f"{key}.txt"} for key in DOCUMENTS])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _ids(self, query, index=None):
+        return [match["id"] for match in (index or self.index).search(query, top_k=3)]
+
+    def test_tokenize_keeps_identifiers_whole_and_split(self):
+        self.assertEqual(tokenize("Order XR-2000 now"), ["order", "xr-2000", "xr", "2000", "now"])
+
+    def test_search_finds_exact_identifiers(self):
+        matches = self.index.search("xr-2000", top_k=3)
+
+        self.assertEqual([match["id"] for match in matches], ["pump"])
+        self.assertEqual(matches[0]["metadata"], {"source": "pump.txt", "text": DOCUMENTS["pump"]})
+        self.assertEqual(self._ids("2000"), ["pump"])
+
+    def test_rarer_terms_score_higher(self):
+        self.assertEqual(self._ids("seal gasket")[0], "valve")
+        self.assertEqual(self._ids("unknown words"), [])
+
+    def test_delete_and_replace(self):
+        self.index.delete(["pump"])
+        self.assertEqual(self._ids("xr-2000"), [])
+
+        self.index.add(["valve"], ["The XR-2000 valve."])
+        self.assertEqual(self._ids("xr-2000"), ["valve"])
+        self.assertEqual(self._ids("gasket"), [])
+        self.assertEqual(len(self.index), 2)
+
+    def test_save_and_reload_compacts_deleted_documents(self):
+        self.index.delete(["valve"])
+        self.index.save()
+
+        reopened = BM25Index(self.path)
+
+        self.assertEqual(len(reopened), 2)
+        self.assertEqual(self._ids("xr-2000", reopened), ["pump"])
+        self.assertEqual(self._ids("manual pumps", reopened), ["manual"])
+        reopened.add(["new"], ["A gasket kit for the XR-2000."])
+        self.assertEqual(sorted(self._ids("xr-2000", reopened)), ["new", "pump"])
+
+
+    def test_interrupted_save_keeps_the_previous_save(self):
+        self.index.save()
+        self.index.delete(["valve"])
+
+        # Interrupted after writing the files of the next save, before switching to them
+        with patch("bm25.commit_generation", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.index.save()
+
+        reopened = BM25Index(self.path)
+        self.assertEqual(len(reopened), 3)
+        self.assertIn("valve", self._ids("seal gasket", reopened))
+        self.index.save()
+        self.assertEqual(len(BM25Index(self.path)), 2)
+        self.assertEqual(sorted(os.listdir(self.path)), ["CURRENT", "documents.2.json", "postings.2.npz"])
+
+    def test_mismatched_files_are_not_loaded(self):
+        self.index.save()
+        other = BM25Index(os.path.join(self.tmp_dir.name, "other"))
+        other.add(["solo"], ["A single document."])
+        other.save()
+        os.replace(os.path.join(self.tmp_dir.name, "other", "postings.1.npz"),
+                   os.path.join(self.path, "postings.1.npz"))
+
+        self.assertEqual(len(BM25Index(self.path)), 0)
+
+
+class TestHybridSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.vectors = LocalVectorIndex(os.path.join(self.tmp_dir.name, "vectors"), dimension=2)
+        self.lexical = BM25Index(os.path.join(self.tmp_dir.name, "bm25"))
+        self.embeddings = MagicMock()
+        # Dense search ranks the manual first for every query and the pump last
+        vectors = {"pump": [0.0, 1.0], "valve": [0.6, 0.8], "manual": [1.0, 0.0]}
+        self.embeddings.embed_documents.side_effect = lambda texts: [
+            vectors[next(key for key, text in DOCUMENTS.items() if text == t)] for t in texts
+        ]
+        self.embeddings.embed_query.return_value = [1.0, 0.1]
+        add_chunks_to_pinecone(
+            self.vectors, [(f"{key}.txt", text) for key, text in DOCUMENTS.items()], self.embeddings,
+            lexical_index=self.lexical
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+
+        self.assertEqual([item for item, _ in fused], ["a", "c", "b"])
+        self.assertAlmostEqual(fused[0][1], 1 / 61 + 1 / 62)
+
+    def test_ingestion_feeds_the_lexical_index(self):
+        self.assertEqual(len(self.lexical), 3)
+        match = self.lexical.search("xr-2000")[0]
+        self.assertEqual(match["id"], make_chunk_id("pump.txt", DOCUMENTS["pump"]))
+        self.assertEqual(match["metadata"]["source"], "pump.txt")
+
+    def test_hybrid_search_surfaces_exact_matches_dense_search_misses(self):
+        query_vector = self.embeddings.embed_query("XR-2000 seal")
+
+        dense_only = hybrid_search(self.vectors, "XR-2000 seal", query_vector, top_k=1)
+        hybrid = hybrid_search(self.vectors, "XR-2000 seal", query_vector, self.lexical, top_k=2)
+
+        self.assertEqual(dense_only[0]["metadata"]["source"], "manual.txt")
+        self.assertIn("pump.txt", [match["metadata"]["source"] for match in hybrid])
+        self.assertEqual(hybrid[0]["metadata"]["text"], DOCUMENTS["pump"])
+
+    def test_deleting_chunks_removes_them_from_the_lexical_index(self):
+        delete_chunks_from_pinecone(
+            self.vectors, [make_chunk_id("pump.txt", DOCUMENTS["pump"])], lexical_index=self.lexical
+        )
+
+        self.assertEqual(self.lexical.search("xr-2000"), [])
+
+
+class TestLexicalBackfill(unittest.TestCase):
+    """
+    Chunks stored before hybrid search was enabled, or before the BM25 index was lost.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.lexical = BM25Index(os.path.join(self.tmp_dir.name, "bm25"))
+        self.records = [(f"{key}.txt", text, {"chunk_index": 0}) for key, text in DOCUMENTS.items()]
+        self.stored_ids = {make_chunk_id(source, text) for source, text, _ in self.records}
+
+    def test_incomplete_lexical_index_is_left_out_of_hybrid_search(self):
+        pump = self.records[0]
+        self.lexical.add([make_chunk_id(pump[0], pump[1])], [pump[1]])
+        vectors = MagicMock()
+        vectors.query.return_value = {"matches": [{"id": "manual", "score": 0.9, "metadata": {"text": "manual"}}]}
+
+        self.assertEqual(check_lexical_coverage(self.lexical, self.stored_ids), 2)
+        matches = hybrid_search(vectors, "XR-2000", [1.0, 0.0], self.lexical, top_k=2)
+
+        self.assertEqual([match["id"] for match in matches], ["manual"])
+
+    def test_backfill_adds_stored_chunks_without_embedding_them(self):
+        check_lexical_coverage(self.lexical, self.stored_ids)
+
+        passed = list(backfill_lexical_index(iter(self.records), self.lexical, self.stored_ids, batch_size=2))
+
+        self.assertEqual(passed, self.records)
+        self.assertEqual(check_lexical_coverage(self.lexical, self.stored_ids), 0)
+        self.assertTrue(self.lexical.searchable)
+        match = self.lexical.search("xr-2000")[0]
+        self.assertEqual(match["metadata"], {"chunk_index": 0, "source": "pump.txt", "text": DOCUMENTS["pump"]})
+
+    def test_reingesting_an_unchanged_directory_rebuilds_the_lexical_index(self):
+        import main
+        manifest = {"sources": {source: [make_chunk_id(source, text)] for source, text, _ in self.records}}
+        embeddings = MagicMock()
+        check_lexical_coverage(self.lexical, self.stored_ids)
+
+        with patch("main.iter_chunks", return_value=iter(self.records)), \
+             patch("main.load_manifest", return_value=manifest), \
+             patch("main.save_manifest"), \
+             patch("main.CHECKPOINT_PATH", ""), \
+             patch("main.get_lexical_index", return_value=self.lexical):
+            result = main.ingest_directory(MagicMock(), embeddings, ".")
+
+        self.assertEqual(result["added"], 0)
+        embeddings.embed_documents.assert_not_called()
+        self.assertEqual(len(self.lexical), 3)
+        self.assertTrue(self.lexical.searchable)
+
+
+if __name__ == "__main__":
+    unittest.main()
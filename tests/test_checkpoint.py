@@ -0,0 +1,173 @@
+import functools
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import main
+from checkpoint import IngestJournal
+from db_connector import add_chunks_to_pinecone, make_chunk_id
+
+
+def vector(source, text):
+    return {"id": make_chunk_id(source, text), "values": [0.1], "metadata": {"text": text, "source": source}}
+
+
+class TestIngestJournal(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = tmp_dir.name
+        self.path = os.path.join(self.directory, "checkpoint.jsonl")
+        self.source_a = os.path.join(self.directory, "a.txt")
+        self.source_b = os.path.join(self.directory, "b.txt")
+        for source in (self.source_a, self.source_b):
+            with open(source, "w", encoding="utf-8") as f:
+                f.write("text")
+
+    def test_committed_batches_survive_a_restart(self):
+        journal = IngestJournal(self.path, interval=0)
+        journal.add_batch([vector(self.source_a, "a1"), vector(self.source_a, "a2")])
+        journal.commit()
+        journal.add_batch([vector(self.source_a, "a3")])  # Never committed
+
+        reloaded = IngestJournal(self.path)
+
+        self.assertEqual(reloaded.upserted_ids(self.directory),
+                         {make_chunk_id(self.source_a, "a1"), make_chunk_id(self.source_a, "a2")})
+
+    def test_a_file_is_complete_once_all_its_chunks_are_stored(self):
+        journal = IngestJournal(self.path, interval=0)
+        sources = {self.source_a: [make_chunk_id(self.source_a, "a1")]}
+        journal.track(sources, set())
+        journal.add_batch([vector(self.source_a, "a1")])
+        journal.commit()
+        # The last file seen may still have unread chunks
+        self.assertEqual(IngestJournal(self.path).completed_files(self.directory), {})
+
+        sources[self.source_b] = [make_chunk_id(self.source_b, "b1")]
+        journal.commit()
+
+        self.assertEqual(IngestJournal(self.path).completed_files(self.directory),
+                         {self.source_a: [make_chunk_id(self.source_a, "a1")]})
+
+    def test_files_that_failed_partway_are_not_complete(self):
+        journal = IngestJournal(self.path, interval=0)
+        sources = {self.source_a: [make_chunk_id(self.source_a, "a1")]}
+        failed = set()
+        journal.track(sources, set(), failed)
+        journal.add_batch([vector(self.source_a, "a1")])
+        failed.add(self.source_a)
+        sources[self.source_b] = [make_chunk_id(self.source_b, "b1")]
+        journal.commit(final=True)
+
+        self.assertEqual(IngestJournal(self.path).completed_files(self.directory), {})
+
+    def test_changed_files_are_not_complete(self):
+        journal = IngestJournal(self.path, interval=0)
+        journal.track({self.source_a: [make_chunk_id(self.source_a, "a1")]}, set())
+        journal.add_batch([vector(self.source_a, "a1")])
+        journal.commit(final=True)
+
+        with open(self.source_a, "a", encoding="utf-8") as f:
+            f.write(" more text")
+
+        self.assertEqual(IngestJournal(self.path).completed_files(self.directory), {})
+
+    @patch("checkpoint.time.monotonic")
+    def test_slow_checkpoints_are_spaced_out(self, mock_time):
+        mock_time.return_value = 100.0
+        journal = IngestJournal(self.path, interval=1)
+        self.assertFalse(journal.due())
+        mock_time.return_value = 101.0
+        self.assertTrue(journal.due())
+
+        # Persisting the indexes took 2s, so the next checkpoint waits until 20s have passed
+        journal.commit(started=99.0)
+        mock_time.return_value = 111.0
+        self.assertFalse(journal.due())
+        mock_time.return_value = 121.0
+        self.assertTrue(journal.due())
+
+    def test_torn_last_line_is_ignored(self):
+        journal = IngestJournal(self.path, interval=0)
+        journal.add_batch([vector(self.source_a, "a1")])
+        journal.commit()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"batch": {"')
+
+        self.assertEqual(IngestJournal(self.path).upserted_ids(self.directory), {make_chunk_id(self.source_a, "a1")})
+
+    def test_clear_keeps_other_directories(self):
+        other = os.path.join(os.path.dirname(self.directory), "elsewhere", "c.txt")
+        journal = IngestJournal(self.path, interval=0)
+        journal.add_batch([vector(self.source_a, "a1"), vector(other, "c1")])
+        journal.commit()
+
+        journal.clear(self.directory)
+        self.assertEqual(IngestJournal(self.path).upserted, {other: {make_chunk_id(other, "c1")}})
+
+        journal.clear(os.path.dirname(other))
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TestResumableIngestion(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = tmp_dir.name
+        self.files = {}
+        for name in ("a", "b"):
+            path = os.path.join(self.directory, f"{name}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(name)
+            self.files[path] = [f"{name}{i}" for i in range(1, 4)]
+        self.read_files = []
+
+    def iter_chunks(self, directory, exclude=(), failed=None):
+        for path, chunks in self.files.items():
+            if path in exclude:
+                continue
+            self.read_files.append(path)
+            for i, chunk in enumerate(chunks):
+                yield path, chunk, {"chunk_index": i}
+
+    def ingest(self, embeddings):
+        manifest = {"sources": {}}
+        with patch("main.iter_chunks", side_effect=self.iter_chunks), \
+             patch("main.load_manifest", return_value=manifest), \
+             patch("main.save_manifest"), \
+             patch("main.get_lexical_index", return_value=None), \
+             patch("main.IngestJournal",
+                   side_effect=lambda: IngestJournal(os.path.join(self.directory, "checkpoint.jsonl"), interval=0)), \
+             patch("main.add_chunks_to_pinecone",
+                   functools.partial(add_chunks_to_pinecone, batch_size=1, max_in_flight=1, max_retries=1)):
+            return main.ingest_directory(MagicMock(), embeddings, self.directory)
+
+    def test_interrupted_run_resumes_from_the_checkpoint(self):
+        def embed(texts):
+            if texts == ["b2"]:
+                raise ConnectionError("Connection reset")
+            return [[0.1] for _ in texts]
+
+        embeddings = MagicMock()
+        embeddings.embed_documents.side_effect = embed
+        with self.assertRaises(ConnectionError):
+            self.ingest(embeddings)
+
+        self.read_files.clear()
+        embeddings.embed_documents.reset_mock(side_effect=True)
+        embeddings.embed_documents.side_effect = lambda texts: [[0.1] for _ in texts]
+        result = self.ingest(embeddings)
+
+        # a.txt was completed before the crash and b1 upserted; only b2 and b3 are embedded again
+        a_path, b_path = self.files
+        self.assertEqual(self.read_files, [b_path])
+        self.assertEqual([call.args[0] for call in embeddings.embed_documents.call_args_list], [["b2"], ["b3"]])
+        self.assertEqual(result, {"files": 2, "added": 2, "removed": 0, "resumed": 1, "failed": 0})
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "checkpoint.jsonl")))
+
+
+if __name__ == "__main__":
+    unittest.main()
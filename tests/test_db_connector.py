@@ -1,9 +1,18 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
-from db_connector import initialize_pinecone, get_embeddings, add_chunks_to_pinecone, retrieve_chunks
+from clients import RateLimitedEmbeddings, TimedEmbeddings
+from embedding_cache import CachedEmbeddings
+from db_connector import (
+    initialize_pinecone, get_embeddings, get_pinecone_client, add_chunks_to_pinecone,
+    delete_chunks_from_pinecone, retrieve_chunks, make_chunk_id
+)
 
 class TestDBConnector(unittest.TestCase):
 
+    @patch('db_connector._pinecone_client', None)
+    @patch('db_connector.PINECONE_API_KEY', 'test-api-key')
     @patch('db_connector.Pinecone.Index')
     @patch('db_connector.Pinecone.create_index')
     @patch('db_connector.Pinecone.list_indexes')
@@ -26,6 +35,16 @@ class TestDBConnector(unittest.TestCase):
         # mock_index.assert_called_once_with(name='your_index_name')
         self.assertIsNotNone(index)
 
+    @patch('db_connector._pinecone_client', None)
+    @patch('db_connector.Pinecone')
+    def test_get_pinecone_client_is_created_once(self, mock_pinecone):
+        first = get_pinecone_client()
+        second = get_pinecone_client()
+
+        mock_pinecone.assert_called_once()
+        self.assertIs(first, second)
+
+    @patch('db_connector.EMBEDDING_CACHE_PATH', "")
     @patch('db_connector.OpenAIEmbeddings')
     def test_get_embeddings(self, mock_embeddings):
         # Mock OpenAIEmbeddings instance
@@ -37,7 +56,25 @@ class TestDBConnector(unittest.TestCase):
 
         # Assertions
         mock_embeddings.assert_called_once()
-        self.assertEqual(embeddings, mock_instance)
+        self.assertIsInstance(embeddings, TimedEmbeddings)
+        self.assertIsInstance(embeddings.embeddings, RateLimitedEmbeddings)
+        self.assertEqual(embeddings.embeddings.embeddings, mock_instance)
+
+    @patch('db_connector.OpenAIEmbeddings')
+    def test_get_embeddings_with_cache(self, mock_embeddings):
+        mock_embeddings.return_value.model = "text-embedding-ada-002"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with patch('db_connector.EMBEDDING_CACHE_PATH', os.path.join(tmp_dir, "cache.sqlite")):
+                embeddings = get_embeddings()
+
+            cached = embeddings.embeddings
+            self.assertIsInstance(cached, CachedEmbeddings)
+            # The cache sits outside the rate limiter, so cache hits are not rate limited
+            self.assertIsInstance(cached.embeddings, RateLimitedEmbeddings)
+            self.assertEqual(cached.embeddings.embeddings, mock_embeddings.return_value)
+            self.assertEqual(embeddings.model_name, "text-embedding-ada-002")
+            embeddings.close()
 
     @patch('db_connector.Pinecone.Index')
     @patch('db_connector.OpenAIEmbeddings')
@@ -58,10 +95,109 @@ class TestDBConnector(unittest.TestCase):
         # Assertions
         mock_embeddings_instance.embed_documents.assert_called_once_with(chunks)
         mock_index_instance.upsert.assert_called_once_with([
-            {"id": "chunk-0", "values": [0.1, 0.2, 0.3], "metadata": {"text": "Chunk 1"}},
-            {"id": "chunk-1", "values": [0.4, 0.5, 0.6], "metadata": {"text": "Chunk 2"}}
+            {"id": make_chunk_id(None, "Chunk 1"), "values": [0.1, 0.2, 0.3], "metadata": {"text": "Chunk 1"}},
+            {"id": make_chunk_id(None, "Chunk 2"), "values": [0.4, 0.5, 0.6], "metadata": {"text": "Chunk 2"}}
         ])
 
+    def test_add_chunks_to_pinecone_with_sources(self):
+        mock_embeddings_instance = MagicMock()
+        mock_embeddings_instance.embed_documents.return_value = [[0.1, 0.2, 0.3]]
+        mock_index_instance = MagicMock()
+
+        add_chunks_to_pinecone(mock_index_instance, [("/docs/a.txt", "Chunk 1")], mock_embeddings_instance)
+
+        mock_embeddings_instance.embed_documents.assert_called_once_with(["Chunk 1"])
+        mock_index_instance.upsert.assert_called_once_with([
+            {
+                "id": make_chunk_id("/docs/a.txt", "Chunk 1"),
+                "values": [0.1, 0.2, 0.3],
+                "metadata": {"text": "Chunk 1", "source": "/docs/a.txt"}
+            }
+        ])
+
+    def test_add_chunks_to_pinecone_consumes_record_stream(self):
+        mock_embeddings_instance = MagicMock()
+        mock_embeddings_instance.embed_documents.side_effect = lambda batch: [[0.1] for _ in batch]
+        mock_index_instance = MagicMock()
+        records = (("/docs/a.txt", f"Chunk {i}", {"chunk_index": i}) for i in range(3))
+
+        added = add_chunks_to_pinecone(mock_index_instance, records, mock_embeddings_instance, batch_size=2)
+
+        self.assertEqual(added, 3)
+        last_vector = mock_index_instance.upsert.call_args_list[-1].args[0][0]
+        self.assertEqual(last_vector["metadata"], {"chunk_index": 2, "text": "Chunk 2", "source": "/docs/a.txt"})
+
+    def test_make_chunk_id_is_stable_and_content_addressed(self):
+        self.assertEqual(make_chunk_id("/docs/a.txt", "Chunk 1"), make_chunk_id("/docs/a.txt", "Chunk 1"))
+        self.assertNotEqual(make_chunk_id("/docs/a.txt", "Chunk 1"), make_chunk_id("/docs/a.txt", "Chunk 2"))
+        self.assertNotEqual(make_chunk_id("/docs/a.txt", "Chunk 1"), make_chunk_id("/docs/b.txt", "Chunk 1"))
+
+    def test_delete_chunks_from_pinecone(self):
+        mock_index_instance = MagicMock()
+
+        deleted = delete_chunks_from_pinecone(mock_index_instance, ["a", "b", "c"], batch_size=2)
+
+        self.assertEqual(deleted, 3)
+        mock_index_instance.delete.assert_any_call(ids=["a", "b"])
+        mock_index_instance.delete.assert_any_call(ids=["c"])
+
+    def test_add_chunks_to_pinecone_batches(self):
+        mock_embeddings_instance = MagicMock()
+        mock_embeddings_instance.embed_documents.side_effect = lambda batch: [[float(len(c))] for c in batch]
+        mock_index_instance = MagicMock()
+        mock_pbar = MagicMock()
+
+        chunks = ["a", "bb", "ccc", "dddd", "eeeee"]
+
+        added = add_chunks_to_pinecone(mock_index_instance, chunks, mock_embeddings_instance,
+                                       pbar=mock_pbar, batch_size=2, max_in_flight=1)
+
+        self.assertEqual(added, 5)
+        self.assertEqual(mock_embeddings_instance.embed_documents.call_count, 3)
+        self.assertEqual(mock_index_instance.upsert.call_count, 3)
+        upserted_ids = [v["id"] for call in mock_index_instance.upsert.call_args_list for v in call.args[0]]
+        self.assertEqual(upserted_ids, [make_chunk_id(None, chunk) for chunk in chunks])
+        self.assertEqual([call.args[0] for call in mock_pbar.update.call_args_list], [2, 2, 1])
+
+    @patch('db_connector.time.sleep')
+    def test_add_chunks_to_pinecone_retries_failed_batch(self, mock_sleep):
+        mock_embeddings_instance = MagicMock()
+        mock_embeddings_instance.embed_documents.side_effect = lambda batch: [[0.1] for _ in batch]
+        mock_index_instance = MagicMock()
+        mock_index_instance.upsert.side_effect = [None, Exception("Rate limited"), None]
+
+        added = add_chunks_to_pinecone(mock_index_instance, ["Chunk 1", "Chunk 2"], mock_embeddings_instance,
+                                       batch_size=1, max_in_flight=1)
+
+        self.assertEqual(added, 2)
+        self.assertEqual(mock_index_instance.upsert.call_count, 3)
+        # The retried call re-sends only the failed batch
+        self.assertEqual(mock_index_instance.upsert.call_args_list[1], mock_index_instance.upsert.call_args_list[2])
+        mock_sleep.assert_called_once()
+
+    @patch('db_connector.time.sleep')
+    def test_add_chunks_to_pinecone_gives_up_after_max_retries(self, mock_sleep):
+        mock_embeddings_instance = MagicMock()
+        mock_embeddings_instance.embed_documents.side_effect = Exception("Embedding service down")
+
+        with self.assertRaises(Exception):
+            add_chunks_to_pinecone(MagicMock(), ["Chunk 1"], mock_embeddings_instance, max_retries=3)
+
+        self.assertEqual(mock_embeddings_instance.embed_documents.call_count, 3)
+
+    @patch('db_connector.time.sleep')
+    def test_add_chunks_to_pinecone_retries_rate_limited_batch_beyond_max_retries(self, mock_sleep):
+        rate_limit_error = Exception("Too Many Requests")
+        rate_limit_error.status_code = 429
+        mock_embeddings_instance = MagicMock()
+        mock_embeddings_instance.embed_documents.side_effect = [rate_limit_error] * 4 + [[[0.1]]]
+
+        added = add_chunks_to_pinecone(MagicMock(), ["Chunk 1"], mock_embeddings_instance, max_retries=3)
+
+        self.assertEqual(added, 1)
+        self.assertEqual(mock_embeddings_instance.embed_documents.call_count, 5)
+        self.assertEqual(mock_sleep.call_count, 4)
+
     @patch('db_connector.Pinecone.Index')
     def test_retrieve_chunks(self, mock_index):
     # Mock embeddings and query results
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+from embedding_cache import CachedEmbeddings
+
+
+def fake_embed_documents(texts):
+    return [[float(len(text)), 0.5] for text in texts]
+
+
+class TestCachedEmbeddings(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "cache.sqlite")
+        self.inner = MagicMock()
+        self.inner.embed_documents.side_effect = fake_embed_documents
+        self.inner.embed_query.side_effect = lambda text: fake_embed_documents([text])[0]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_only_misses_reach_the_wrapped_embeddings(self):
+        cache = CachedEmbeddings(self.inner, "model-a", path=self.path)
+
+        first = cache.embed_documents(["alpha", "beta"])
+        second = cache.embed_documents(["beta", "gamma", "alpha"])
+
+        self.assertEqual(first, [[5.0, 0.5], [4.0, 0.5]])
+        self.assertEqual(second, [[4.0, 0.5], [5.0, 0.5], [5.0, 0.5]])
+        self.assertEqual(self.inner.embed_documents.call_args_list[1].args[0], ["gamma"])
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 3)
+        cache.close()
+
+    def test_duplicate_texts_in_one_batch_are_embedded_once(self):
+        cache = CachedEmbeddings(self.inner, "model-a", path=self.path)
+
+        cache.embed_documents(["same", "same"])
+
+        self.inner.embed_documents.assert_called_once_with(["same"])
+        cache.close()
+
+    def test_cache_persists_and_is_keyed_by_model(self):
+        cache = CachedEmbeddings(self.inner, "model-a", path=self.path)
+        cache.embed_query("What is RAG?")
+        cache.close()
+
+        reopened = CachedEmbeddings(self.inner, "model-a", path=self.path)
+        reopened.embed_query("What is RAG?")
+        self.assertEqual(self.inner.embed_query.call_count, 1)
+        self.assertEqual(reopened.hit_rate, 1.0)
+        reopened.close()
+
+        other_model = CachedEmbeddings(self.inner, "model-b", path=self.path)
+        other_model.embed_query("What is RAG?")
+        self.assertEqual(self.inner.embed_query.call_count, 2)
+        other_model.close()
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = CachedEmbeddings(self.inner, "model-a", path=self.path, max_entries=2)
+
+        cache.embed_documents(["one"])
+        cache.embed_documents(["two"])
+        cache.embed_documents(["one"])  # refresh "one"
+        cache.embed_documents(["three"])  # evicts "two"
+        self.inner.embed_documents.reset_mock()
+
+        cache.embed_documents(["one", "two", "three"])
+
+        self.inner.embed_documents.assert_called_once_with(["two"])
+        self.assertLessEqual(cache.stats()["entries"], 2)
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+class TestCachedEmbeddingsAsync(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.inner = MagicMock()
+        self.inner.aembed_documents = AsyncMock(side_effect=fake_embed_documents)
+        self.inner.aembed_query = AsyncMock(side_effect=lambda text: fake_embed_documents([text])[0])
+        self.cache = CachedEmbeddings(self.inner, "model-a", path=os.path.join(self.tmp_dir.name, "cache.sqlite"))
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    async def test_async_misses_use_the_wrapped_async_methods(self):
+        first = await self.cache.aembed_documents(["alpha", "beta"])
+        second = await self.cache.aembed_documents(["beta", "gamma"])
+        query = await self.cache.aembed_query("What is RAG?")
+        again = await self.cache.aembed_query("What is RAG?")
+
+        self.assertEqual(first, [[5.0, 0.5], [4.0, 0.5]])
+        self.assertEqual(second, [[4.0, 0.5], [5.0, 0.5]])
+        self.assertEqual(query, again)
+        self.assertEqual(self.inner.aembed_documents.await_args_list[1].args[0], ["gamma"])
+        self.inner.aembed_query.assert_awaited_once_with("What is RAG?")
+        self.inner.embed_documents.assert_not_called()
+        self.inner.embed_query.assert_not_called()
+        self.assertEqual(self.cache.stats()["hits"], 2)
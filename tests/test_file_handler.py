@@ -1,7 +1,16 @@
 import unittest
 import os
-from file_handler import read_pdf, read_docx, read_txt, chunk_text, process_files
+import tempfile
+from unittest.mock import patch
+from file_handler import (
+    read_pdf, read_docx, read_txt, iter_txt_blocks, chunk_text, process_files, iter_chunks,
+    split_sentences, _split_windows, SEGMENTERS
+)
+from tests.helpers import WhitespaceEncoding
 
+
+# Keep the parsed text cache out of the working directory
+@patch("file_handler.PARSED_TEXT_CACHE_PATH", "")
 class TestFileHandler(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -64,6 +73,89 @@ class TestFileHandler(unittest.TestCase):
         result = read_txt(self.txt_path)
         self.assertIn("This is a test text file.", result, "TXT content not read correctly.")
     
+    def test_read_txt_decodes_without_detection_when_utf8(self):
+        """
+        Test that UTF-8 files (with or without a BOM) are decoded without running chardet.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "utf8.txt")
+            for prefix in (b"", b"\xef\xbb\xbf"):
+                with open(path, "wb") as f:
+                    f.write(prefix + "Caf\u00e9 cr\u00e8me.\r\nSecond line.".encode("utf-8"))
+                with patch("chardet.detect") as mock_detect:
+                    self.assertEqual(read_txt(path), "Caf\u00e9 cr\u00e8me.\nSecond line.")
+                mock_detect.assert_not_called()
+
+    def test_read_txt_detects_encoding_from_a_sample(self):
+        """
+        Test that other encodings are detected from a bounded sample around the first non-UTF-8 byte.
+        """
+        text = "Plain ASCII text. " * 10000 + "Caf\u00e9 na\u00efve r\u00e9sum\u00e9 d\u00e9j\u00e0 vu. " * 200
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "latin1.txt")
+            with open(path, "w", encoding="latin-1") as f:
+                f.write(text)
+            with patch("chardet.detect", return_value={"encoding": "ISO-8859-1", "confidence": 0.73}) as mock_detect:
+                self.assertEqual(read_txt(path), text)
+
+        sample = mock_detect.call_args.args[0]
+        self.assertLessEqual(len(sample), 64 * 1024)
+        self.assertIn("Caf\u00e9".encode("latin-1"), sample)
+
+    def test_iter_txt_blocks_splits_between_paragraphs(self):
+        """
+        Test that a TXT file is streamed in blocks that end at paragraph breaks and add up to the file.
+        """
+        paragraphs = [f"Paragraph {i} has a few words in it." for i in range(200)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "large.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n\n".join(paragraphs))
+            blocks = list(iter_txt_blocks(path, block_chars=500))
+
+        self.assertGreater(len(blocks), 5)
+        self.assertEqual("".join(blocks), "\n\n".join(paragraphs))
+        for block in blocks[1:]:
+            self.assertTrue(block.startswith("\n\n"))
+
+    def test_large_txt_files_are_chunked_incrementally(self):
+        """
+        Test that TXT files above the streaming threshold are chunked block by block with the same content.
+        """
+        paragraphs = [f"Sentence number {i} of the log. It has two parts." for i in range(300)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, "large.txt"), "w", encoding="utf-8") as f:
+                f.write("\n\n".join(paragraphs))
+            with patch("file_handler.TXT_STREAM_THRESHOLD_BYTES", 1000), \
+                 patch("file_handler.TXT_BLOCK_CHARS", 2000), \
+                 patch("file_handler.read_txt") as mock_read_txt:
+                streamed = process_files(tmp_dir, chunk_size=200, chunk_overlap=0, workers=1)
+            whole = process_files(tmp_dir, chunk_size=200, chunk_overlap=0, workers=1)
+
+        mock_read_txt.assert_not_called()
+        self.assertEqual(" ".join(" ".join(streamed).split()), " ".join(" ".join(whole).split()))
+
+    def test_large_txt_file_failing_partway_is_reported(self):
+        """
+        Test that a streamed TXT file that fails after some blocks is reported as failed.
+        """
+        def blocks(file_path, block_chars):
+            yield "The first block was read. It has two sentences."
+            raise OSError("Input/output error")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "large.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("x" * 2000)
+            failed = set()
+            with patch("file_handler.TXT_STREAM_THRESHOLD_BYTES", 1000), \
+                 patch("file_handler.iter_txt_blocks", side_effect=blocks):
+                records = list(iter_chunks(tmp_dir, chunk_size=200, chunk_overlap=0, workers=1, segmenter="regex",
+                                           failed=failed))
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(failed, {path})
+
     def test_chunk_text(self):
         """
         Test chunking text.
@@ -73,6 +165,53 @@ class TestFileHandler(unittest.TestCase):
         self.assertGreater(len(chunks), 0, "Chunks were not created.")
         self.assertTrue(all(len(chunk) <= 20 for chunk in chunks), "Chunk size exceeds max_length.")
 
+    def test_segmenters_produce_same_chunks(self):
+        """
+        Test that every segmentation backend finds the same boundaries on well-formed text.
+        """
+        text = ("The team reviewed the report. It covered every result in detail! "
+                "Was the review final? Work continued after that.\n\nA new section starts here.")
+        expected = chunk_text(text, max_length=80, chunk_overlap=10, segmenter="spacy")
+        for segmenter in SEGMENTERS:
+            self.assertEqual(chunk_text(text, max_length=80, chunk_overlap=10, segmenter=segmenter), expected,
+                             f"Chunks differ for segmenter '{segmenter}'.")
+
+    def test_split_windows(self):
+        """
+        Test that long text is split into bounded windows on line breaks without losing text.
+        """
+        text = "\n".join(f"Line number {i} ends here." for i in range(100))
+        windows = _split_windows(text, window_chars=200)
+        self.assertTrue(all(len(window) <= 200 for window in windows))
+        self.assertEqual("".join(windows), text)
+        self.assertEqual(len(split_sentences(text, "sentencizer")), 100)
+
+    def test_unknown_segmenter(self):
+        """
+        Test that an unknown segmenter is rejected.
+        """
+        with self.assertRaises(ValueError):
+            split_sentences("Some text.", segmenter="unknown")
+
+    @patch("tokenizer.get_encoding", return_value=WhitespaceEncoding())
+    def test_chunk_text_tokens(self, mock_get_encoding):
+        """
+        Test token-budgeted chunking with whole-sentence overlap.
+        """
+        text = "One two three. Four five. Six seven eight nine. Ten."
+        chunks = chunk_text(text, max_length=6, chunk_overlap=2, segmenter="regex", unit="tokens")
+        self.assertEqual(chunks, ["One two three. Four five.", "Four five. Six seven eight nine.", "Ten."])
+
+    @patch("tokenizer.get_encoding", return_value=WhitespaceEncoding())
+    def test_chunk_text_tokens_splits_long_sentences(self, mock_get_encoding):
+        """
+        Test that a sentence longer than the token budget is split into budget-sized pieces.
+        """
+        text = "a b c d e f g h i j."
+        chunks = chunk_text(text, max_length=4, chunk_overlap=0, segmenter="regex", unit="tokens")
+        self.assertEqual(chunks, ["a b c d", "e f g h", "i j."])
+        self.assertTrue(all(len(chunk.split()) <= 4 for chunk in chunks))
+
     def test_process_files(self):
         """
         Test processing files in a directory.
@@ -84,5 +223,47 @@ class TestFileHandler(unittest.TestCase):
         self.assertTrue(any("This is a test text file." in chunk for chunk in chunks),
                         "TXT content not processed.")
 
+    def test_process_files_parallel_matches_serial(self):
+        """
+        Test that the process-pool mode returns the same chunks in the same order.
+        """
+        serial = process_files(self.test_dir, chunk_size=50, chunk_overlap=10, with_sources=True, workers=1)
+        parallel = process_files(self.test_dir, chunk_size=50, chunk_overlap=10, with_sources=True, workers=2)
+        self.assertEqual(parallel, serial)
+
+    def test_iter_chunks_streams_records(self):
+        """
+        Test that iter_chunks yields (source, chunk, metadata) records matching process_files.
+        """
+        records = iter_chunks(self.test_dir, chunk_size=50, chunk_overlap=10)
+        source, chunk, metadata = next(records)
+        self.assertTrue(os.path.exists(source))
+        self.assertIsInstance(chunk, str)
+        self.assertEqual(metadata, {"chunk_index": 0})
+        self.assertEqual(
+            [chunk] + [c for _, c, _ in records],
+            process_files(self.test_dir, chunk_size=50, chunk_overlap=10)
+        )
+
+    def test_iter_chunks_raises_when_the_scan_fails(self):
+        """
+        Test that a failed scan is raised instead of ending the records early.
+        """
+        missing = os.path.join(self.test_dir, "missing")
+        with self.assertRaises(FileNotFoundError):
+            list(iter_chunks(missing))
+        self.assertEqual(process_files(missing), [])
+
+    def test_iter_chunks_reports_files_that_fail_to_read(self):
+        """
+        Test that unreadable files are reported as failed rather than yielding no records silently.
+        """
+        failed = set()
+        with patch("file_handler.read_docx", side_effect=PermissionError("File is locked")):
+            sources = {source for source, _, _ in iter_chunks(self.test_dir, workers=1, failed=failed)}
+        self.assertEqual(failed, {self.docx_path})
+        self.assertIn(self.txt_path, sources)
+        self.assertNotIn(self.docx_path, sources)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
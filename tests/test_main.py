@@ -1,6 +1,11 @@
+import os
+import subprocess
+import sys
 import pytest
+from types import SimpleNamespace
 from unittest import mock
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, ANY
+from tests.helpers import WhitespaceEncoding
 
 # Helper function to mock input() calls
 def mock_inputs(inputs):
@@ -12,19 +17,31 @@ def mock_sys_exit():
 
 # Test when user chooses to add documents and everything works fine
 def test_main_add_documents_success():
+    consumed_records = []
+
+    def consume_records(index, records, embeddings, pbar, lexical_index=None, journal=None):
+        consumed_records.extend(records)
+        return len(consumed_records)
+
     with mock_inputs([
         'yes',                          # User chooses to add documents
         '/valid/directory/path',        # User provides a valid directory
         'What is the capital of France?',  # User enters a query
         'exit'                          # User decides to exit after one query
     ]), patch('os.path.isdir', return_value=True), \
-       patch('file_handler.process_files', return_value=['chunk1', 'chunk2']), \
+       patch('main.iter_chunks', return_value=iter([('/valid/directory/path/a.txt', 'chunk1', {}),
+                                                   ('/valid/directory/path/a.txt', 'chunk2', {})])), \
+       patch('main.load_manifest', return_value={"sources": {}}), \
+       patch('main.save_manifest') as mock_save_manifest, \
+       patch('main.CHECKPOINT_PATH', ''), \
        patch('main.initialize_pinecone') as mock_init_pinecone, \
        patch('main.get_embeddings') as mock_get_embeddings, \
-       patch('main.add_chunks_to_pinecone') as mock_add_chunks, \
+       patch('main.add_chunks_to_pinecone', side_effect=consume_records) as mock_add_chunks, \
+       patch('main.get_lexical_index', return_value=None), \
+       patch('main.delete_chunks_from_pinecone') as mock_delete_chunks, \
        patch('main.check_documents_in_database', return_value=True), \
        patch('main.create_rag_agent') as mock_create_rag, \
-       patch('main.generate_response_rag', return_value='Paris is the capital of France.') as mock_generate_response_rag, \
+       patch('main.generate_response_rag', return_value={'answer': 'Paris is the capital of France.', 'sources': [], 'streamed': False}) as mock_generate_response_rag, \
        patch('main.display_progress') as mock_display_progress, \
        patch('main.log_info') as mock_log_info, \
        patch('main.log_error') as mock_log_error, \
@@ -40,21 +57,28 @@ def test_main_add_documents_success():
         # Assertions
         mock_init_pinecone.assert_called_once()
         mock_get_embeddings.assert_called_once()
-        mock_display_progress.assert_called_once_with(2, description="Adding chunks to Pinecone")
-        mock_add_chunks.assert_called_once_with(
-            mock_init_pinecone.return_value, 
-            ['chunk1', 'chunk2'], 
-            mock_get_embeddings.return_value, 
-            mock_display_progress.return_value
-        )
+        mock_display_progress.assert_called_once_with(None, description="Adding chunks to Pinecone")
+        mock_add_chunks.assert_called_once()
+        index_arg, _, embeddings_arg, pbar_arg = mock_add_chunks.call_args.args
+        assert index_arg == mock_init_pinecone.return_value
+        assert embeddings_arg == mock_get_embeddings.return_value
+        assert pbar_arg == mock_display_progress.return_value
+        assert consumed_records == [('/valid/directory/path/a.txt', 'chunk1', {}),
+                                    ('/valid/directory/path/a.txt', 'chunk2', {})]
+        mock_delete_chunks.assert_not_called()
+        mock_save_manifest.assert_called_once()
         mock_create_rag.assert_called_once_with(
             mock_init_pinecone.return_value, 
             mock_get_embeddings.return_value, 
-            model="gpt-4"
+            model="gpt-4",
+            return_sources=True,
+            streaming=main.STREAM_RESPONSES,
+            lexical_index=ANY
         )
         mock_generate_response_rag.assert_called_once_with(
             mock_create_rag.return_value, 
-            'What is the capital of France?'
+            'What is the capital of France?',
+            on_token=ANY
         )
         mock_log_info.assert_any_call("Initialized Pinecone and embeddings successfully.")
         mock_log_info.assert_any_call("Added chunks to Pinecone successfully.")
@@ -71,7 +95,7 @@ def test_main_no_documents_in_database():
     ]), \
        patch('main.create_rag_agent') as mock_create_rag, \
        patch('main.check_documents_in_database', return_value=False), \
-       patch('main.generate_response_rag', return_value='The Eiffel Tower is located in Paris.') as mock_generate_response_rag, \
+       patch('main.generate_response_rag', return_value={'answer': 'The Eiffel Tower is located in Paris.', 'sources': [], 'streamed': False}) as mock_generate_response_rag, \
        patch('main.log_info') as mock_log_info, \
        patch('main.log_error') as mock_log_error, \
        mock_sys_exit() as mock_exit:
@@ -93,11 +117,15 @@ def test_main_no_documents_in_database():
             mock_create_rag.assert_called_once_with(
                 None, 
                 mock_get_embeddings.return_value, 
-                model="gpt-4"
+                model="gpt-4",
+                return_sources=True,
+                streaming=main.STREAM_RESPONSES,
+                lexical_index=ANY
             )
             mock_generate_response_rag.assert_called_once_with(
                 mock_create_rag.return_value, 
-                'Tell me about the Eiffel Tower.'
+                'Tell me about the Eiffel Tower.',
+                on_token=ANY
             )
             mock_log_info.assert_any_call("Initialized Pinecone and embeddings successfully.")
             mock_log_info.assert_any_call("No documents in Pinecone; proceeding without document retrieval.")
@@ -133,7 +161,10 @@ def test_main_rag_agent_creation_failure():
         mock_create_rag.assert_called_once_with(
             None, 
             mock_get_embeddings.return_value, 
-            model="gpt-4"
+            model="gpt-4",
+            return_sources=True,
+            streaming=main.STREAM_RESPONSES,
+            lexical_index=ANY
         )
         mock_log_error.assert_any_call("Error creating RAG agent: RAG agent creation failed")
         mock_exit.assert_called_once_with(1)
@@ -146,7 +177,7 @@ def test_main_user_exits_immediately():
     ]), \
        patch('main.create_rag_agent') as mock_create_rag, \
        patch('main.check_documents_in_database', return_value=False), \
-       patch('main.generate_response_rag', return_value='Mocked response') as mock_generate_response_rag, \
+       patch('main.generate_response_rag', return_value={'answer': 'Mocked response', 'sources': [], 'streamed': False}) as mock_generate_response_rag, \
        patch('main.log_info') as mock_log_info, \
        patch('main.log_error') as mock_log_error, \
        mock_sys_exit() as mock_exit:
@@ -168,10 +199,142 @@ def test_main_user_exits_immediately():
             mock_create_rag.assert_called_once_with(
                 None, 
                 mock_get_embeddings.return_value, 
-                model="gpt-4"
+                model="gpt-4",
+                return_sources=True,
+                streaming=main.STREAM_RESPONSES,
+                lexical_index=ANY
             )
             mock_generate_response_rag.assert_not_called()  # No query entered before exit
             mock_log_info.assert_any_call("Initialized Pinecone and embeddings successfully.")
             mock_log_info.assert_any_call("RAG agent created successfully.")
             mock_log_error.assert_not_called()
-            mock_exit.assert_called_once_with(0)
\ No newline at end of file
+            mock_exit.assert_called_once_with(0)
+
+# Test that starting the CLI does not import the heavy SDKs
+def test_import_main_defers_heavy_dependencies():
+    heavy_modules = ['spacy', 'langchain', 'langchain_core', 'langchain_openai', 'pinecone', 'openai', 'tiktoken']
+    script = (
+        "import sys, main; "
+        f"print(','.join(m for m in {heavy_modules!r} if m in sys.modules))"
+    )
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                            cwd=repo_root)
+    assert result.stdout.strip() == ""
+
+# Test that repeated queries are answered from the response cache
+def test_start_query_loop_uses_response_cache():
+    from response_cache import ResponseCache
+    cache = ResponseCache()
+    answer = {'answer': 'Paris.', 'sources': ['france.txt'], 'streamed': False, 'error': None}
+
+    with mock_inputs(['Capital of France?', 'capital of france?', 'exit']), \
+         patch('main.generate_response_rag', return_value=answer) as mock_generate_response_rag, \
+         patch('main.log_conversation') as mock_log_conversation, \
+         patch('builtins.print'), \
+         mock_sys_exit():
+        import main
+
+        with pytest.raises(SystemExit):
+            # A chain without memory
+            main.start_query_loop(SimpleNamespace(), cache)
+
+    mock_generate_response_rag.assert_called_once()
+    assert mock_log_conversation.call_count == 2
+    assert cache.stats()['exact_hits'] == 1
+
+# Test that with conversation memory on (the default), queries starting a conversation use the cache
+def test_start_query_loop_caches_first_turns_of_conversations():
+    from config import MEMORY_TOKEN_LIMIT
+    from memory import ConversationWindow
+    from response_cache import ResponseCache
+    cache = ResponseCache()
+    window = ConversationWindow(max_tokens=MEMORY_TOKEN_LIMIT)
+    qa_chain = SimpleNamespace(memory=SimpleNamespace(window=window))
+
+    def generate(chain, query, on_token=None):
+        answer = f'Answer to {query}'
+        window.add_turn(query, answer)  # As the chain's WindowMemory does
+        return {'answer': answer, 'sources': ['faq.txt'], 'streamed': False, 'error': None}
+
+    inputs = ['How do I reset my password?', 'And on mobile?', 'new', 'How do I reset my password?',
+              'And on mobile?', 'exit']
+    with mock_inputs(inputs), \
+         patch('main.generate_response_rag', side_effect=generate) as mock_generate_response_rag, \
+         patch('tokenizer.get_encoding', return_value=WhitespaceEncoding()), \
+         patch('builtins.print'), \
+         mock_sys_exit():
+        import main
+
+        with pytest.raises(SystemExit):
+            main.start_query_loop(qa_chain, cache)
+
+    # The follow-ups depend on the history, so only the repeated first question is a hit
+    assert [call.args[1] for call in mock_generate_response_rag.call_args_list] == [
+        'How do I reset my password?', 'And on mobile?', 'And on mobile?'
+    ]
+    assert cache.stats()['exact_hits'] == 1
+    assert len(window) == 2
+
+# Test that a scan that fails partway deletes nothing and leaves the manifest alone
+def test_ingest_directory_keeps_unvisited_files_when_the_scan_fails():
+    manifest = {"sources": {"/docs/a.txt": ["id-a"], "/docs/b.txt": ["id-b"]}}
+
+    def scan(directory, exclude=(), failed=None):
+        yield "/docs/a.txt", "chunk1", {"chunk_index": 0}
+        raise OSError("Worker pool broke")
+
+    def consume_records(index, records, embeddings, pbar, lexical_index=None, journal=None):
+        return len(list(records))
+
+    with patch('main.iter_chunks', side_effect=scan), \
+         patch('main.load_manifest', return_value=manifest), \
+         patch('main.save_manifest') as mock_save_manifest, \
+         patch('main.CHECKPOINT_PATH', ''), \
+         patch('main.get_lexical_index', return_value=None), \
+         patch('main.add_chunks_to_pinecone', side_effect=consume_records), \
+         patch('main.delete_chunks_from_pinecone') as mock_delete_chunks:
+        import main
+
+        with pytest.raises(OSError):
+            main.ingest_directory(MagicMock(), MagicMock(), "/docs")
+
+    mock_delete_chunks.assert_not_called()
+    mock_save_manifest.assert_not_called()
+    assert manifest["sources"] == {"/docs/a.txt": ["id-a"], "/docs/b.txt": ["id-b"]}
+
+# Test that a file that exists but cannot be read keeps its chunks and manifest entry
+def test_ingest_directory_keeps_files_that_fail_to_read(tmp_path):
+    import functools
+    import file_handler
+    from db_connector import make_chunk_id
+    a_path, b_path = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+    for path in (a_path, b_path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("New text.")
+    old_a, old_b = make_chunk_id(a_path, "Old text."), make_chunk_id(b_path, "Old text.")
+    manifest = {"sources": {a_path: [old_a], b_path: [old_b]}}
+    read_txt = file_handler.read_txt
+
+    def locked_read_txt(file_path, strict=False):
+        if file_path == b_path:
+            raise PermissionError("File is locked")
+        return read_txt(file_path, strict)
+
+    with patch('file_handler.read_txt', side_effect=locked_read_txt), \
+         patch('main.iter_chunks', functools.partial(file_handler.iter_chunks, workers=1, segmenter="regex",
+                                                     text_cache_path="")), \
+         patch('main.load_manifest', return_value=manifest), \
+         patch('main.save_manifest') as mock_save_manifest, \
+         patch('main.CHECKPOINT_PATH', ''), \
+         patch('main.get_lexical_index', return_value=None), \
+         patch('main.add_chunks_to_pinecone', side_effect=lambda index, records, *args, **kwargs: len(list(records))), \
+         patch('main.delete_chunks_from_pinecone') as mock_delete_chunks:
+        import main
+
+        result = main.ingest_directory(MagicMock(), MagicMock(), str(tmp_path))
+
+    assert result["failed"] == 1
+    mock_delete_chunks.assert_called_once_with(ANY, [old_a], lexical_index=None)
+    mock_save_manifest.assert_called_once()
+    assert manifest["sources"] == {a_path: [make_chunk_id(a_path, "New text.")], b_path: [old_b]}
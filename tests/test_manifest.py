@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+from db_connector import make_chunk_id
+from manifest import (
+    load_manifest, save_manifest, filter_new_records, find_stale_ids, keep_failed_sources, record_sync
+)
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.abspath("docs")
+        self.source_a = os.path.join(self.directory, "a.txt")
+        self.source_b = os.path.join(self.directory, "b.txt")
+
+    def sync(self, manifest, records, failed=(), stored_ids=()):
+        """
+        Runs one scan the way main.ingest_directory does and returns (new_records, stale_ids).
+        """
+        sources = {}
+        new_records = list(filter_new_records(manifest, records, sources, stored_ids))
+        keep_failed_sources(manifest, sources, failed)
+        stale_ids = find_stale_ids(manifest, sources, self.directory)
+        record_sync(manifest, sources, self.directory)
+        return new_records, stale_ids
+
+    def test_first_sync_ingests_everything(self):
+        manifest = {"sources": {}}
+        records = [(self.source_a, "Chunk 1"), (self.source_a, "Chunk 2")]
+
+        new_records, stale_ids = self.sync(manifest, records)
+
+        self.assertEqual(new_records, records)
+        self.assertEqual(stale_ids, [])
+        self.assertEqual(manifest["sources"][self.source_a], [make_chunk_id(self.source_a, "Chunk 1"),
+                                                              make_chunk_id(self.source_a, "Chunk 2")])
+
+    def test_filter_new_records_is_lazy_and_drops_duplicates(self):
+        manifest = {"sources": {}}
+        sources = {}
+        records = iter([(self.source_a, "Chunk 1", {"chunk_index": 0}), (self.source_a, "Chunk 1", {"chunk_index": 1}),
+                        (self.source_b, "Chunk 2", {"chunk_index": 0})])
+        stored_ids = {make_chunk_id(self.source_b, "Chunk 2")}
+
+        new_records = filter_new_records(manifest, records, sources, stored_ids)
+        self.assertEqual(sources, {})
+
+        self.assertEqual(list(new_records), [(self.source_a, "Chunk 1", {"chunk_index": 0})])
+        self.assertEqual(sources, {self.source_a: [make_chunk_id(self.source_a, "Chunk 1")],
+                                   self.source_b: [make_chunk_id(self.source_b, "Chunk 2")]})
+
+    def test_unchanged_corpus_has_nothing_to_do(self):
+        manifest = {"sources": {}}
+        records = [(self.source_a, "Chunk 1"), (self.source_b, "Chunk 2")]
+        self.sync(manifest, records)
+
+        new_records, stale_ids = self.sync(manifest, records)
+
+        self.assertEqual(new_records, [])
+        self.assertEqual(stale_ids, [])
+
+    def test_changed_and_removed_files_produce_stale_ids(self):
+        manifest = {"sources": {}}
+        self.sync(manifest, [(self.source_a, "Chunk 1"), (self.source_b, "Chunk 2")])
+
+        # a.txt was edited and b.txt was deleted
+        new_records, stale_ids = self.sync(manifest, [(self.source_a, "Chunk 1 edited")])
+
+        self.assertEqual(new_records, [(self.source_a, "Chunk 1 edited")])
+        self.assertCountEqual(stale_ids, [make_chunk_id(self.source_a, "Chunk 1"),
+                                          make_chunk_id(self.source_b, "Chunk 2")])
+        self.assertEqual(list(manifest["sources"]), [self.source_a])
+
+    def test_files_that_fail_to_read_keep_their_chunks(self):
+        manifest = {"sources": {}}
+        self.sync(manifest, [(self.source_a, "Chunk 1"), (self.source_b, "Chunk 2")])
+
+        # b.txt could not be read at all; a.txt failed after its first chunk of a new version
+        new_records, stale_ids = self.sync(manifest, [(self.source_a, "Chunk 1 edited")],
+                                           failed=[self.source_a, self.source_b])
+
+        self.assertEqual(stale_ids, [])
+        self.assertEqual(manifest["sources"][self.source_a], [make_chunk_id(self.source_a, "Chunk 1"),
+                                                              make_chunk_id(self.source_a, "Chunk 1 edited")])
+        self.assertEqual(manifest["sources"][self.source_b], [make_chunk_id(self.source_b, "Chunk 2")])
+
+        # Once a.txt reads in full, both its old and its partial chunks that are gone are stale
+        _, stale_ids = self.sync(manifest, [(self.source_a, "Chunk 1 final"), (self.source_b, "Chunk 2")])
+        self.assertCountEqual(stale_ids, [make_chunk_id(self.source_a, "Chunk 1"),
+                                          make_chunk_id(self.source_a, "Chunk 1 edited")])
+
+    def test_new_file_that_fails_to_read_is_not_recorded(self):
+        manifest = {"sources": {}}
+
+        self.sync(manifest, [], failed=[self.source_a])
+
+        self.assertEqual(manifest["sources"], {})
+
+    def test_sources_outside_directory_are_left_alone(self):
+        other_source = os.path.abspath(os.path.join("other", "c.txt"))
+        manifest = {"sources": {other_source: ["some-id"]}}
+
+        _, stale_ids = self.sync(manifest, [(self.source_a, "Chunk 1")])
+
+        self.assertEqual(stale_ids, [])
+        self.assertIn(other_source, manifest["sources"])
+
+    def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "manifest.json")
+            self.assertEqual(load_manifest(path), {"sources": {}})
+
+            save_manifest({"sources": {self.source_a: ["id-1"]}}, path)
+
+            self.assertEqual(load_manifest(path), {"sources": {self.source_a: ["id-1"]}})
+
+
+if __name__ == "__main__":
+    unittest.main()
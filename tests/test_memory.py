@@ -0,0 +1,87 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from memory import ConversationWindow, WindowMemory
+from tests.helpers import WhitespaceEncoding
+
+
+class RecordingSummarizer:
+    """Chat model that returns a numbered summary and records its prompts."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, messages, **kwargs):
+        self.prompts.append(messages[0].content)
+        return SimpleNamespace(content=f"summary {len(self.prompts)}")
+
+    async def ainvoke(self, messages, **kwargs):
+        return self.invoke(messages)
+
+
+class TestConversationWindow(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch("tokenizer.get_encoding", return_value=WhitespaceEncoding())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.summarizer = RecordingSummarizer()
+        # Every turn below is 4 + 4 = 8 whitespace tokens
+        self.window = ConversationWindow(llm=self.summarizer, max_tokens=24)
+
+    def add_turns(self, count):
+        for i in range(count):
+            self.window.add_turn(f"question number {i} please", f"answer number {i} here")
+
+    def test_keeps_turns_within_budget(self):
+        self.add_turns(3)
+
+        self.assertEqual(len(self.window), 3)
+        self.assertEqual(self.summarizer.prompts, [])
+        self.assertEqual(self.window.messages()[0], HumanMessage(content="question number 0 please"))
+        self.assertEqual(self.window.messages()[1], AIMessage(content="answer number 0 here"))
+
+    def test_overflow_folds_oldest_turns_into_summary(self):
+        self.add_turns(4)
+
+        # The window is trimmed to half its budget and the evicted turns are summarized once
+        self.assertEqual(len(self.window), 1)
+        self.assertEqual(len(self.summarizer.prompts), 1)
+        self.assertIn("question number 2 please", self.summarizer.prompts[0])
+        self.assertNotIn("question number 3 please", self.summarizer.prompts[0])
+        messages = self.window.messages()
+        self.assertEqual(messages[0], SystemMessage(content="Summary of the earlier conversation: summary 1"))
+        self.assertEqual(messages[1], HumanMessage(content="question number 3 please"))
+
+    def test_history_stays_bounded_over_a_long_session(self):
+        self.add_turns(100)
+
+        self.assertLessEqual(len(self.window), 3)
+        self.assertIn("summary 1", self.summarizer.prompts[1])  # Each summary builds on the last
+        self.assertLess(len(self.summarizer.prompts), 50)
+
+    def test_as_text_and_clear(self):
+        self.add_turns(1)
+        self.assertEqual(self.window.as_text(), "User: question number 0 please\nAI: answer number 0 here")
+
+        self.window.clear()
+        self.assertEqual(self.window.as_text(), "")
+
+    def test_zero_budget_keeps_no_history(self):
+        window = ConversationWindow(llm=self.summarizer, max_tokens=0)
+        window.add_turn("hello", "hi")
+
+        self.assertEqual(window.messages(), [])
+        self.assertEqual(self.summarizer.prompts, [])
+
+    def test_window_memory_saves_the_configured_keys(self):
+        memory = WindowMemory(window=self.window, input_key="query", output_key="result")
+
+        memory.save_context({"query": "capital of France?"}, {"result": "Paris.", "source_documents": []})
+
+        self.assertEqual(memory.load_memory_variables({}), {"history": "User: capital of France?\nAI: Paris."})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+import metrics
+from metrics import Histogram, MetricsRegistry, timed
+from clients import TimedEmbeddings
+from db_connector import retrieve_chunks
+from streaming import TokenStreamHandler
+
+
+def stage_count(stage):
+    histogram = metrics.REGISTRY.histogram("rag_stage_duration_seconds", stage=stage)
+    return histogram.count
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        metrics.REGISTRY.reset()
+        self.addCleanup(metrics.REGISTRY.reset)
+
+    def test_histogram_quantiles(self):
+        histogram = Histogram(buckets=(0.01, 0.1, 1))
+        for _ in range(90):
+            histogram.observe(0.005)
+        for _ in range(10):
+            histogram.observe(0.5)
+
+        self.assertLessEqual(histogram.quantile(0.5), 0.01)
+        self.assertGreater(histogram.quantile(0.95), 0.1)
+        self.assertLessEqual(histogram.quantile(0.99), 1)
+        self.assertAlmostEqual(histogram.sum, 5.45)
+        self.assertIsNone(Histogram().quantile(0.5))
+
+    def test_prometheus_export(self):
+        registry = MetricsRegistry()
+        registry.counter("rag_llm_tokens_total", "Tokens.", model="gpt-4", type="prompt").inc(12)
+        registry.histogram("rag_stage_duration_seconds", "Time.", stage="llm").observe(0.2)
+
+        text = registry.to_prometheus()
+
+        self.assertIn("# TYPE rag_llm_tokens_total counter", text)
+        self.assertIn('rag_llm_tokens_total{model="gpt-4",type="prompt"} 12', text)
+        self.assertIn('rag_stage_duration_seconds_bucket{stage="llm",le="0.25"} 1', text)
+        self.assertIn('rag_stage_duration_seconds_bucket{stage="llm",le="+Inf"} 1', text)
+        self.assertIn('rag_stage_duration_seconds_count{stage="llm"} 1', text)
+
+    def test_export_to_file(self):
+        metrics.REGISTRY.histogram("rag_stage_duration_seconds", stage="upsert").observe(0.05)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = os.path.join(tmp_dir, "metrics.json")
+            metrics.REGISTRY.export(json_path)
+            with open(json_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            prom_path = os.path.join(tmp_dir, "metrics.prom")
+            metrics.REGISTRY.export(prom_path)
+
+            self.assertEqual(snapshot["rag_stage_duration_seconds"][0]["labels"], {"stage": "upsert"})
+            self.assertEqual(snapshot["rag_stage_duration_seconds"][0]["count"], 1)
+            self.assertIn("p99", snapshot["rag_stage_duration_seconds"][0])
+            self.assertTrue(os.path.getsize(prom_path))
+
+    def test_timed_records_duration_and_errors(self):
+        @timed("flaky")
+        def flaky(fail):
+            if fail:
+                raise RuntimeError("boom")
+            return "ok"
+
+        self.assertEqual(flaky(False), "ok")
+        with self.assertRaises(RuntimeError):
+            flaky(True)
+
+        self.assertEqual(stage_count("flaky"), 2)
+        self.assertEqual(metrics.REGISTRY.counter("rag_stage_errors_total", stage="flaky").value, 1)
+
+    def test_disabled_metrics_record_nothing(self):
+        with patch("metrics.METRICS_ENABLED", False):
+            with timed("embed_query"):
+                pass
+            metrics.increment("rag_chunks_added_total", 5)
+
+        self.assertEqual(metrics.REGISTRY.snapshot(), {})
+
+    def test_retrieve_chunks_records_stages(self):
+        index = MagicMock()
+        index.query.return_value = SimpleNamespace(matches=[{"metadata": {"text": "chunk"}}])
+        embeddings = MagicMock()
+        embeddings.embed_query.return_value = [0.1, 0.2]
+
+        retrieve_chunks(index, "query", TimedEmbeddings(embeddings))
+
+        self.assertEqual(stage_count("embed_query"), 1)
+        self.assertEqual(stage_count("vector_query"), 1)
+
+    def test_pinecone_vector_store_records_embed_and_query_stages(self):
+        from retrieval import TimedPinecone
+
+        class FakeIndex:
+            def query(self, **kwargs):
+                return {"matches": [{"id": "a", "score": 0.9, "metadata": {"text": "chunk"}}]}
+
+        embeddings = MagicMock()
+        embeddings.embed_query.return_value = [0.1, 0.2]
+        with patch("pinecone.Index", FakeIndex):
+            store = TimedPinecone(index=FakeIndex(), embedding=TimedEmbeddings(embeddings), text_key="text")
+
+        documents = store.as_retriever(search_kwargs={"k": 1}).invoke("query")
+
+        self.assertEqual([document.page_content for document in documents], ["chunk"])
+        self.assertEqual(stage_count("embed_query"), 1)
+        self.assertEqual(stage_count("vector_query"), 1)
+
+    def test_stream_handler_records_llm_stages_and_token_usage(self):
+        handler = TokenStreamHandler()
+        retriever_run, llm_run = uuid4(), uuid4()
+
+        handler.on_retriever_start({}, "query", run_id=retriever_run)
+        handler.on_retriever_end([], run_id=retriever_run)
+        handler.on_chat_model_start({}, [[]], run_id=llm_run, invocation_params={"model_name": "gpt-4"})
+        handler.on_llm_new_token("Paris")
+        handler.on_llm_end(SimpleNamespace(llm_output={"token_usage": {"prompt_tokens": 120,
+                                                                         "completion_tokens": 8}},
+                                           generations=[]), run_id=llm_run)
+
+        for stage in ["retrieve", "prompt", "llm", "llm_first_token"]:
+            self.assertEqual(stage_count(stage), 1, stage)
+        tokens = metrics.REGISTRY.counter("rag_llm_tokens_total", model="gpt-4", type="prompt")
+        self.assertEqual(tokens.value, 120)
+
+
+if __name__ == "__main__":
+    unittest.main()
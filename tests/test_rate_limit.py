@@ -0,0 +1,170 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+import metrics
+from clients import ChatRateLimiter, RateLimitedEmbeddings, TokenUsageCallback, estimate_tokens
+from rate_limit import RateLimiter, TokenBucket, backoff_delay, is_rate_limit_error, retry_after
+
+
+def rate_limit_error(headers=None):
+    error = Exception("Too Many Requests")
+    error.status_code = 429
+    error.response = SimpleNamespace(status_code=429, headers=headers or {})
+    return error
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    @patch("rate_limit.time.monotonic", return_value=100.0)
+    def test_reserve_waits_once_the_burst_is_used(self, mock_time):
+        bucket = TokenBucket(rate_per_minute=60, capacity=2)
+
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 1.0)
+        # Callers queue up behind the debt
+        self.assertAlmostEqual(bucket.reserve(), 2.0)
+
+    @patch("rate_limit.time.monotonic")
+    def test_bucket_refills_over_time(self, mock_time):
+        mock_time.return_value = 100.0
+        bucket = TokenBucket(rate_per_minute=60, capacity=1)
+        bucket.reserve()
+
+        mock_time.return_value = 101.0
+        self.assertEqual(bucket.reserve(), 0.0)
+
+    @patch("rate_limit.time.monotonic", return_value=100.0)
+    def test_request_larger_than_capacity_is_delayed_not_refused(self, mock_time):
+        bucket = TokenBucket(rate_per_minute=600, capacity=100)
+
+        self.assertAlmostEqual(bucket.reserve(250), 15.0)
+
+    @patch("rate_limit.time.monotonic", return_value=100.0)
+    def test_pause_holds_back_callers(self, mock_time):
+        bucket = TokenBucket(rate_per_minute=60)
+        bucket.pause(5)
+
+        self.assertAlmostEqual(bucket.reserve(), 6.0)
+
+    def test_zero_rate_is_unlimited(self):
+        bucket = TokenBucket(rate_per_minute=0)
+
+        self.assertEqual(bucket.reserve(10 ** 9), 0.0)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        metrics.REGISTRY.reset()
+        self.addCleanup(metrics.REGISTRY.reset)
+
+    @patch("rate_limit.time.sleep")
+    @patch("rate_limit.time.monotonic", return_value=100.0)
+    def test_acquire_waits_for_the_token_limit(self, mock_time, mock_sleep):
+        limiter = RateLimiter("test", requests_per_minute=600, tokens_per_minute=60)
+
+        self.assertEqual(limiter.acquire(tokens=60), 0.0)
+        self.assertAlmostEqual(limiter.acquire(tokens=30), 30.0)
+
+        mock_sleep.assert_called_once()
+        snapshot = metrics.REGISTRY.snapshot()
+        self.assertEqual(snapshot["rag_rate_limit_requests_total"][0]["value"], 2)
+        self.assertEqual(snapshot["rag_rate_limit_tokens_total"][0]["value"], 90)
+        self.assertEqual(snapshot["rag_rate_limit_wait_seconds"][0]["count"], 2)
+
+    @patch("rate_limit.asyncio.sleep", new_callable=AsyncMock)
+    def test_aacquire_waits_with_asyncio_sleep(self, mock_sleep):
+        limiter = RateLimiter("test", requests_per_minute=60)
+        limiter.requests.capacity = limiter.requests._tokens = 1
+
+        async def run():
+            await limiter.aacquire()
+            return await limiter.aacquire()
+
+        self.assertAlmostEqual(asyncio.run(run()), 1.0, places=2)
+        mock_sleep.assert_awaited_once()
+
+    @patch("rate_limit.time.monotonic", return_value=100.0)
+    def test_rate_limited_pauses_requests(self, mock_time):
+        limiter = RateLimiter("test", requests_per_minute=60)
+        limiter.rate_limited(3)
+
+        self.assertGreaterEqual(limiter.requests.reserve(), 3.0)
+        self.assertEqual(metrics.REGISTRY.snapshot()["rag_rate_limited_total"][0]["value"], 1)
+
+
+class TestBackoff(unittest.TestCase):
+
+    def test_is_rate_limit_error(self):
+        self.assertTrue(is_rate_limit_error(rate_limit_error()))
+        self.assertTrue(is_rate_limit_error(type("RateLimitError", (Exception,), {})()))
+        self.assertFalse(is_rate_limit_error(Exception("Connection reset")))
+
+    def test_retry_after_header(self):
+        self.assertEqual(retry_after(rate_limit_error({"retry-after": "7"})), 7.0)
+        self.assertEqual(retry_after(rate_limit_error({"retry-after-ms": "250"})), 0.25)
+        self.assertIsNone(retry_after(rate_limit_error()))
+        self.assertIsNone(retry_after(Exception("no response")))
+
+    def test_backoff_delay_is_jittered_and_capped(self):
+        for attempt in range(1, 10):
+            delay = backoff_delay(attempt, base=1.0, cap=8.0)
+            self.assertGreaterEqual(delay, 0.0)
+            self.assertLessEqual(delay, min(8.0, 2 ** (attempt - 1)))
+        self.assertGreater(len({backoff_delay(5) for _ in range(20)}), 1)
+
+    def test_backoff_delay_honours_retry_after(self):
+        error = rate_limit_error({"retry-after": "5"})
+
+        self.assertGreaterEqual(backoff_delay(1, base=0.1, cap=60, error=error), 5.0)
+        self.assertEqual(backoff_delay(1, base=0.1, cap=2, error=error), 2.0)
+
+
+class TestClients(unittest.TestCase):
+
+    def setUp(self):
+        metrics.REGISTRY.reset()
+        self.addCleanup(metrics.REGISTRY.reset)
+
+    def test_rate_limited_embeddings_charges_estimated_tokens(self):
+        limiter = MagicMock()
+        wrapped = MagicMock()
+        wrapped.embed_documents.return_value = [[0.1], [0.2]]
+        embeddings = RateLimitedEmbeddings(wrapped, limiter)
+
+        self.assertEqual(embeddings.embed_documents(["a" * 40, "b" * 8]), [[0.1], [0.2]])
+        limiter.acquire.assert_called_once_with(estimate_tokens(["a" * 40, "b" * 8]))
+
+    def test_rate_limited_embeddings_pauses_on_429(self):
+        limiter = MagicMock()
+        wrapped = MagicMock()
+        wrapped.embed_query.side_effect = rate_limit_error({"retry-after": "4"})
+        embeddings = RateLimitedEmbeddings(wrapped, limiter)
+
+        with self.assertRaises(Exception):
+            embeddings.embed_query("query")
+
+        limiter.rate_limited.assert_called_once()
+        self.assertGreaterEqual(limiter.rate_limited.call_args.args[0], 4.0)
+
+    def test_chat_rate_limiter_and_token_usage_callback(self):
+        limiter = MagicMock()
+        ChatRateLimiter(limiter).acquire()
+        limiter.acquire.assert_called_once_with()
+
+        response = SimpleNamespace(llm_output={"token_usage": {"total_tokens": 120}}, generations=[])
+        TokenUsageCallback(limiter).on_llm_end(response)
+        limiter.tokens.reserve.assert_called_once_with(120)
+
+        streamed = SimpleNamespace(
+            llm_output=None,
+            generations=[[SimpleNamespace(message=SimpleNamespace(usage_metadata={"total_tokens": 30}))]]
+        )
+        TokenUsageCallback(limiter).on_llm_end(streamed)
+        limiter.tokens.reserve.assert_called_with(30)
+
+
+if __name__ == "__main__":
+    unittest.main()
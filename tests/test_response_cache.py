@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from response_cache import ResponseCache, invalidate_response_caches, normalize_query
+from db_connector import add_chunks_to_pinecone
+
+
+class KeywordEmbeddings:
+    """Embeds text as keyword counts, so paraphrases with the same keywords are identical."""
+
+    KEYWORDS = ["refund", "password", "shipping", "invoice"]
+
+    def embed_query(self, text):
+        text = text.lower()
+        return [float(text.count(word)) for word in self.KEYWORDS] + [0.01]
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(KeywordEmbeddings(), similarity_threshold=0.95, ttl=60, max_entries=3)
+        self.result = {"answer": "Refunds take 5 days.", "sources": ["faq.txt"]}
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  How do   I get a\nRefund? "), "how do i get a refund?")
+
+    def test_exact_hit(self):
+        self.cache.put("How do I get a refund?", self.result)
+
+        self.assertEqual(self.cache.get("how do I get a   REFUND?"), self.result)
+        self.assertEqual(self.cache.stats()["exact_hits"], 1)
+
+    def test_semantic_hit_and_miss(self):
+        self.cache.put("How do I get a refund?", self.result)
+
+        self.assertEqual(self.cache.get("Refund please"), self.result)
+        self.assertIsNone(self.cache.get("I forgot my password"))
+        stats = self.cache.stats()
+        self.assertEqual((stats["semantic_hits"], stats["misses"]), (1, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 0.5)
+
+    def test_exact_only_without_embeddings(self):
+        cache = ResponseCache(None)
+        cache.put("How do I get a refund?", self.result)
+
+        self.assertIsNone(cache.get("Refund please"))
+
+    @patch("response_cache.time.time")
+    def test_entries_expire(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.put("How do I get a refund?", self.result)
+
+        mock_time.return_value = 1061
+        self.assertIsNone(self.cache.get("How do I get a refund?"))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for query in ["refund", "password", "shipping"]:
+            self.cache.put(query, {"answer": query})
+        self.cache.get("refund")
+        self.cache.put("invoice", {"answer": "invoice"})
+
+        self.assertIsNone(self.cache.get("password"))
+        self.assertEqual(self.cache.get("refund"), {"answer": "refund"})
+        self.assertEqual(self.cache.stats()["entries"], 3)
+
+    def test_ingestion_invalidates_caches(self):
+        self.cache.put("How do I get a refund?", self.result)
+        embeddings = MagicMock()
+        embeddings.embed_documents.side_effect = lambda texts: [[0.1, 0.2]] * len(texts)
+
+        add_chunks_to_pinecone(MagicMock(), ["New refund policy."], embeddings)
+
+        self.assertIsNone(self.cache.get("How do I get a refund?"))
+
+    def test_invalidate_response_caches(self):
+        self.cache.put("How do I get a refund?", self.result)
+
+        invalidate_response_caches()
+
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import patch
+from langchain_core.documents import Document
+from retrieval import ContextPacker, dedupe_texts, pack_texts, rerank_texts, select_context
+from tests.helpers import WhitespaceEncoding
+
+CHUNKS = [
+    "The warranty covers parts and labour for two years from the date of purchase.",
+    "The warranty covers parts and labour for two years from the date of purchase. Keep the receipt.",
+    "Shipping is free for orders over fifty dollars.",
+    "To claim the warranty, contact support with your order number and receipt.",
+]
+
+
+@patch("tokenizer.get_encoding", return_value=WhitespaceEncoding())
+class TestContextPacking(unittest.TestCase):
+
+    def test_dedupe_drops_overlapping_chunks(self, mock_get_encoding):
+        self.assertEqual(dedupe_texts(CHUNKS, threshold=0.8), [0, 2, 3])
+        self.assertEqual(dedupe_texts(CHUNKS, threshold=1.0), [0, 1, 2, 3])
+
+    def test_rerank_promotes_chunks_mentioning_the_query_terms(self, mock_get_encoding):
+        order = rerank_texts("how do I claim the warranty with my receipt", [CHUNKS[2], CHUNKS[0], CHUNKS[3]])
+
+        self.assertEqual(order, [2, 1, 0])
+
+    def test_pack_skips_chunks_that_do_not_fit(self, mock_get_encoding):
+        texts = ["one two three", "four five six seven", "eight"]
+
+        self.assertEqual(pack_texts(texts, token_budget=4), [0, 2])
+        self.assertEqual(pack_texts(texts, token_budget=1), [0])
+
+    def test_select_context(self, mock_get_encoding):
+        selected = select_context("claim warranty receipt", CHUNKS, token_budget=30)
+
+        self.assertEqual(selected, [3, 0])
+
+    def test_context_packer_compresses_documents(self, mock_get_encoding):
+        documents = [Document(page_content=text, metadata={"source": f"{i}.txt"}) for i, text in enumerate(CHUNKS)]
+
+        packed = ContextPacker(token_budget=30).compress_documents(documents, "claim warranty receipt")
+
+        self.assertEqual([document.metadata["source"] for document in packed], ["3.txt", "0.txt"])
+        self.assertEqual(ContextPacker().compress_documents([], "query"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+from aiohttp.test_utils import AioHTTPTestCase
+from async_engine import AsyncQueryEngine
+from response_cache import ResponseCache
+from benchmarks.stubs import StubChatModel, StubEmbeddings
+from tests.helpers import WhitespaceEncoding
+from server import create_app
+from vector_store import LocalVectorIndex
+
+
+class TestServer(AioHTTPTestCase):
+
+    async def get_application(self):
+        patcher = patch("tokenizer.get_encoding", return_value=WhitespaceEncoding())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.embeddings = StubEmbeddings(dimension=16)
+        self.index = LocalVectorIndex(os.path.join(self.tmp_dir.name, "index"), dimension=16)
+        self.llm = StubChatModel(answer="Paris is the capital.")
+        self.engine = AsyncQueryEngine(self.index, self.embeddings, self.llm)
+        self.cache = ResponseCache(self.embeddings)
+        return create_app(self.index, self.embeddings, self.engine, self.cache)
+
+    async def asyncTearDown(self):
+        await super().asyncTearDown()
+        self.tmp_dir.cleanup()
+
+    async def _ingest_text(self):
+        documents = [{"source": "france.txt", "text": "Paris is the capital of France. It is on the Seine."}]
+        return await self.client.post("/ingest", json={"documents": documents})
+
+    async def test_ingest_documents_and_query(self):
+        response = await self._ingest_text()
+        self.assertEqual(response.status, 200)
+        self.assertEqual((await response.json())["added"], 1)
+
+        response = await self.client.post("/query", json={"query": "What is the capital of France?"})
+        result = await response.json()
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(result["answer"], "Paris is the capital. ")
+        self.assertEqual(result["sources"], ["france.txt"])
+        self.assertIn("Paris is the capital of France.", self.llm.calls[0][0].content)
+        # Sessions without an ID are not kept
+        self.assertEqual(self.engine.sessions, {})
+
+    async def test_ingest_directory_reuses_main_pipeline(self):
+        with patch("main.ingest_directory", return_value={"files": 2, "added": 5, "removed": 1}) as mock_ingest:
+            response = await self.client.post("/ingest", json={"directory": self.tmp_dir.name})
+
+        self.assertEqual(await response.json(), {"files": 2, "added": 5, "removed": 1})
+        mock_ingest.assert_called_once_with(self.index, self.embeddings, self.tmp_dir.name)
+
+    async def test_ingest_rejects_bad_requests(self):
+        for body in [{}, {"directory": "/does/not/exist"}, {"documents": [{"text": "no source"}]}, [], "docs",
+                     {"documents": "not a list"}]:
+            response = await self.client.post("/ingest", json=body)
+            self.assertEqual(response.status, 400)
+
+    async def test_query_streams_ndjson(self):
+        await self._ingest_text()
+
+        response = await self.client.post("/query", json={"query": "Capital?", "session_id": "s1", "stream": True})
+        lines = [json.loads(line) for line in (await response.text()).splitlines()]
+
+        self.assertEqual(response.headers["Content-Type"], "application/x-ndjson")
+        self.assertEqual("".join(line["token"] for line in lines[:-1]), "Paris is the capital. ")
+        self.assertEqual(lines[-1]["answer"], "Paris is the capital. ")
+        self.assertEqual(lines[-1]["sources"], ["france.txt"])
+        self.assertIn("s1", self.engine.sessions)
+
+    async def test_query_rejects_empty_query(self):
+        response = await self.client.post("/query", json={"query": " "})
+
+        self.assertEqual(response.status, 400)
+
+    async def test_query_rejects_non_object_bodies(self):
+        for body in [["Capital?"], "Capital?", 3, None]:
+            response = await self.client.post("/query", json=body)
+            self.assertEqual(response.status, 400)
+
+    async def test_stats(self):
+        await self._ingest_text()
+
+        response = await self.client.get("/stats")
+        stats = await response.json()
+
+        self.assertEqual(stats["index"]["total_vector_count"], 1)
+        self.assertEqual(stats["sessions"], 0)
+        self.assertEqual(stats["response_cache"]["entries"], 0)
+
+    async def test_metrics(self):
+        await self._ingest_text()
+        await self.client.post("/query", json={"query": "What is the capital of France?"})
+
+        response = await self.client.get("/metrics")
+        text = await response.text()
+
+        self.assertEqual(response.status, 200)
+        self.assertIn("# TYPE rag_stage_duration_seconds histogram", text)
+        self.assertIn('rag_stage_duration_seconds_count{stage="embed_documents"}', text)
+        self.assertIn('rag_stage_duration_seconds_count{stage="llm"}', text)
+
+    async def test_stateless_queries_are_cached_until_ingest(self):
+        await self._ingest_text()
+        await self.client.post("/query", json={"query": "Capital of France?"})
+
+        response = await self.client.post("/query", json={"query": "capital of  france?"})
+        self.assertTrue((await response.json())["cached"])
+        self.assertEqual(len(self.llm.calls), 1)
+
+        # Queries within a session bypass the cache
+        await self.client.post("/query", json={"query": "Capital of France?", "session_id": "s1"})
+        self.assertEqual(len(self.llm.calls), 2)
+
+        await self.client.post("/ingest", json={"documents": [{"source": "new.txt", "text": "Lyon is big."}]})
+        await self.client.post("/query", json={"query": "Capital of France?"})
+        self.assertEqual(len(self.llm.calls), 3)
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from file_handler import process_files, read_file
+from text_cache import ParsedTextCache, file_digest, get_text_cache
+
+
+class TestParsedTextCache(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.cache = ParsedTextCache(os.path.join(self.tmp_dir, "cache.sqlite"))
+        self.addCleanup(self.cache.close)
+        self.path = self.write("doc.pdf", b"%PDF-1.4 first version")
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_unchanged_file_is_not_parsed_again(self):
+        parse = MagicMock(return_value="Extracted text")
+
+        self.assertEqual(self.cache.get_or_parse(self.path, parse), "Extracted text")
+        with patch("text_cache.file_digest") as mock_digest:
+            self.assertEqual(self.cache.get_or_parse(self.path, parse), "Extracted text")
+
+        parse.assert_called_once()
+        # Size and mtime matched, so the file was not even hashed
+        mock_digest.assert_not_called()
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_changed_file_is_parsed_again(self):
+        parse = MagicMock(side_effect=["Old text", "New text"])
+        self.cache.get_or_parse(self.path, parse)
+
+        self.write("doc.pdf", b"%PDF-1.4 second, longer version")
+
+        self.assertEqual(self.cache.get_or_parse(self.path, parse), "New text")
+        self.assertEqual(parse.call_count, 2)
+
+    def test_copied_or_touched_file_is_found_by_content(self):
+        parse = MagicMock(return_value="Extracted text")
+        self.cache.get_or_parse(self.path, parse)
+
+        copy = os.path.join(self.tmp_dir, "copy.pdf")
+        shutil.copyfile(self.path, copy)
+        later = time.time() + 60
+        os.utime(self.path, (later, later))
+
+        self.assertEqual(self.cache.get_or_parse(copy, parse), "Extracted text")
+        self.assertEqual(self.cache.get_or_parse(self.path, parse), "Extracted text")
+        parse.assert_called_once()
+
+    def test_failed_parses_are_not_cached(self):
+        parse = MagicMock(side_effect=["", "Extracted text"])
+
+        self.assertEqual(self.cache.get_or_parse(self.path, parse), "")
+        self.assertEqual(self.cache.get_or_parse(self.path, parse), "Extracted text")
+
+    def test_least_recently_used_texts_are_evicted_over_the_size_cap(self):
+        paths = [self.write(f"doc{i}.pdf", f"file {i}".encode()) for i in range(3)]
+        texts = {path: os.urandom(150).hex() for path in paths}
+        self.cache.get_or_parse(paths[0], texts.get)
+        # Room for two and a half texts of about the same compressed size
+        self.cache.max_bytes = self.cache.stats()["bytes"] * 5 // 2
+        for path in paths[1:]:
+            self.cache.get_or_parse(path, texts.get)
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertLessEqual(stats["bytes"], self.cache.max_bytes)
+        parse = MagicMock(side_effect=texts.get)
+        self.cache.get_or_parse(paths[2], parse)
+        parse.assert_not_called()
+        self.cache.get_or_parse(paths[0], parse)
+        parse.assert_called_once_with(paths[0])
+
+    def test_file_digest_hashes_in_blocks(self):
+        content = os.urandom(10000)
+        path = self.write("large.pdf", content)
+
+        with patch("text_cache.DIGEST_BLOCK_BYTES", 4096):
+            self.assertEqual(file_digest(path), hashlib.sha256(content).digest())
+
+    def test_texts_are_stored_compressed(self):
+        text = "The same sentence, over and over. " * 1000
+        self.cache.get_or_parse(self.path, lambda path: text)
+
+        self.assertLess(self.cache.stats()["bytes"], len(text) // 10)
+        self.assertEqual(self.cache.get_or_parse(self.path, MagicMock()), text)
+
+
+class TestReadFileWithCache(unittest.TestCase):
+
+    def test_process_files_rechunks_without_parsing(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            docs = os.path.join(tmp_dir, "docs")
+            os.makedirs(docs)
+            from docx import Document
+            document = Document()
+            document.add_paragraph("This is a cached paragraph. It has two sentences.")
+            document.save(os.path.join(docs, "test.docx"))
+            cache_path = os.path.join(tmp_dir, "cache.sqlite")
+
+            first = process_files(docs, chunk_size=30, chunk_overlap=0, workers=1, text_cache_path=cache_path)
+            with patch("file_handler.read_docx") as mock_read_docx:
+                second = process_files(docs, chunk_size=1000, chunk_overlap=0, workers=1,
+                                       text_cache_path=cache_path)
+
+            mock_read_docx.assert_not_called()
+            self.assertGreater(len(first), len(second))
+            self.assertEqual(" ".join(second), " ".join(first))
+            get_text_cache(cache_path).close()
+
+    def test_text_files_and_disabled_cache_bypass_it(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notes.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("Plain text.")
+
+            with patch("file_handler.get_text_cache") as mock_get_cache:
+                self.assertEqual(read_file(path, os.path.join(tmp_dir, "cache.sqlite")), "Plain text.")
+                self.assertEqual(read_file(path), "Plain text.")
+            mock_get_cache.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
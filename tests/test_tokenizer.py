@@ -0,0 +1,17 @@
+import unittest
+from unittest.mock import patch
+from config import CHUNK_TOKEN_ENCODING
+from tokenizer import count_tokens
+from tests.helpers import WhitespaceEncoding
+
+
+class TestTokenizer(unittest.TestCase):
+
+    @patch("tokenizer.get_encoding", return_value=WhitespaceEncoding())
+    def test_count_tokens_counts_each_text(self, mock_get_encoding):
+        self.assertEqual(count_tokens(["one two three", "four", ""]), [3, 1, 0])
+        mock_get_encoding.assert_called_once_with(CHUNK_TOKEN_ENCODING)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,10 @@
+import io
+import time
 import pytest
 from unittest.mock import patch
 from ui import (
+    Spinner,
+    show_loading_message,
     get_user_input,
     get_yes_no_input,
     prompt_add_documents,
@@ -120,4 +124,38 @@ def test_prompt_fallback_mode(mock_print, mock_log_info):
         "No documents found in the vector database. The AI will answer questions using general knowledge only. "
         "To improve responses, consider adding documents."
     )
-    mock_log_info.assert_called_once_with("User informed about fallback mode.")
\ No newline at end of file
+    mock_log_info.assert_called_once_with("User informed about fallback mode.")
+
+
+class FakeTerminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def test_spinner_animates_until_stopped():
+    """Test the spinner draws frames in the background and clears its line when the work ends."""
+    stream = FakeTerminal()
+    with Spinner("Working", stream=stream, interval=0.01) as spinner:
+        time.sleep(0.05)
+        assert spinner._thread.is_alive()
+    assert spinner._thread is None
+    output = stream.getvalue()
+    assert "\rWorking |" in output
+    assert output.endswith("\r")
+
+
+def test_spinner_stops_as_soon_as_work_finishes():
+    """Test leaving the with block does not wait out a full frame interval."""
+    start = time.perf_counter()
+    with Spinner("Working", stream=FakeTerminal(), interval=10):
+        pass
+    assert time.perf_counter() - start < 1
+
+
+def test_show_loading_message_without_terminal():
+    """Test the loading message is printed once, without animation, when output is not a terminal."""
+    stream = io.StringIO()
+    with patch("sys.stdout", stream):
+        with show_loading_message("Processing"):
+            pass
+    assert stream.getvalue() == "Processing\n"
@@ -1,8 +1,11 @@
 # tests/test_utils.py
 
+import json
+import logging
 import pytest
 from unittest.mock import patch, MagicMock
-from utils import display_progress, log_info, log_error
+import utils
+from utils import display_progress, log_info, log_error, log_conversation, JsonFormatter, SamplingFilter
 
 
 @patch("utils.tqdm")
@@ -37,4 +40,98 @@ def test_log_error(mock_logging_error):
     log_error(message)
 
     # Assertions
-    mock_logging_error.assert_called_once_with(message)
\ No newline at end of file
+    mock_logging_error.assert_called_once_with(message)
+
+
+@patch("utils.logging.info")
+def test_log_conversation_logs_only_the_current_turn(mock_logging_info):
+    """Test each log entry holds one turn, so its size does not grow with the session."""
+    log_conversation("Capital of France?", "Paris.", turn=1, sources=["france.txt"])
+    log_conversation("And of Spain?", "Madrid.", turn=2)
+
+    first, second = (call.args[0] for call in mock_logging_info.call_args_list)
+    assert "Turn 1" in first and "Paris." in first and "france.txt" in first
+    assert "Turn 2" in second and "Madrid." in second
+    assert "Paris." not in second
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    """Routes logging to a temporary file and restores the default pipeline afterwards."""
+    path = tmp_path / "test.log"
+    yield path
+    utils.configure_logging()
+
+
+def read_records(path):
+    utils.shutdown_logging()  # Flushes the queue
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_json_formatter_includes_structured_fields():
+    """Test records are formatted as one JSON object with their extra fields."""
+    record = logging.makeLogRecord({"msg": "Answered query.", "levelname": "INFO", "name": "root",
+                                    "latency": 1.5})
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["message"] == "Answered query."
+    assert entry["level"] == "INFO"
+    assert entry["latency"] == 1.5
+
+
+def test_sampling_filter_keeps_an_evenly_spaced_fraction():
+    """Test a rate of 0.25 keeps every fourth record."""
+    sampler = SamplingFilter(0.25)
+
+    kept = [sampler.filter(None) for _ in range(100)]
+
+    assert sum(kept) == 25
+    assert kept[:8] == [False, False, False, True, False, False, False, True]
+
+
+def test_queued_logging_writes_json_lines(log_file):
+    """Test messages reach the log file through the background writer as JSON."""
+    utils.configure_logging(log_file=str(log_file))
+
+    log_info("Opened index.")
+    log_info("Answered query.", hot=True, latency=0.25)
+    log_error("Something failed.")
+
+    records = read_records(log_file)
+    assert [record["message"] for record in records] == ["Opened index.", "Answered query.", "Something failed."]
+    assert records[1]["logger"] == "rag_app.hot"
+    assert records[1]["latency"] == 0.25
+    assert records[2]["level"] == "ERROR"
+
+
+def test_hot_path_messages_are_sampled_and_filtered(log_file):
+    """Test hot-path messages honour the sample rate and level while others are all kept."""
+    utils.configure_logging(log_file=str(log_file), sample_rate=0.1)
+    for i in range(100):
+        log_info(f"Read file {i}.", hot=True)
+    log_info("Ingestion finished.")
+
+    messages = [record["message"] for record in read_records(log_file)]
+    assert len(messages) == 11
+    assert messages[-1] == "Ingestion finished."
+
+    utils.configure_logging(log_file=str(log_file), hot_path_level="WARNING")
+    log_info("Read another file.", hot=True)
+    assert len(read_records(log_file)) == 11
+
+
+def test_worker_processes_log_through_the_parent(log_file, tmp_path):
+    """Test records logged in ingestion worker processes reach the log file."""
+    from file_handler import iter_chunks
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for i in range(4):
+        (docs / f"doc{i}.txt").write_text(f"Document number {i}.", encoding="utf-8")
+    utils.configure_logging(log_file=str(log_file))
+
+    records = list(iter_chunks(str(docs), workers=2, segmenter="regex", text_cache_path=""))
+
+    assert len(records) == 4
+    messages = [record["message"] for record in read_records(log_file)]
+    assert sum(message.startswith("Successfully read TXT") for message in messages) == 4
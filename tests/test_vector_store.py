@@ -0,0 +1,129 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+from vector_store import LocalVectorIndex
+from retrieval import IndexRetriever
+from db_connector import retrieve_chunks
+
+
+class TestLocalVectorIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "index")
+        self.index = LocalVectorIndex(self.path, dimension=3)
+        self.index.upsert([
+            {"id": "x", "values": [1.0, 0.0, 0.0], "metadata": {"text": "About x", "source": "a.txt"}},
+            {"id": "y", "values": [0.0, 2.0, 0.0], "metadata": {"text": "About y", "source": "b.txt"}},
+            {"id": "xy", "values": [1.0, 1.0, 0.0], "metadata": {"text": "About x and y", "source": "a.txt"}},
+        ])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_query_returns_top_k_by_cosine_similarity(self):
+        result = self.index.query(vector=[0.9, 0.1, 0.0], top_k=2, include_metadata=True)
+
+        self.assertEqual([match["id"] for match in result.matches], ["x", "xy"])
+        self.assertEqual(result["matches"][0]["metadata"]["text"], "About x")
+        self.assertGreater(result.matches[0]["score"], result.matches[1]["score"])
+
+    def test_query_with_metadata_filter(self):
+        result = self.index.query(vector=[0.0, 1.0, 0.0], top_k=3, filter={"source": {"$eq": "a.txt"}})
+
+        self.assertEqual([match["id"] for match in result.matches], ["xy", "x"])
+
+    def test_upsert_overwrites_existing_ids(self):
+        self.index.upsert([{"id": "x", "values": [0.0, 0.0, 1.0], "metadata": {"text": "New x"}}])
+
+        result = self.index.query(vector=[0.0, 0.0, 1.0], top_k=1, include_metadata=True)
+
+        self.assertEqual(result.matches[0]["id"], "x")
+        self.assertEqual(result.matches[0]["metadata"]["text"], "New x")
+        self.assertEqual(self.index.describe_index_stats()["total_vector_count"], 3)
+
+    def test_delete_by_id(self):
+        self.index.delete(ids=["x", "missing"])
+
+        result = self.index.query(vector=[1.0, 0.0, 0.0], top_k=3)
+
+        self.assertEqual(sorted(match["id"] for match in result.matches), ["xy", "y"])
+        self.assertEqual(self.index.describe_index_stats()["total_vector_count"], 2)
+
+    def test_save_and_reopen_memory_mapped(self):
+        self.index.save()
+
+        reopened = LocalVectorIndex(self.path, dimension=3)
+
+        self.assertIsInstance(reopened._vectors, np.memmap)
+        self.assertEqual(reopened.describe_index_stats()["total_vector_count"], 3)
+        self.assertEqual(reopened.query(vector=[0.0, 1.0, 0.0], top_k=1).matches[0]["id"], "y")
+
+        # Writes after reopening go to an in-memory copy, not the mapped file
+        reopened.upsert([{"id": "z", "values": [0.0, 0.0, 1.0], "metadata": {"text": "About z"}}])
+        self.assertEqual(reopened.query(vector=[0.0, 0.0, 1.0], top_k=1).matches[0]["id"], "z")
+
+    def test_interrupted_save_keeps_the_previous_save(self):
+        self.index.save()
+        self.index.upsert([{"id": "z", "values": [0.0, 0.0, 1.0], "metadata": {"text": "About z"}}])
+
+        # Interrupted after writing the files of the next save, before switching to them
+        with patch("vector_store.commit_generation", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.index.save()
+
+        reopened = LocalVectorIndex(self.path, dimension=3)
+        self.assertEqual(reopened.describe_index_stats()["total_vector_count"], 3)
+        self.assertEqual(reopened.query(vector=[0.0, 1.0, 0.0], top_k=1, include_metadata=True).matches[0]["id"], "y")
+        self.index.save()
+        self.assertEqual(LocalVectorIndex(self.path, dimension=3).describe_index_stats()["total_vector_count"], 4)
+        self.assertEqual(sorted(os.listdir(self.path)), ["CURRENT", "metadata.2.json", "vectors.2.npy"])
+
+    def test_files_from_different_saves_are_rejected(self):
+        os.makedirs(self.path)
+        np.save(os.path.join(self.path, "vectors.npy"), np.eye(2, 3, dtype=np.float32))
+        with open(os.path.join(self.path, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump({"dimension": 3, "ids": ["x", "y", "z"], "metadata": [{}, {}, {}]}, f)
+
+        with self.assertRaises(ValueError):
+            LocalVectorIndex(self.path, dimension=3)
+
+    def test_dimension_mismatch(self):
+        with self.assertRaises(ValueError):
+            self.index.upsert([{"id": "bad", "values": [1.0, 0.0], "metadata": {}}])
+
+    def test_retrieve_chunks_against_local_index(self):
+        embeddings = MagicMock()
+        embeddings.embed_query.return_value = [0.0, 1.0, 0.0]
+
+        self.assertEqual(retrieve_chunks(self.index, "y?", embeddings, top_k=1), ["About y"])
+
+    def test_index_retriever_returns_documents(self):
+        embeddings = MagicMock()
+        embeddings.embed_query.return_value = [1.0, 0.0, 0.0]
+        retriever = IndexRetriever(index=self.index, embeddings=embeddings, top_k=2)
+
+        documents = retriever.invoke("x?")
+
+        self.assertEqual([doc.page_content for doc in documents], ["About x", "About x and y"])
+        self.assertEqual(documents[0].metadata["source"], "a.txt")
+
+    @patch("api_handler.RetrievalQA")
+    @patch("api_handler.ChatOpenAI")
+    def test_create_rag_agent_with_local_index(self, mock_chatopenai, mock_retrievalqa):
+        from api_handler import create_rag_agent
+        from main import check_documents_in_database
+
+        self.assertTrue(check_documents_in_database(self.index))
+        create_rag_agent(self.index, MagicMock())
+
+        retriever = mock_retrievalqa.from_chain_type.call_args.kwargs["retriever"].base_retriever
+        self.assertIsInstance(retriever, IndexRetriever)
+        self.assertIs(retriever.index, self.index)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from config import PARSED_TEXT_CACHE_PATH, PARSED_TEXT_CACHE_MAX_BYTES
+from utils import log_error, log_info
+from metrics import increment
+
+# Files are hashed in blocks of this size, so large documents are never read whole
+DIGEST_BLOCK_BYTES = 1024 * 1024
+
+
+def file_digest(file_path):
+    """
+    Returns the SHA-256 digest of a file's contents, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(DIGEST_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+class ParsedTextCache:
+    """
+    Persistent SQLite cache of the text extracted from documents.
+
+    Entries are keyed by path and store the file's size, mtime and content digest with the
+    zlib-compressed text. A file whose size and mtime are unchanged is served without being
+    read. Otherwise its digest is computed, which is far cheaper than parsing, and any entry
+    with the same content (the same file copied, moved or touched) is reused. The least
+    recently used entries are evicted once the compressed texts exceed max_bytes.
+
+    Each process opens its own connection, so ingestion workers can share one cache file.
+    """
+
+    def __init__(self, path=PARSED_TEXT_CACHE_PATH, max_bytes=PARSED_TEXT_CACHE_MAX_BYTES):
+        """
+        Args:
+            path (str, optional): Location of the SQLite cache file.
+            max_bytes (int, optional): Maximum total size of the compressed texts.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Workers write concurrently; wait for their locks rather than failing
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS texts ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime INTEGER NOT NULL, digest BLOB NOT NULL, "
+            "text BLOB NOT NULL, bytes INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS texts_digest ON texts (digest)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS texts_last_used ON texts (last_used)")
+        self._conn.commit()
+
+    def _lookup(self, file_path, size, mtime):
+        """
+        Returns the cached text of a file, or (None, digest) on a miss.
+        """
+        row = self._conn.execute("SELECT size, mtime, text FROM texts WHERE path = ?", (file_path,)).fetchone()
+        if row and row[0] == size and row[1] == mtime:
+            self._conn.execute("UPDATE texts SET last_used = ? WHERE path = ?", (time.time(), file_path))
+            return zlib.decompress(row[2]).decode("utf-8"), None
+        digest = file_digest(file_path)
+        row = self._conn.execute("SELECT text FROM texts WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+        if row:
+            self._store(file_path, size, mtime, digest, row[0])
+            return zlib.decompress(row[0]).decode("utf-8"), None
+        return None, digest
+
+    def _store(self, file_path, size, mtime, digest, blob):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO texts (path, size, mtime, digest, text, bytes, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (file_path, size, mtime, digest, blob, len(blob), time.time())
+        )
+
+    def _evict(self):
+        """
+        Deletes the least recently used entries until the texts fit in max_bytes.
+        """
+        total = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM texts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for path, length in self._conn.execute("SELECT path, bytes FROM texts ORDER BY last_used").fetchall():
+            self._conn.execute("DELETE FROM texts WHERE path = ?", (path,))
+            total -= length
+            if total <= self.max_bytes:
+                break
+
+    def get_or_parse(self, file_path, parse):
+        """
+        Returns the text of a file from the cache, calling parse(file_path) on a miss.
+
+        Empty results are not cached, so a file that failed to parse is tried again.
+
+        Args:
+            file_path (str): Path of the document.
+            parse (callable): Extracts the text of the document, such as read_pdf.
+
+        Returns:
+            str: The extracted text.
+        """
+        file_path = os.path.abspath(file_path)
+        try:
+            stat = os.stat(file_path)
+            with self._lock:
+                text, digest = self._lookup(file_path, stat.st_size, stat.st_mtime_ns)
+                self._conn.commit()
+        except Exception as e:
+            log_error(f"Error reading parsed text cache: {e}")
+            return parse(file_path)
+
+        if text is not None:
+            self.hits += 1
+            increment("rag_parsed_text_cache_total", 1, "Parsed text cache lookups.", result="hit")
+            log_info(f"Read cached text of {file_path}", hot=True)
+            return text
+
+        self.misses += 1
+        increment("rag_parsed_text_cache_total", 1, "Parsed text cache lookups.", result="miss")
+        text = parse(file_path)
+        if text:
+            try:
+                with self._lock:
+                    self._store(file_path, stat.st_size, stat.st_mtime_ns, digest,
+                                zlib.compress(text.encode("utf-8"), 6))
+                    self._evict()
+                    self._conn.commit()
+            except Exception as e:
+                log_error(f"Error writing parsed text cache: {e}")
+        return text
+
+    def stats(self):
+        """
+        Returns cache counters as a dict with hits, misses, entries and bytes.
+        """
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM texts").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_caches = {}  # (process ID, path) -> ParsedTextCache
+
+
+def get_text_cache(path=PARSED_TEXT_CACHE_PATH):
+    """
+    Returns this process's cache at path, opening it on first use.
+
+    Returns:
+        ParsedTextCache: The cache, or None if path is empty or it cannot be opened.
+    """
+    if not path:
+        return None
+    # A connection inherited from the parent of a forked worker must not be used
+    key = (os.getpid(), path)
+    if key not in _caches:
+        try:
+            _caches[key] = ParsedTextCache(path)
+            log_info(f"Opened parsed text cache '{path}'.")
+        except Exception as e:
+            log_error(f"Error opening parsed text cache '{path}': {e}")
+            _caches[key] = None
+    return _caches[key]
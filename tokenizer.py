@@ -0,0 +1,25 @@
+from functools import lru_cache
+from config import CHUNK_TOKEN_ENCODING
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name=CHUNK_TOKEN_ENCODING):
+    """
+    Returns the tiktoken encoding used to measure text in tokens, loaded once per process.
+    """
+    import tiktoken
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(texts, encoding_name=CHUNK_TOKEN_ENCODING):
+    """
+    Returns the number of tokens in each text, encoding them in one batch call.
+
+    Args:
+        texts (list of str): Texts to measure.
+        encoding_name (str, optional): tiktoken encoding to count with.
+
+    Returns:
+        list of int: Token counts, in the order of texts.
+    """
+    return [len(tokens) for tokens in get_encoding(encoding_name).encode_ordinary_batch(texts)]
@@ -1,7 +1,11 @@
+import itertools
 import sys
-import time
+import threading
 from utils import log_info
 
+# Seconds between spinner frames
+SPINNER_INTERVAL = 0.1
+
 def get_user_input(prompt_message, exit_message=None):
     """
     Get input from the user with an optional exit message.
@@ -54,12 +58,68 @@ def prompt_continue_conversation():
     """
     return get_yes_no_input("Do you want to continue the conversation? (yes/no): ")
 
-def show_loading_message(message, duration=2):
+class Spinner:
+    """
+    Animates a loading message on a background thread while work runs in the foreground.
+
+    Use it as a context manager around the slow call; the animation stops and the line
+    is cleared as soon as the block exits, so it never adds latency of its own.
+    When output is not a terminal the message is printed once instead of animated.
     """
-    Display a loading message for a specific duration.
+
+    def __init__(self, message, stream=None, interval=SPINNER_INTERVAL):
+        """
+        Args:
+            message (str): Message shown next to the spinner.
+            stream (file, optional): Output stream (default: sys.stdout).
+            interval (float, optional): Seconds between frames.
+        """
+        self.message = message
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _animate(self):
+        for frame in itertools.cycle("|/-\\"):
+            self.stream.write(f"\r{self.message} {frame}")
+            self.stream.flush()
+            if self._stop.wait(self.interval):
+                break
+        self.stream.write("\r" + " " * (len(self.message) + 2) + "\r")
+        self.stream.flush()
+
+    def start(self):
+        if self._thread:
+            return self
+        self._stop.clear()
+        if self.stream.isatty():
+            self._thread = threading.Thread(target=self._animate, daemon=True)
+            self._thread.start()
+        else:
+            print(self.message, file=self.stream, flush=True)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def show_loading_message(message):
+    """
+    Shows a loading message for as long as the wrapped work takes.
+
+    Usage: `with show_loading_message("Working"): do_work()`
+
+    Returns:
+        Spinner: A spinner that starts on entering the with block and stops on leaving it.
     """
-    print(message, end="", flush=True)
-    for _ in range(duration):
-        time.sleep(1)
-        print(".", end="", flush=True)
-    print()  # End the loading line
\ No newline at end of file
+    return Spinner(message)
@@ -1,15 +1,198 @@
 from tqdm import tqdm
-import time
+import atexit
+import importlib
+import itertools
+import json
 import logging
-
-# Configure logging
-logging.basicConfig(
-    filename='app.log',
-    filemode='a',
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+import math
+import multiprocessing
+import os
+import queue
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from config import (
+    LOG_FILE,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_ROTATE_WHEN,
+    LOG_HOT_PATH_LEVEL,
+    LOG_SAMPLE_RATE
 )
 
+# Names the generation of a saved index directory's files that is current
+GENERATION_FILE = "CURRENT"
+
+TEXT_LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed as a structured field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# Per-file and per-query messages, which can be filtered and sampled separately
+_hot_logger = logging.getLogger("rag_app.hot")
+_queue_handler = None
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line, including any structured fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps an evenly spaced fraction of records: with rate 0.1, every tenth one.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = min(max(rate, 0.0), 1.0)
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        n = next(self._counter)
+        return math.floor((n + 1) * self.rate) > math.floor(n * self.rate)
+
+class _LocalQueueHandler(QueueHandler):
+    """
+    QueueHandler for a queue read in the same process.
+
+    The standard handler formats and copies every record so it can be pickled; records
+    without arguments or exception info are passed through as they are instead, leaving
+    all formatting to the background writer.
+    """
+
+    def prepare(self, record):
+        if record.args or record.exc_info:
+            return super().prepare(record)
+        return record
+
+def _level_number(level):
+    return level if isinstance(level, int) else logging.getLevelName(level)
+
+def configure_logging(log_file=LOG_FILE, level=LOG_LEVEL, log_format=LOG_FORMAT, max_bytes=LOG_MAX_BYTES,
+                      backup_count=LOG_BACKUP_COUNT, rotate_when=LOG_ROTATE_WHEN,
+                      hot_path_level=LOG_HOT_PATH_LEVEL, sample_rate=LOG_SAMPLE_RATE):
+    """
+    Routes logging through a queue to a background thread that writes the log file.
+
+    Logging calls only put the record on an in-memory queue, so they never wait for disk
+    I/O. Called on import with the LOG_* settings; calling it again replaces the pipeline.
+
+    Args:
+        log_file (str, optional): File records are written to.
+        level (str, optional): Minimum level logged.
+        log_format (str, optional): "json" for one JSON object per line, otherwise plain text.
+        max_bytes (int, optional): Size at which the file is rotated (0 never rotates by size).
+        backup_count (int, optional): Number of rotated files kept.
+        rotate_when (str, optional): If set, rotate on this schedule (see
+            logging.handlers.TimedRotatingFileHandler) instead of by size.
+        hot_path_level (str, optional): Minimum level of per-file and per-query messages.
+        sample_rate (float, optional): Fraction of per-file and per-query messages kept.
+
+    Returns:
+        QueueListener: The background writer.
+    """
+    global _queue_handler, _listener
+    shutdown_logging()
+
+    if rotate_when:
+        file_handler = TimedRotatingFileHandler(log_file, when=rotate_when, backupCount=backup_count,
+                                                encoding="utf-8", delay=True)
+    else:
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                           encoding="utf-8", delay=True)
+    file_handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _LocalQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    # Hot-path messages are never logged below the overall level
+    _hot_logger.setLevel(max(_level_number(level), _level_number(hot_path_level)))
+    for existing in list(_hot_logger.filters):
+        _hot_logger.removeFilter(existing)
+    if sample_rate < 1:
+        _hot_logger.addFilter(SamplingFilter(sample_rate))
+
+    _listener = QueueListener(log_queue, file_handler)
+    _listener.start()
+    return _listener
+
+def shutdown_logging():
+    """
+    Writes out any queued records and stops the background writer.
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
+def init_worker_logging(log_queue, level):
+    """
+    ProcessPoolExecutor initializer that sends a worker process's records to log_queue.
+
+    A forked worker inherits the parent's queue handler, but not the thread that writes
+    its queue out, so the pipeline is replaced by one that hands records back to the
+    parent (see worker_logging).
+    """
+    global _queue_handler
+    shutdown_logging()
+    if log_queue is None:
+        return
+    _queue_handler = QueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+@contextmanager
+def worker_logging():
+    """
+    Writes the records of worker processes to this process's log file while a process
+    pool is in use.
+
+    Yields the initializer and initargs keyword arguments for the ProcessPoolExecutor,
+    which must be shut down before the with block ends:
+
+        with worker_logging() as pool_kwargs, ProcessPoolExecutor(**pool_kwargs) as executor:
+            ...
+    """
+    if _listener is None:
+        yield {"initializer": init_worker_logging, "initargs": (None, logging.getLogger().level)}
+        return
+    log_queue = multiprocessing.Queue()
+    listener = QueueListener(log_queue, *_listener.handlers)
+    listener.start()
+    try:
+        yield {"initializer": init_worker_logging, "initargs": (log_queue, logging.getLogger().level)}
+    finally:
+        # The workers have exited, so everything they logged is already queued
+        listener.stop()
+        log_queue.close()
+
+configure_logging()
+atexit.register(shutdown_logging)
+
 def display_progress(total, description="Processing"):
     """
     Displays a progress bar for long-running processes.
@@ -17,44 +200,149 @@ def display_progress(total, description="Processing"):
     pbar = tqdm(total=total, desc=description)
     return pbar
 
-def display_query_progress(total_steps=3, step_duration=1):
+def display_query_progress(total_steps=3):
     """
     Displays a progress bar to indicate query processing.
+
+    The caller advances the bar with pbar.update(1) as each step actually completes
+    and closes it when the query is done.
     """
-    with tqdm(total=total_steps, desc="Query in progress") as pbar:
-        for _ in range(total_steps):
-            time.sleep(step_duration)
-            pbar.update(1)
+    return display_progress(total_steps, description="Query in progress")
 
-def log_info(message):
+def log_info(message, hot=False, **fields):
     """
     Logs informational messages to the log file.
+
+    Args:
+        message (str): The message.
+        hot (bool, optional): Marks messages logged per file, chunk batch or query; they are
+            subject to LOG_HOT_PATH_LEVEL and LOG_SAMPLE_RATE.
+        **fields: Structured fields added to the JSON record.
     """
-    logging.info(message)
+    logger = _hot_logger if hot else logging
+    if fields:
+        logger.info(message, extra=fields)
+    else:
+        logger.info(message)
 
-def log_error(message):
+def log_error(message, **fields):
     """
     Logs error messages to the log file.
     """
-    logging.error(message)
+    if fields:
+        logging.error(message, extra=fields)
+    else:
+        logging.error(message)
 
-def log_conversation(user_query, agent_response, conversation_history=None):
+def log_conversation(user_query, agent_response, turn=None, sources=None):
     """
-    Logs the conversation between the user and the agent, including the context if provided.
+    Logs one turn of the conversation between the user and the agent.
+
+    Each call writes only the current turn, so logging cost stays constant as a session
+    grows; the full conversation can be read back from the sequence of turns in the log.
 
     Args:
         user_query (str): The user's input query.
         agent_response (str): The agent's response.
-        conversation_history (list, optional): The conversation history, if available.
+        turn (int, optional): The turn's number within the session.
+        sources (list, optional): The documents the response was based on.
     """
-    history_str = ""
-    if conversation_history:
-        history_str = "\n".join(
-            [f"User: {turn['query']} | Agent: {turn['response']}" for turn in conversation_history]
-        )
-    
     logging.info(
+        f"Turn {turn if turn is not None else '-'}\n"
         f"User query: {user_query}\n"
         f"Agent response: {agent_response}\n"
-        f"Conversation history:\n{history_str if history_str else 'No prior context'}\n"
-    )
\ No newline at end of file
+        f"Sources: {', '.join(sources) if sources else 'None'}\n",
+        extra={"event": "conversation_turn", "turn": turn}
+    )
+
+def lazy_imports(namespace, imports):
+    """
+    Defers heavy module-level imports until a name is first used.
+
+    Intended to be called at module level as
+    `__getattr__, ensure_imports = lazy_imports(globals(), {...})`. The returned
+    __getattr__ resolves names on attribute access (so unittest.mock.patch still works
+    on them), and functions call ensure_imports(*names) before using the names as globals.
+
+    Args:
+        namespace (dict): The globals() of the calling module.
+        imports (dict): Maps each name to a (module, attribute) pair; attribute may be None
+            to bind the module itself.
+
+    Returns:
+        tuple: (__getattr__, ensure_imports) functions for the calling module.
+    """
+    def load(name):
+        module_name, attribute = imports[name]
+        module = importlib.import_module(module_name)
+        # setdefault keeps a value already bound in the module, such as a test mock
+        return namespace.setdefault(name, getattr(module, attribute) if attribute else module)
+
+    def module_getattr(name):
+        if name in imports:
+            return load(name)
+        raise AttributeError(f"module {namespace['__name__']!r} has no attribute {name!r}")
+
+    def ensure_imports(*names):
+        for name in names or imports:
+            if name not in namespace:
+                load(name)
+
+    return module_getattr, ensure_imports
+
+def generation_file(name, generation):
+    """
+    Returns the name of a file of an index directory as written by a given save,
+    e.g. "vectors.3.npy" for "vectors.npy". Generation 0 is the unstamped name.
+    """
+    if not generation:
+        return name
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{generation}{extension}"
+
+
+def current_generation(directory):
+    """
+    Returns the generation an index directory's pointer file names, or 0 if it has none
+    (a directory saved before generations were used, or never saved).
+    """
+    try:
+        with open(os.path.join(directory, GENERATION_FILE), "r", encoding="utf-8") as f:
+            return int(f.read().strip())
+    except FileNotFoundError:
+        return 0
+
+
+def commit_generation(directory, generation, names):
+    """
+    Makes a save of an index directory current.
+
+    A save writes every file under its generation_file names first. Replacing the pointer
+    file is the single atomic step that switches readers over, so an interrupted save leaves
+    the previous generation in place rather than a mix of files from two saves. The files of
+    other generations are removed afterwards.
+
+    Args:
+        directory (str): The index directory.
+        generation (int): The generation just written.
+        names (list of str): Unstamped names of the files that make up a generation.
+    """
+    pointer_path = os.path.join(directory, GENERATION_FILE)
+    with open(f"{pointer_path}.tmp", "w", encoding="utf-8") as f:
+        f.write(str(generation))
+    os.replace(f"{pointer_path}.tmp", pointer_path)
+    current = {generation_file(name, generation) for name in names}
+    stems = [os.path.splitext(name) for name in names]
+    for entry in os.listdir(directory):
+        stale = entry not in current and any(
+            entry == stem + extension
+            or (entry.startswith(f"{stem}.") and entry.endswith(extension)
+                and entry[len(stem) + 1:len(entry) - len(extension)].isdigit())
+            for stem, extension in stems
+        )
+        if stale:
+            try:
+                os.remove(os.path.join(directory, entry))
+            except OSError as e:
+                # A file still memory-mapped on Windows is removed by a later save
+                log_error(f"Could not remove old index file '{entry}': {e}")
\ No newline at end of file
@@ -0,0 +1,330 @@
+import atexit
+import json
+import os
+import threading
+import numpy as np
+from ann_index import IVFIndex
+from utils import commit_generation, current_generation, generation_file, log_error, log_info
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.json"
+IVF_FILE = "ivf.npz"
+INDEX_TYPES = ["flat", "ivf"]
+
+# An IVF index is retrained once the collection has grown this much since training,
+# so centroids keep tracking the data distribution
+RETRAIN_GROWTH_FACTOR = 4
+
+
+class QueryResult:
+    """
+    Query response with the same shape as Pinecone's: matches are dicts with id, score and
+    optionally metadata/values, reachable as result.matches or result["matches"].
+    """
+
+    def __init__(self, matches):
+        self.matches = matches
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+def _matches_filter(metadata, metadata_filter):
+    """
+    Checks metadata against a Pinecone-style filter of {field: value}, {field: {"$eq": value}}
+    or {field: {"$in": [values]}} conditions.
+    """
+    for field, condition in metadata_filter.items():
+        value = metadata.get(field)
+        if isinstance(condition, dict):
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class LocalVectorIndex:
+    """
+    In-process vector index with the subset of the pinecone.Index API this app uses.
+
+    Vectors are L2-normalised and kept in a float32 matrix, so cosine similarity for all
+    rows is a single matrix-vector product and top-k selection uses np.argpartition.
+    The index is persisted to a directory as vectors.npy plus metadata.json, and reopened
+    with the vectors memory-mapped, so large indexes load instantly and are paged in by
+    the OS as queries touch them. Each save writes a new generation of the files (see
+    utils.commit_generation), so an interrupted save leaves the previous one loadable.
+
+    With index_type='ivf', queries scan only the nprobe closest clusters of an IVFIndex
+    instead of every vector. The IVF index trains itself once there are enough vectors
+    and exact search is used until then.
+    """
+
+    def __init__(self, path, dimension, index_type="flat", nlist=1024, nprobe=16):
+        """
+        Args:
+            path (str): Directory the index is stored in.
+            dimension (int): Dimensionality of the vectors.
+            index_type (str, optional): 'flat' for exact search or 'ivf' for approximate search.
+            nlist (int, optional): Number of IVF clusters.
+            nprobe (int, optional): Default number of IVF clusters scanned per query.
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}.")
+        self.path = path
+        self.dimension = dimension
+        self.ann = IVFIndex(nlist=nlist, nprobe=nprobe) if index_type == "ivf" else None
+        self._lock = threading.RLock()
+        self._ids = []
+        self._metadata = []
+        self._id_to_row = {}
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._count = 0
+        self._dirty = False
+        self._generation = current_generation(path)
+
+        vectors_path = os.path.join(path, generation_file(VECTORS_FILE, self._generation))
+        metadata_path = os.path.join(path, generation_file(METADATA_FILE, self._generation))
+        if os.path.exists(vectors_path) and os.path.exists(metadata_path):
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored["dimension"] != dimension:
+                raise ValueError(
+                    f"Local index at '{path}' has dimension {stored['dimension']}, expected {dimension}."
+                )
+            vectors = np.load(vectors_path, mmap_mode="r")
+            if len(stored["ids"]) != vectors.shape[0]:
+                raise ValueError(
+                    f"Local index at '{path}' has {len(stored['ids'])} IDs but {vectors.shape[0]} vectors; "
+                    f"its files are from different saves."
+                )
+            self._ids = stored["ids"]
+            self._metadata = stored["metadata"]
+            self._id_to_row = {vector_id: row for row, vector_id in enumerate(self._ids)}
+            self._vectors = vectors
+            self._count = len(self._ids)
+            ivf_path = os.path.join(path, generation_file(IVF_FILE, self._generation))
+            if self.ann and os.path.exists(ivf_path) and not self.ann.load(ivf_path, self._count):
+                log_info(f"Stored IVF index at '{ivf_path}' is out of date; it will be retrained.")
+            self._maybe_train()
+
+    def _maybe_train(self):
+        """
+        Trains the IVF index once there is enough data, or retrains it after large growth.
+        """
+        if not self.ann or self._count < self.ann.min_train_size:
+            return
+        if not self.ann.trained or self._count >= RETRAIN_GROWTH_FACTOR * self.ann.trained_size:
+            self.ann.train(self._vectors[:self._count])
+            self._dirty = True
+
+    def _ensure_writable(self, extra_rows):
+        """
+        Makes the vector matrix writable in memory with room for extra_rows more vectors.
+        """
+        capacity = self._vectors.shape[0]
+        needed = self._count + extra_rows
+        if needed > capacity or isinstance(self._vectors, np.memmap):
+            # Grow geometrically so a stream of small upserts stays amortised O(1) per vector
+            new_capacity = max(needed, 1024, 2 * capacity if needed > capacity else capacity)
+            vectors = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+            vectors[:self._count] = self._vectors[:self._count]
+            self._vectors = vectors
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        """
+        Inserts vectors or overwrites the ones with existing IDs.
+
+        Args:
+            vectors (list): Dicts with id, values and optional metadata, or
+                (id, values[, metadata]) tuples.
+
+        Returns:
+            dict: {"upserted_count": n}
+        """
+        records = [
+            (v["id"], v["values"], v.get("metadata") or {}) if isinstance(v, dict)
+            else (v[0], v[1], v[2] if len(v) > 2 else {})
+            for v in vectors
+        ]
+        if not records:
+            return {"upserted_count": 0}
+        values = np.asarray([values for _, values, _ in records], dtype=np.float32)
+        if values.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension {values.shape[1]} does not match index dimension {self.dimension}.")
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values /= np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            self._ensure_writable(len(records))
+            rows = []
+            for (vector_id, _, metadata), row_values in zip(records, values):
+                row = self._id_to_row.get(vector_id)
+                if row is None:
+                    row = self._count
+                    self._id_to_row[vector_id] = row
+                    self._ids.append(vector_id)
+                    self._metadata.append(metadata)
+                    self._count += 1
+                else:
+                    self._metadata[row] = metadata
+                self._vectors[row] = row_values
+                rows.append(row)
+            if self.ann and self.ann.trained:
+                self.ann.set_rows(rows, values)
+            self._dirty = True
+            self._maybe_train()
+        return {"upserted_count": len(records)}
+
+    def delete(self, ids=None, delete_all=False, namespace=None, **kwargs):
+        """
+        Deletes vectors by ID, or every vector when delete_all is True.
+        """
+        with self._lock:
+            if delete_all:
+                self._ids, self._metadata, self._id_to_row = [], [], {}
+                self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+                self._count = 0
+                if self.ann:
+                    self.ann = IVFIndex(nlist=self.ann.nlist, nprobe=self.ann.nprobe)
+                self._dirty = True
+                return {}
+            rows = [self._id_to_row[vector_id] for vector_id in ids or [] if vector_id in self._id_to_row]
+            if not rows:
+                return {}
+            self._ensure_writable(0)
+            # Fill each hole with the current last row so the live rows stay contiguous
+            for row in sorted(rows, reverse=True):
+                last = self._count - 1
+                del self._id_to_row[self._ids[row]]
+                if row != last:
+                    if self.ann and self.ann.trained:
+                        self.ann.move_row(last, row)
+                    self._vectors[row] = self._vectors[last]
+                    self._ids[row] = self._ids[last]
+                    self._metadata[row] = self._metadata[last]
+                    self._id_to_row[self._ids[row]] = row
+                self._ids.pop()
+                self._metadata.pop()
+                self._count -= 1
+            self._dirty = True
+        return {}
+
+    def query(self, vector=None, top_k=10, include_metadata=False, include_values=False, filter=None,
+              namespace=None, nprobe=None, **kwargs):
+        """
+        Returns the top_k vectors by cosine similarity to vector.
+
+        Args:
+            vector (list of float): The query vector.
+            top_k (int, optional): Number of matches to return.
+            include_metadata (bool, optional): Include each match's metadata.
+            include_values (bool, optional): Include each match's (normalised) vector.
+            filter (dict, optional): Pinecone-style metadata filter.
+            nprobe (int, optional): IVF clusters to scan, overriding the index default.
+
+        Returns:
+            QueryResult: Matches ordered from most to least similar.
+        """
+        query_vector = np.asarray(vector, dtype=np.float32)
+        if query_vector.ndim == 2:
+            query_vector = query_vector[0]
+        norm = np.linalg.norm(query_vector)
+        if norm:
+            query_vector = query_vector / norm
+
+        with self._lock:
+            if self.ann and self.ann.trained:
+                candidates = self.ann.candidates(query_vector, self._count, nprobe)
+                scores = self._vectors[candidates] @ query_vector
+            else:
+                candidates = np.arange(self._count)
+                scores = self._vectors[:self._count] @ query_vector
+            if filter:
+                mask = np.fromiter(
+                    (_matches_filter(self._metadata[row], filter) for row in candidates),
+                    dtype=bool, count=len(candidates)
+                )
+                scores = np.where(mask, scores, -np.inf)
+            top_k = min(top_k, int(np.isfinite(scores).sum()))
+            if top_k <= 0:
+                return QueryResult([])
+            if top_k < len(scores):
+                positions = np.argpartition(-scores, top_k - 1)[:top_k]
+            else:
+                positions = np.arange(len(scores))
+            positions = positions[np.argsort(-scores[positions], kind="stable")]
+            rows = candidates[positions]
+            scores = scores[positions]
+
+            matches = []
+            for row, score in zip(rows, scores):
+                match = {"id": self._ids[row], "score": float(score)}
+                if include_metadata:
+                    match["metadata"] = dict(self._metadata[row])
+                if include_values:
+                    match["values"] = self._vectors[row].tolist()
+                matches.append(match)
+        return QueryResult(matches)
+
+    def describe_index_stats(self, **kwargs):
+        """
+        Returns index statistics in the same shape as Pinecone's describe_index_stats.
+        """
+        with self._lock:
+            return {
+                "dimension": self.dimension,
+                "total_vector_count": self._count,
+                "namespaces": {"": {"vector_count": self._count}} if self._count else {},
+            }
+
+    def save(self):
+        """
+        Writes the index to its directory if it changed since it was loaded or last saved.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            generation = self._generation + 1
+            vectors_path = os.path.join(self.path, generation_file(VECTORS_FILE, generation))
+            metadata_path = os.path.join(self.path, generation_file(METADATA_FILE, generation))
+            with open(vectors_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(self._vectors[:self._count]))
+            with open(metadata_path, "w", encoding="utf-8") as f:
+                json.dump({"dimension": self.dimension, "ids": self._ids, "metadata": self._metadata}, f)
+            if self.ann and self.ann.trained:
+                self.ann.save(os.path.join(self.path, generation_file(IVF_FILE, generation)), self._count)
+            commit_generation(self.path, generation, [VECTORS_FILE, METADATA_FILE, IVF_FILE])
+            self._generation = generation
+            self._dirty = False
+        log_info(f"Saved local vector index with {self._count} vectors to '{self.path}'.")
+
+
+def open_local_index(path, dimension, index_type="flat", nlist=1024, nprobe=16):
+    """
+    Opens (or creates) a local vector index and saves it automatically on exit.
+
+    Args:
+        path (str): Directory the index is stored in.
+        dimension (int): Dimensionality of the vectors.
+        index_type (str, optional): 'flat' or 'ivf' (see LocalVectorIndex).
+        nlist (int, optional): Number of IVF clusters.
+        nprobe (int, optional): Default number of IVF clusters scanned per query.
+
+    Returns:
+        LocalVectorIndex: The index.
+    """
+    index = LocalVectorIndex(path, dimension, index_type=index_type, nlist=nlist, nprobe=nprobe)
+
+    def save_on_exit():
+        try:
+            index.save()
+        except Exception as e:
+            log_error(f"Error saving local vector index '{path}': {e}")
+
+    atexit.register(save_on_exit)
+    log_info(f"Opened local vector index '{path}' with {index.describe_index_stats()['total_vector_count']} vectors.")
+    return index